@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+MOTOR DE TRANSFORMACIÓN DE CÓDIGO C
+===================================
+
+Árbol de sintaxis concreto y sin pérdidas para las reescrituras del
+generador ML: el código se tokeniza una sola vez (comentarios, directivas
+del preprocesador y literales incluidos), se emparejan paréntesis, corchetes
+y llaves, y las pasadas de optimización trabajan sobre funciones, sentencias
+if y llamadas reales en lugar de expresiones regulares sobre todo el archivo.
+Las reescrituras modifican tokens y el resultado se imprime una vez al final.
+
+Un AST completo (pycparser) descarta comentarios y directivas #include que
+el código generado debe conservar; por eso el árbol es concreto: render()
+devuelve exactamente el texto original más las reescrituras aplicadas.
+
+Autor: Wilson Ramos Pacco
+Universidad Nacional de San Agustín de Arequipa
+"""
+
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class CSyntaxError(ValueError):
+    """Paréntesis, corchetes o llaves desbalanceados"""
+
+class CFunction:
+    """Definición de función: nombre, tipo de retorno, parámetros y cuerpo (índices de token)"""
+    
+    def __init__(self, name: str, name_index: int, return_start: int,
+                 params: Tuple[int, int], body: Tuple[int, int]):
+        self.name = name
+        self.name_index = name_index
+        self.return_start = return_start
+        self.params = params
+        self.body = body
+
+class CIfStatement:
+    """
+    Sentencia if: condición (paréntesis) y cuerpo, que puede ser un bloque
+    entre llaves o una única sentencia terminada en ';'
+    """
+    
+    def __init__(self, start: int, condition: Tuple[int, int], body: Tuple[int, int],
+                 has_else: bool, is_else_if: bool, is_sole_body: bool):
+        self.start = start
+        self.condition = condition
+        self.body = body
+        self.has_else = has_else
+        self.is_else_if = is_else_if
+        # Cuerpo sin llaves de un for/while/if/do: al eliminarlo debe quedar una sentencia vacía
+        self.is_sole_body = is_sole_body
+    
+    @property
+    def end(self) -> int:
+        return self.body[1]
+    
+    @property
+    def removable(self) -> bool:
+        """Se puede eliminar sin dejar un else huérfano"""
+        return not self.has_else and not self.is_else_if
+
+class CSourceTree:
+    """
+    Código C tokenizado con la estructura de bloques resuelta.
+    
+    Las reescrituras son locales a tokens: rename() cambia el texto de uno,
+    replace() sustituye un rango (que deja de estar intacto para las pasadas
+    siguientes) e insert_before() antepone texto. render() concatena los
+    tokens una sola vez.
+    """
+    
+    TOKEN_RE = re.compile(r"""
+        (?P<comment>/\*.*?\*/|//[^\n]*)
+      | (?P<directive>\#(?:\\\n|[^\n])*)
+      | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+      | (?P<space>\s+)
+      | (?P<ident>[A-Za-z_]\w*)
+      | (?P<number>\.?\d(?:[eEpP][-+]|[\w.])*)
+      | (?P<punct>->|\+\+|--|<<=?|>>=?|[<>=!]=|&&|\|\||[-+*/%&|^]=|\.\.\.|.)
+    """, re.VERBOSE | re.DOTALL)
+    
+    # Tokens que no participan en la estructura
+    TRIVIA = ('space', 'comment', 'directive')
+    OPENERS = {'(': ')', '[': ']', '{': '}'}
+    KEYWORDS = {'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'return', 'sizeof',
+                'typedef', 'struct', 'union', 'enum'}
+    
+    def __init__(self, code: str):
+        self.kinds = []
+        self.texts = []
+        for match in self.TOKEN_RE.finditer(code):
+            self.kinds.append(match.lastgroup)
+            self.texts.append(match.group())
+        # Texto original: la estructura se navega sobre él aunque haya tokens renombrados
+        self.source = tuple(self.texts)
+        
+        # Índices de tokens significativos y posición de cada uno en esa lista
+        self.significant = [i for i, kind in enumerate(self.kinds) if kind not in self.TRIVIA]
+        self._position = {index: position for position, index in enumerate(self.significant)}
+        self.partner = self._match_brackets()
+        self.replaced = bytearray(len(self.texts))
+        self._functions = None
+        self._if_statements = None
+    
+    def _match_brackets(self) -> Dict[int, int]:
+        """Empareja (), [] y {} en una pasada con una pila"""
+        partner = {}
+        stack = []
+        for index in self.significant:
+            text = self.texts[index]
+            if text in self.OPENERS:
+                stack.append(index)
+            elif text in (')', ']', '}'):
+                if not stack or self.OPENERS[self.texts[stack[-1]]] != text:
+                    raise CSyntaxError(f"'{text}' sin pareja en la línea {self.line_of(index)}")
+                opener = stack.pop()
+                partner[opener] = index
+                partner[index] = opener
+        if stack:
+            raise CSyntaxError(f"'{self.texts[stack[-1]]}' sin cerrar en la línea {self.line_of(stack[-1])}")
+        return partner
+    
+    def line_of(self, index: int) -> int:
+        return sum(text.count('\n') for text in self.texts[:index]) + 1
+    
+    # ------------------------------------------------------------------
+    # Navegación
+    # ------------------------------------------------------------------
+    
+    def next_sig(self, index: int) -> Optional[int]:
+        """Siguiente token significativo después de index (que debe ser significativo)"""
+        position = self._position[index] + 1
+        return self.significant[position] if position < len(self.significant) else None
+    
+    def prev_sig(self, index: int) -> Optional[int]:
+        """Token significativo anterior a index (que debe ser significativo)"""
+        position = self._position[index] - 1
+        return self.significant[position] if position >= 0 else None
+    
+    def text_at(self, index: Optional[int]) -> Optional[str]:
+        return self.texts[index] if index is not None else None
+    
+    def source_at(self, index: Optional[int]) -> Optional[str]:
+        return self.source[index] if index is not None else None
+    
+    def sig_between(self, start: int, end: int) -> Iterator[int]:
+        """Tokens significativos estrictamente entre start y end"""
+        position = self._position[start] + 1
+        while position < len(self.significant) and self.significant[position] < end:
+            yield self.significant[position]
+            position += 1
+    
+    def compact(self, start: int, end: int) -> str:
+        """Texto significativo entre dos tokens, sin espacios ni comentarios"""
+        return ''.join(self.texts[i] for i in self.sig_between(start, end))
+    
+    def contains(self, start: int, end: int, identifier: str) -> bool:
+        return any(self.texts[i] == identifier for i in self.sig_between(start, end))
+    
+    def text(self, start: int, end: int) -> str:
+        """Texto actual de un rango de tokens (inclusive)"""
+        return ''.join(self.texts[start:end + 1])
+    
+    def statement_end(self, index: int) -> int:
+        """
+        Último token de la sentencia que empieza en index: su ';' (saltando
+        bloques anidados) o la llave que cierra el cuerpo de un for/while/if
+        """
+        current = index
+        while current is not None and self.source[current] != ';':
+            if self.source[current] in self.OPENERS:
+                closer = self.partner[current]
+                if self.source[current] == '{' and self.source_at(self.prev_sig(current)) in (')', 'else'):
+                    following = self.next_sig(closer)
+                    if self.source_at(following) != 'else':
+                        return closer
+                current = closer
+            current = self.next_sig(current)
+        if current is None:
+            raise CSyntaxError(f"sentencia sin ';' en la línea {self.line_of(index)}")
+        return current
+    
+    def identifiers(self, name: Optional[str] = None) -> Iterator[int]:
+        """Índices de identificadores (opcionalmente con un nombre dado)"""
+        for index in self.significant:
+            if self.kinds[index] == 'ident' and (name is None or self.texts[index] == name):
+                yield index
+    
+    # ------------------------------------------------------------------
+    # Estructura
+    # ------------------------------------------------------------------
+    
+    def functions(self) -> List[CFunction]:
+        """Definiciones de función de nivel superior"""
+        if self._functions is None:
+            self._functions = []
+            depth = 0
+            for index in self.significant:
+                text = self.source[index]
+                if text == '{' and depth == 0:
+                    function = self._function_at(index)
+                    if function is not None:
+                        self._functions.append(function)
+                if text in self.OPENERS:
+                    depth += 1
+                elif text in (')', ']', '}'):
+                    depth -= 1
+        return self._functions
+    
+    def _function_at(self, brace: int) -> Optional[CFunction]:
+        close_paren = self.prev_sig(brace)
+        if self.source_at(close_paren) != ')':
+            return None
+        open_paren = self.partner[close_paren]
+        name_index = self.prev_sig(open_paren)
+        if name_index is None or self.kinds[name_index] != 'ident' or self.source[name_index] in self.KEYWORDS:
+            return None
+        
+        # El tipo de retorno empieza después de la declaración anterior
+        return_start = name_index
+        previous = self.prev_sig(name_index)
+        while previous is not None and self.source[previous] not in (';', '}', '{'):
+            return_start = previous
+            previous = self.prev_sig(previous)
+        return CFunction(self.source[name_index], name_index, return_start,
+                         (open_paren, close_paren), (brace, self.partner[brace]))
+    
+    def function(self, name: str) -> Optional[CFunction]:
+        for function in self.functions():
+            if function.name == name:
+                return function
+        return None
+    
+    def return_type(self, function: CFunction) -> str:
+        return ' '.join(self.texts[i] for i in self.significant[self._position[function.return_start]:
+                                                                 self._position[function.name_index]])
+    
+    def parameter_names(self, function: CFunction) -> List[str]:
+        """Nombre de cada parámetro: el último identificador antes de ',' o ')'"""
+        names = []
+        last_identifier = None
+        open_paren, close_paren = function.params
+        current = self.next_sig(open_paren)
+        while current is not None and current != close_paren:
+            text = self.texts[current]
+            if text in self.OPENERS:
+                current = self.partner[current]
+            elif text == ',':
+                names.append(last_identifier)
+                last_identifier = None
+            elif self.kinds[current] == 'ident':
+                last_identifier = text
+            current = self.next_sig(current)
+        if last_identifier is not None:
+            names.append(last_identifier)
+        return [name for name in names if name is not None and name != 'void']
+    
+    def if_statements(self) -> List[CIfStatement]:
+        """Todas las sentencias if, incluidas las anidadas"""
+        if self._if_statements is None:
+            self._if_statements = []
+            for index in self.significant:
+                if self.source[index] != 'if':
+                    continue
+                open_paren = self.next_sig(index)
+                if self.source_at(open_paren) != '(':
+                    continue
+                close_paren = self.partner[open_paren]
+                body_start = self.next_sig(close_paren)
+                if body_start is None:
+                    continue
+                body_end = (self.partner[body_start] if self.source[body_start] == '{'
+                            else self.statement_end(body_start))
+                self._if_statements.append(CIfStatement(
+                    index, (open_paren, close_paren), (body_start, body_end),
+                    has_else=self.source_at(self.next_sig(body_end)) == 'else',
+                    is_else_if=self.source_at(self.prev_sig(index)) == 'else',
+                    is_sole_body=self.source_at(self.prev_sig(index)) in (')', 'do')
+                ))
+        return self._if_statements
+    
+    def calls(self, name: str) -> Iterator[Tuple[int, int, int]]:
+        """Llamadas a una función: (índice del nombre, '(', ')')"""
+        for index in self.identifiers(name):
+            open_paren = self.next_sig(index)
+            if self.text_at(open_paren) == '(':
+                yield index, open_paren, self.partner[open_paren]
+    
+    # ------------------------------------------------------------------
+    # Reescrituras
+    # ------------------------------------------------------------------
+    
+    def intact(self, start: int, end: int) -> bool:
+        """Ningún token del rango fue sustituido por una reescritura anterior"""
+        return not any(self.replaced[start:end + 1])
+    
+    def rename(self, index: int, text: str):
+        """Cambia el texto de un token (si no fue sustituido)"""
+        if not self.replaced[index]:
+            self.texts[index] = text
+    
+    def replace(self, start: int, end: int, text: str):
+        """Sustituye los tokens start..end (inclusive) por un texto"""
+        self.texts[start] = text
+        for index in range(start + 1, end + 1):
+            self.texts[index] = ''
+        self.replaced[start:end + 1] = b'\x01' * (end - start + 1)
+    
+    def insert_before(self, index: int, text: str):
+        """Antepone texto a un token (index == número de tokens añade al final)"""
+        if index == len(self.texts):
+            self.kinds.append('space')
+            self.texts.append('')
+            self.replaced.append(0)
+        self.texts[index] = text + self.texts[index]
+    
+    def render(self) -> str:
+        return ''.join(self.texts)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+TABLA PRECOMPUTADA DE ESCALAS GEOGRÁFICAS
+=========================================
+
+Metros por grado de latitud y longitud según la latitud, compartidos por
+el cerebro ML (área y categoría de la zona) y por el generador de código
+(constantes LAT_TO_METERS / LON_TO_METERS del C optimizado), para que
+ambos lados usen exactamente los mismos factores.
+
+Se usa la esfera de radio 6371 km, la misma que el Haversine del código C
+genérico y el analizador de trayectorias. El coseno se tabula por bandas
+de 0.1° y se interpola linealmente: cada consulta es O(1).
+
+Solo depende de la biblioteca estándar, así que importarlo no pesa.
+
+Autor: Wilson Ramos Pacco
+Universidad Nacional de San Agustín de Arequipa
+"""
+
+import math
+from typing import Dict, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+# Metros por grado de latitud (constante en la esfera)
+METERS_PER_DEGREE_LAT = EARTH_RADIUS_M * math.pi / 180.0
+
+# Ancho de banda de la tabla en grados
+BAND_DEGREES = 0.1
+_BANDS = int(round(180.0 / BAND_DEGREES))
+# cos(latitud) en los bordes de banda de -90° a 90°
+COS_LAT_TABLE = tuple(math.cos(math.radians(-90.0 + i * BAND_DEGREES)) for i in range(_BANDS + 1))
+
+def cos_lat(latitude: float) -> float:
+    """cos(latitud) interpolado desde la tabla"""
+    position = (min(max(latitude, -90.0), 90.0) + 90.0) / BAND_DEGREES
+    index = min(int(position), _BANDS - 1)
+    fraction = position - index
+    return COS_LAT_TABLE[index] + (COS_LAT_TABLE[index + 1] - COS_LAT_TABLE[index]) * fraction
+
+def meters_per_degree(latitude: float) -> Tuple[float, float]:
+    """(metros por grado de latitud, metros por grado de longitud) en una latitud"""
+    return METERS_PER_DEGREE_LAT, METERS_PER_DEGREE_LAT * cos_lat(latitude)
+
+def zone_area_km2(lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> float:
+    """Área aproximada (km²) de una caja lat/lon, escalando la longitud en su latitud central"""
+    lat_m, lon_m = meters_per_degree((lat_min + lat_max) / 2)
+    return abs(lat_max - lat_min) * lat_m * abs(lon_max - lon_min) * lon_m / 1e6
+
+def zone_constants(latitude: float) -> Dict[str, float]:
+    """Constantes de conversión para una zona, tal como se emiten en el C generado"""
+    lat_m, lon_m = meters_per_degree(latitude)
+    return {
+        'lat_rad': math.radians(latitude),
+        'cos_lat': cos_lat(latitude),
+        'lat_to_meters': lat_m,
+        'lon_to_meters': lon_m
+    }
@@ -22,32 +22,126 @@ Universidad Nacional de San Agustín de Arequipa
 """
 
 import re
+import io
 import os
+import sys
 import json
+import hashlib
+import contextlib
 import subprocess
 import time
-import re
-import os
 import platform
-import json
 import shutil
-import math
-import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
 from datetime import datetime
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-# Importar nuestro sistema ML
-from ml_optimization_brain import OptimizationBrain
+from concurrent.futures import ProcessPoolExecutor
+
+from c_transform import CSourceTree, CSyntaxError
+from geo_scale import zone_constants
+
+# Dependencias pesadas diferidas: matplotlib/seaborn se cargan al generar
+# gráficos y el sistema ML (sklearn, pandas, joblib) al predecir, de modo
+# que reescribir C no paga su tiempo de importación
+plt = None
+sns = None
+
+# Presupuesto de importación para los módulos del pipeline (segundos)
+IMPORT_BUDGET_SECONDS = 0.5
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'pandas', 'sklearn', 'joblib')
+
+def _import_plotting():
+    """Importa matplotlib y seaborn solo cuando se generan visualizaciones"""
+    global plt, sns
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+def check_import_budget(modules: Tuple[str, ...] = ('ml_code_generator', 'ml_optimization_brain'),
+                        budget_seconds: float = IMPORT_BUDGET_SECONDS) -> bool:
+    """
+    Importa cada módulo en un intérprete limpio y verifica que cargue dentro
+    del presupuesto y sin arrastrar dependencias pesadas
+    """
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        "print(','.join(name for name in {heavy!r} if name in sys.modules))\n"
+    )
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    within_budget = True
+    
+    for module in modules:
+        result = subprocess.run(
+            [sys.executable, '-c', script.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=module_dir
+        )
+        if result.returncode != 0:
+            print(f"❌ {module}: error al importar\n{result.stderr}")
+            within_budget = False
+            continue
+        
+        elapsed_line, heavy_line = (result.stdout.strip().split('\n') + [''])[:2]
+        elapsed = float(elapsed_line)
+        loaded = [name for name in heavy_line.split(',') if name]
+        ok = elapsed <= budget_seconds and not loaded
+        within_budget = within_budget and ok
+        
+        status = "✅" if ok else "❌"
+        print(f"{status} {module}: {elapsed * 1000:.0f} ms (presupuesto {budget_seconds * 1000:.0f} ms)"
+              + (f", carga {', '.join(loaded)}" if loaded else ""))
+    
+    return within_budget
+
+def _write_atomic(path: str, content: str):
+    """Escribe un archivo de forma atómica (temporal + os.replace)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
 
 class MLCodeOptimizer:
     """
-    Generador automático de código optimizado usando predicciones ML
+    Generador automático de código optimizado usando predicciones ML.
+    
+    El código se analiza una vez con CSourceTree; cada plantilla de
+    optimización reescribe el árbol y el resultado se imprime al final.
     """
     
-    def __init__(self):
+    # Condiciones (sin espacios ni comentarios) de las verificaciones de rango GPS
+    RANGE_CHECK_RE = re.compile(
+        r'lat\w*<-90(?:\.0*)?\|\|lat\w*>90(?:\.0*)?'
+        r'|lon\w*<-180(?:\.0*)?\|\|lon\w*>180(?:\.0*)?'
+        r'|!validateGPSCoordinates\([^|]*\)(?:\|\|!validateGPSCoordinates\([^|]*\))*'
+    )
+    # Verificaciones NULL: !a || !b, p == NULL, y !p (solo con printf en el cuerpo)
+    NULL_CHECK_RE = re.compile(r'!\w+\|\|!\w+|\w+==NULL')
+    SINGLE_NULL_CHECK_RE = re.compile(r'!\w+')
+    
+    # Se incrementa cuando cambia el resultado de alguna pasada (invalida la memoización)
+    TRANSFORM_VERSION = 1
+    # Campos de la especificación Newton que lee cada pasada (forman parte de su clave)
+    TEMPLATE_SPEC_FIELDS = {
+        'use_float_instead_double': ('geographic_area_km2',),
+        'eliminate_range_checks': ('latitude_is_small_range', 'longitude_is_small_range'),
+        'use_euclidean_approx': ('geographic_area_km2', 'latitude_min', 'latitude_max'),
+        'eliminate_null_checks': (),
+        'compress_data_types': ('speed_max', 'satellites_max'),
+        'precompute_constants': ('geographic_area_km2', 'latitude_min', 'latitude_max',
+                                 'longitude_min', 'longitude_max'),
+        'standardize_benchmark': ()
+    }
+    # Ancho de los intervalos de confianza en la clave de memoización
+    CONFIDENCE_BUCKET = 0.1
+    # Entradas de la memoización en memoria
+    MEMO_MAX_ENTRIES = 512
+    
+    def __init__(self, cache_dir: Optional[str] = None):
         self.optimization_templates = {
             'use_float_instead_double': self._apply_float_optimization,
             'eliminate_range_checks': self._apply_eliminate_range_checks,
@@ -60,6 +154,15 @@ class MLCodeOptimizer:
         # Estadísticas de optimización
         self.optimization_stats = {}
         
+        # Memoización de resultados intermedios por pasada (memoria y, opcionalmente, disco)
+        self._transform_memo = {}
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.cache = None
+        if cache_dir:
+            from ml_optimization_brain import FeatureCache
+            self.cache = FeatureCache(cache_dir)
+        
     def generate_optimized_code(self, 
                               generic_code_file: str,
                               ml_predictions: Dict,
@@ -75,66 +178,204 @@ class MLCodeOptimizer:
         with open(generic_code_file, 'r', encoding='utf-8') as f:
             original_code = f.read()
         
-        # Aplicar optimizaciones secuencialmente
-        optimized_code = original_code
-        applied_optimizations = []
+        # Sin cambios en código, especificación ni predicciones: no se reescribe
+        if self.existing_generation_key(output_file) == self.generation_key(original_code, ml_predictions,
+                                                                              newton_specs):
+            print(f"♻️ {output_file} ya está al día; no se regenera")
+            with open(output_file, 'r', encoding='utf-8') as f:
+                applied_optimizations = re.findall(r'^ \* ✅ (\w+):', f.read(8192), re.MULTILINE)
+            self._update_stats(ml_predictions, applied_optimizations)
+            return output_file
         
-        print("🔧 Aplicando optimizaciones predichas por ML:")
+        optimized_code, applied_optimizations = self.optimize_code(original_code, ml_predictions, newton_specs)
         
-        for opt_name, prediction in ml_predictions.items():
-            confidence = prediction['confidence']
-            should_apply = prediction['apply']
-            
-            # Lógica corregida de mensajes - REDUCIR umbral para aplicar más optimizaciones
-            if should_apply and confidence > 0.6:  # CAMBIO: 0.7 → 0.6 para ser más agresivo
-                print(f"  ✅ Aplicando {opt_name} (ML recomienda: SÍ, confianza: {confidence:.1%})")
-                
-                if opt_name in self.optimization_templates:
-                    try:
-                        optimized_code = self.optimization_templates[opt_name](
-                            optimized_code, newton_specs, confidence
-                        )
-                        applied_optimizations.append(opt_name)
-                    except Exception as e:
-                        print(f"    ⚠️ Error aplicando {opt_name}: {e}")
-                else:
-                    print(f"    ⚠️ Template no implementado para {opt_name}")
-                    
-            elif should_apply and confidence <= 0.6:  # CAMBIO: 0.7 → 0.6
-                print(f"  ⚠️ Omitiendo {opt_name} (ML recomienda: SÍ, pero confianza baja: {confidence:.1%})")
-                
-            elif not should_apply and confidence > 0.6:  # CAMBIO: 0.7 → 0.6
-                print(f"  ❌ Omitiendo {opt_name} (ML recomienda: NO, confianza: {confidence:.1%})")
-                
-            else:  # not should_apply and confidence <= 0.6  # CAMBIO: 0.7 → 0.6
-                print(f"  ❓ Omitiendo {opt_name} (ML indeciso, confianza: {confidence:.1%})")
+        # Guardar código optimizado (escritura atómica)
+        _write_atomic(output_file, optimized_code)
+        
+        print(f"\n🎉 Código optimizado generado: {output_file}")
+        print(f"📊 Optimizaciones aplicadas: {len(applied_optimizations)}/{len(ml_predictions)}")
+        
+        return output_file
+    
+    def optimize_code(self, original_code: str, ml_predictions: Dict,
+                      newton_specs: Dict) -> Tuple[str, List[str]]:
+        """
+        Código optimizado en memoria según las predicciones ML; devuelve
+        (código, optimizaciones aplicadas) y actualiza optimization_stats
+        """
+        selected = self._select_optimizations(ml_predictions)
         
-        # CORREGIR: Añadir benchmark estandarizado al código ML generado
-        optimized_code = self._add_standardized_benchmark(optimized_code)
+        # Aplicar optimizaciones sobre un único árbol y añadir el benchmark estandarizado
+        optimized_code, applied_optimizations = self.transform(original_code, selected, newton_specs,
+                                                               standardize_benchmark=True)
         
         # Añadir header con información de generación
-        optimized_code = self._add_generation_header(optimized_code, applied_optimizations, ml_predictions)
+        optimized_code = self._add_generation_header(
+            optimized_code, applied_optimizations, ml_predictions,
+            self.generation_key(original_code, ml_predictions, newton_specs)
+        )
         
         # Asegurar que tiene todos los includes necesarios
         optimized_code = self._ensure_includes(optimized_code)
         
-        # Guardar código optimizado
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(optimized_code)
-        
-        print(f"\n🎉 Código optimizado generado: {output_file}")
-        print(f"📊 Optimizaciones aplicadas: {len(applied_optimizations)}/{len(ml_predictions)}")
+        self._update_stats(ml_predictions, applied_optimizations)
         
+        return optimized_code, applied_optimizations
+    
+    def _update_stats(self, ml_predictions: Dict, applied_optimizations: List[str]):
         self.optimization_stats = {
             'total_optimizations': len(ml_predictions),
             'applied_optimizations': len(applied_optimizations),
             'applied_list': applied_optimizations,
             'avg_confidence': sum(p['confidence'] for p in ml_predictions.values()) / len(ml_predictions)
         }
+    
+    def _select_optimizations(self, ml_predictions: Dict, verbose: bool = True) -> List[Tuple[str, float]]:
+        """Optimizaciones (nombre, confianza) que se aplican según las predicciones"""
+        selected = []
         
-        return output_file
+        if verbose:
+            print("🔧 Aplicando optimizaciones predichas por ML:")
+        
+        for opt_name, prediction in ml_predictions.items():
+            confidence = prediction['confidence']
+            should_apply = prediction['apply']
+            
+            # Lógica corregida de mensajes - REDUCIR umbral para aplicar más optimizaciones
+            if should_apply and confidence > 0.6:  # CAMBIO: 0.7 → 0.6 para ser más agresivo
+                selected.append((opt_name, confidence))
+                message = f"  ✅ Aplicando {opt_name} (ML recomienda: SÍ, confianza: {confidence:.1%})"
+                    
+            elif should_apply and confidence <= 0.6:  # CAMBIO: 0.7 → 0.6
+                message = f"  ⚠️ Omitiendo {opt_name} (ML recomienda: SÍ, pero confianza baja: {confidence:.1%})"
+                
+            elif not should_apply and confidence > 0.6:  # CAMBIO: 0.7 → 0.6
+                message = f"  ❌ Omitiendo {opt_name} (ML recomienda: NO, confianza: {confidence:.1%})"
+                
+            else:  # not should_apply and confidence <= 0.6  # CAMBIO: 0.7 → 0.6
+                message = f"  ❓ Omitiendo {opt_name} (ML indeciso, confianza: {confidence:.1%})"
+            
+            if verbose:
+                print(message)
+        
+        return selected
     
-    def _add_generation_header(self, code: str, applied_opts: List[str], predictions: Dict) -> str:
+    def generation_key(self, original_code: str, ml_predictions: Dict, newton_specs: Dict) -> str:
+        """
+        Clave del archivo generado: cadena de pasadas más las predicciones que
+        muestra el header. Si coincide con la del archivo existente no hay que
+        regenerarlo.
+        """
+        selected = self._select_optimizations(ml_predictions, verbose=False)
+        chain_key = self._step_keys(original_code, self._steps(selected, True), newton_specs)[-1]
+        shown = [(name, f"{prediction['confidence']:.1%}", prediction.get('explanation', ''))
+                 for name, prediction in ml_predictions.items()]
+        return hashlib.sha256(json.dumps([chain_key, shown], ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def existing_generation_key(output_file: str) -> Optional[str]:
+        """Clave registrada en el header de un archivo generado, o None"""
+        try:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                head = f.read(4096)
+        except (OSError, UnicodeDecodeError):
+            return None
+        match = re.search(r'Clave de generación: ([0-9a-f]{64})', head)
+        return match.group(1) if match else None
+    
+    def transform(self, code: str, optimizations: List[Tuple[str, float]], newton_specs: Dict,
+                  standardize_benchmark: bool = False) -> Tuple[str, List[str]]:
+        """
+        Analiza el código una vez, aplica las optimizaciones (nombre, confianza)
+        en orden como reescrituras del árbol e imprime el resultado una vez.
+        Devuelve (código, optimizaciones aplicadas).
+        
+        El resultado de cada pasada se memoriza por (hash de la entrada, pasada,
+        campos de la especificación que lee, intervalo de confianza): se retoma
+        desde la primera pasada que cambió y, si ninguna cambió, no se analiza
+        el código.
+        """
+        steps = self._steps(optimizations, standardize_benchmark)
+        keys = self._step_keys(code, steps, newton_specs)
+        
+        # Prefijo más largo de pasadas ya memorizadas
+        start, current, applied = 0, code, []
+        for position in range(len(steps) - 1, -1, -1):
+            cached = self._memo_get(keys[position])
+            if cached is not None:
+                start, current, applied = position + 1, cached['code'], list(cached['applied'])
+                break
+        if start:
+            print(f"    ♻️ {start}/{len(steps)} pasadas reutilizadas de la memoización")
+        if start == len(steps):
+            return current, applied
+        
+        try:
+            tree = CSourceTree(current)
+        except CSyntaxError as e:
+            print(f"    ⚠️ No se pudo analizar el código C, se deja sin optimizar: {e}")
+            return code, []
+        
+        for position in range(start, len(steps)):
+            opt_name, confidence = steps[position]
+            if opt_name == 'standardize_benchmark':
+                # CORREGIR: Añadir benchmark estandarizado al código ML generado
+                self._standardize_benchmark(tree)
+            elif opt_name not in self.optimization_templates:
+                print(f"    ⚠️ Template no implementado para {opt_name}")
+            else:
+                try:
+                    self.optimization_templates[opt_name](tree, newton_specs, confidence)
+                    applied.append(opt_name)
+                except Exception as e:
+                    print(f"    ⚠️ Error aplicando {opt_name}: {e}")
+            current = tree.render()
+            self._memo_put(keys[position], {'code': current, 'applied': applied})
+        
+        return current, applied
+    
+    @staticmethod
+    def _steps(optimizations: List[Tuple[str, float]], standardize_benchmark: bool) -> List[Tuple[str, float]]:
+        """Pasadas en orden; el benchmark estandarizado es la última"""
+        return list(optimizations) + ([('standardize_benchmark', 1.0)] if standardize_benchmark else [])
+    
+    def _step_keys(self, code: str, steps: List[Tuple[str, float]], newton_specs: Dict) -> List[str]:
+        """Clave encadenada de la salida de cada pasada"""
+        key = hashlib.sha256(f"v{self.TRANSFORM_VERSION}\0{code}".encode('utf-8')).hexdigest()
+        keys = []
+        for opt_name, confidence in steps:
+            fields = [(field, newton_specs.get(field)) for field in self.TEMPLATE_SPEC_FIELDS.get(opt_name, ())]
+            bucket = int(confidence / self.CONFIDENCE_BUCKET)
+            key = hashlib.sha256(json.dumps([key, opt_name, fields, bucket]).encode('utf-8')).hexdigest()
+            keys.append(key)
+        return keys
+    
+    def _memo_get(self, key: str) -> Optional[Dict]:
+        value = self._transform_memo.get(key)
+        if value is None and self.cache is not None:
+            value = self.cache.get('transform', key)
+            if value is not None:
+                self._remember(key, value)
+        if value is None:
+            self.memo_misses += 1
+        else:
+            self.memo_hits += 1
+        return value
+    
+    def _memo_put(self, key: str, value: Dict):
+        value = {'code': value['code'], 'applied': list(value['applied'])}
+        self._remember(key, value)
+        if self.cache is not None:
+            self.cache.put('transform', key, value)
+    
+    def _remember(self, key: str, value: Dict):
+        """Memoización en memoria acotada (se descarta la entrada más antigua)"""
+        self._transform_memo[key] = value
+        if len(self._transform_memo) > self.MEMO_MAX_ENTRIES:
+            del self._transform_memo[next(iter(self._transform_memo))]
+    
+    def _add_generation_header(self, code: str, applied_opts: List[str], predictions: Dict,
+                               generation_key: Optional[str] = None) -> str:
         """Añade header con información de generación automática"""
         
         header = f"""/*
@@ -144,7 +385,10 @@ class MLCodeOptimizer:
  * Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
  * Sistema: Optimización IoT con ML + Newton DSL
  * Autor: Wilson Ramos Pacco - UNSA
- * 
+"""
+        if generation_key:
+            header += f" * Clave de generación: {generation_key}\n"
+        header += """ * 
  * OPTIMIZACIONES APLICADAS AUTOMÁTICAMENTE:
 """
         
@@ -208,33 +452,36 @@ class MLCodeOptimizer:
         
         return code
     
-    def _apply_float_optimization(self, code: str, specs: Dict, confidence: float) -> str:
+    def _apply_float_optimization(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Aplica optimización: double → float para precisión GPS suficiente"""
         
         # Solo aplicar si el área es pequeña
         area = specs.get('geographic_area_km2', float('inf'))
         if area > 1000:  # Solo para áreas pequeñas
-            return code
+            return False
         
         print(f"    🔄 Convirtiendo double → float (área: {area:.1f} km²)")
         
-        # Reemplazar tipos de coordenadas específicas
-        replacements = [
-            (r'\btypedef double generic_latitude;', 'typedef float optimized_latitude;'),
-            (r'\btypedef double generic_longitude;', 'typedef float optimized_longitude;'),
-            (r'\bgeneric_latitude\b', 'optimized_latitude'),
-            (r'\bgeneric_longitude\b', 'optimized_longitude'),
+        changed = False
+        for index in list(tree.identifiers()):
+            text = tree.texts[index]
+            previous = tree.prev_sig(index)
+            
+            # Tipos de coordenadas: typedef double generic_latitude; → typedef float optimized_latitude;
+            if text in ('generic_latitude', 'generic_longitude'):
+                if tree.text_at(previous) == 'double' and tree.text_at(tree.prev_sig(previous)) == 'typedef':
+                    tree.rename(previous, 'float')
+                tree.rename(index, text.replace('generic_', 'optimized_'))
+                changed = True
             
             # Mantener double para cálculos críticos, float para coordenadas
-            (r'\bdouble (lat\w*|lon\w*)\b', r'float \1'),
-        ]
-        
-        for pattern, replacement in replacements:
-            code = re.sub(pattern, replacement, code)
+            elif text.startswith(('lat', 'lon')) and tree.text_at(previous) == 'double':
+                tree.rename(previous, 'float')
+                changed = True
         
-        return code
+        return changed
     
-    def _apply_eliminate_range_checks(self, code: str, specs: Dict, confidence: float) -> str:
+    def _apply_eliminate_range_checks(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Elimina verificaciones de rango GPS innecesarias"""
         
         # Solo aplicar si tenemos rangos muy específicos
@@ -242,92 +489,96 @@ class MLCodeOptimizer:
         lon_small = specs.get('longitude_is_small_range', 0)
         
         if lat_small < 0.5 or lon_small < 0.5:  # No es rango pequeño
-            return code
+            return False
         
         print(f"    🔄 Eliminando verificaciones de rango GPS innecesarias")
         
-        # Patrones de verificaciones a eliminar
-        range_check_patterns = [
-            # Verificaciones típicas de latitud
-            r'if\s*\(\s*lat\w*\s*<\s*-90\.0?\s*\|\|\s*lat\w*\s*>\s*90\.0?\s*\)\s*{[^}]*return[^}]*}',
-            r'if\s*\(\s*lat\w*\s*<\s*-90\s*\|\|\s*lat\w*\s*>\s*90\s*\)\s*{[^}]*return[^}]*}',
-            
-            # Verificaciones típicas de longitud  
-            r'if\s*\(\s*lon\w*\s*<\s*-180\.0?\s*\|\|\s*lon\w*\s*>\s*180\.0?\s*\)\s*{[^}]*return[^}]*}',
-            r'if\s*\(\s*lon\w*\s*<\s*-180\s*\|\|\s*lon\w*\s*>\s*180\s*\)\s*{[^}]*return[^}]*}',
-            
-            # Llamadas a funciones de validación
-            r'if\s*\(\s*!\s*validateGPSCoordinates\([^)]*\)\s*\)\s*{[^}]*return[^}]*}',
-            r'if\s*\(\s*!validateGPSCoordinates\([^)]*\)\s*\)\s*{[^}]*return[^}]*}',
-        ]
-        
-        for pattern in range_check_patterns:
-            matches = re.findall(pattern, code, re.DOTALL)
-            if matches:
-                print(f"      - Eliminando {len(matches)} verificaciones de rango")
-                code = re.sub(pattern, '// ML-OPTIMIZED: Range check eliminated (guaranteed by Newton DSL)', code, flags=re.DOTALL)
-        
-        return code
+        removed = self._remove_guarded_returns(tree, self.RANGE_CHECK_RE,
+                                               '// ML-OPTIMIZED: Range check eliminated (guaranteed by Newton DSL)')
+        if removed:
+            print(f"      - Eliminando {removed} verificaciones de rango")
+        return removed > 0
     
-    def _apply_euclidean_approximation(self, code: str, specs: Dict, confidence: float) -> str:
+    def _remove_guarded_returns(self, tree: CSourceTree, condition_re: re.Pattern, marker: str,
+                                requires: Tuple[str, ...] = ()) -> int:
+        """
+        Sustituye por un comentario los if cuya condición coincide y cuyo cuerpo
+        (bloque con o sin llaves anidadas) contiene un return
+        """
+        removed = 0
+        for statement in tree.if_statements():
+            if not statement.removable or not tree.intact(statement.start, statement.end):
+                continue
+            if not condition_re.fullmatch(tree.compact(*statement.condition)):
+                continue
+            body_start, body_end = statement.body
+            if not all(tree.contains(statement.condition[1], body_end, name) for name in ('return',) + requires):
+                continue
+            tree.replace(statement.start, statement.end, f"; {marker}\n" if statement.is_sole_body else marker)
+            removed += 1
+        return removed
+    
+    def _apply_euclidean_approximation(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Aplica aproximación euclidiana en lugar de Haversine para distancias cortas"""
         
         area = specs.get('geographic_area_km2', float('inf'))
         if area > 400:  # Solo para áreas < 20km x 20km
-            return code
+            return False
         
         print(f"    🔄 Aplicando aproximación euclidiana (área: {area:.1f} km²)")
         
-        # Buscar función de cálculo de distancia Haversine
-        haversine_pattern = r'(double\s+\w*calculateDistance\w*\([^{]*\{[^}]*)(sin\([^}]*cos\([^}]*atan2[^}]*)(})'
-        
-        def replace_haversine(match):
-            function_start = match.group(1)
-            haversine_body = match.group(2)
-            function_end = match.group(3)
+        lat_center = (specs.get('latitude_min', -16.41) + specs.get('latitude_max', -16.31)) / 2
+        zone = zone_constants(lat_center)
+        changed = False
+        
+        # Buscar funciones double *calculateDistance*(lat1, lon1, lat2, lon2) con Haversine
+        for function in tree.functions():
+            body_start, body_end = function.body
+            # El cuerpo se sustituye entero: absorbe reescrituras previas dentro de él
+            if ('calculateDistance' not in function.name
+                    or 'double' not in tree.return_type(function).split()
+                    or not all(tree.contains(body_start, body_end, name) for name in ('sin', 'cos', 'atan2'))):
+                continue
+            params = tree.parameter_names(function)
+            if len(params) != 4:
+                continue
+            lat1, lon1, lat2, lon2 = params
             
-            # Generar código de aproximación euclidiana optimizado
-            lat_center = specs.get('latitude_range', 0) / 2 - 16.357907  # Centro de Arequipa
+            # Cuerpo original conservado como comentario línea a línea
+            haversine_body = '\n'.join(f"    // {line.strip()}" for line in
+                                       tree.text(body_start + 1, body_end - 1).strip().splitlines() if line.strip())
             euclidean_body = f"""
     // ML-OPTIMIZED: Euclidean approximation for small area ({area:.1f} km²)
     // Error < 0.1% for distances < 20km
-    const float LAT_TO_METERS = 111320.0f;
-    const float LON_TO_METERS = 106642.0f;  // Precomputed for lat ≈ {lat_center:.6f}°
+    const float LAT_TO_METERS = {zone['lat_to_meters']:.1f}f;
+    const float LON_TO_METERS = {zone['lon_to_meters']:.1f}f;  // Precomputed for lat ≈ {lat_center:.6f}°
     
-    float dlat_m = (lat2 - lat1) * LAT_TO_METERS;
-    float dlon_m = (lon2 - lon1) * LON_TO_METERS;
+    float dlat_m = ({lat2} - {lat1}) * LAT_TO_METERS;
+    float dlon_m = ({lon2} - {lon1}) * LON_TO_METERS;
     
     return sqrt(dlat_m * dlat_m + dlon_m * dlon_m);
-    // Original Haversine: {haversine_body.strip()}
-    """
-            
-            return function_start + euclidean_body + function_end
-        
-        code = re.sub(haversine_pattern, replace_haversine, code, flags=re.DOTALL)
+    // Original Haversine:
+{haversine_body}
+"""
+            tree.replace(body_start + 1, body_end - 1, euclidean_body)
+            changed = True
         
-        return code
+        return changed
     
-    def _apply_eliminate_null_checks(self, code: str, specs: Dict, confidence: float) -> str:
+    def _apply_eliminate_null_checks(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Elimina verificaciones NULL innecesarias en código simple"""
         
         print(f"    🔄 Eliminando verificaciones NULL innecesarias")
         
-        # Patrones de verificaciones NULL a eliminar
-        null_patterns = [
-            r'if\s*\(\s*!\s*\w+\s*\|\|\s*!\s*\w+\s*\)\s*{[^}]*return[^}]*}',
-            r'if\s*\(\s*\w+\s*==\s*NULL\s*\)\s*{[^}]*return[^}]*}',
-            r'if\s*\(\s*!\s*\w+\s*\)\s*{[^}]*printf[^}]*return[^}]*}',
-        ]
-        
-        for pattern in null_patterns:
-            matches = re.findall(pattern, code, re.DOTALL)
-            if matches:
-                print(f"      - Eliminando {len(matches)} verificaciones NULL")
-                code = re.sub(pattern, '// ML-OPTIMIZED: NULL check eliminated (guaranteed safe)', code, flags=re.DOTALL)
-        
-        return code
+        marker = '// ML-OPTIMIZED: NULL check eliminated (guaranteed safe)'
+        removed = self._remove_guarded_returns(tree, self.NULL_CHECK_RE, marker)
+        # Un único puntero negado solo se elimina si el cuerpo informa del error
+        removed += self._remove_guarded_returns(tree, self.SINGLE_NULL_CHECK_RE, marker, requires=('printf',))
+        if removed:
+            print(f"      - Eliminando {removed} verificaciones NULL")
+        return removed > 0
     
-    def _apply_data_compression(self, code: str, specs: Dict, confidence: float) -> str:
+    def _apply_data_compression(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Aplica compresión de tipos de datos basada en rangos conocidos"""
         
         print(f"    🔄 Comprimiendo tipos de datos")
@@ -335,28 +586,44 @@ class MLCodeOptimizer:
         # Obtener rangos de las especificaciones
         speed_max = specs.get('speed_max', 1000)
         sat_max = specs.get('satellites_max', 50)
+        changed = False
         
         # Aplicar compresión si los rangos lo permiten
         if speed_max <= 255:
-            code = re.sub(r'\btypedef double generic_speed;', 'typedef unsigned char optimized_speed;  // ML: 0-255 sufficient', code)
-            code = re.sub(r'\bgeneric_speed\b', 'optimized_speed', code)
+            changed |= self._compress_typedef(tree, 'generic_speed', 'double', 'optimized_speed')
             
             # ARREGLAR: Actualizar printf para usar %d en lugar de %f para unsigned char
-            code = re.sub(r'printf\("([^"]*%.2)f([^"]*km/h[^"]*)", speed\)', r'printf("\1d\2", speed)', code)
-            code = re.sub(r'printf\("([^"]*%.1)f([^"]*km/h[^"]*)", speed\)', r'printf("\1d\2", speed)', code)
+            for _, open_paren, close_paren in tree.calls('printf'):
+                arguments = list(tree.sig_between(open_paren, close_paren))
+                if (len(arguments) == 3 and tree.kinds[arguments[0]] == 'string'
+                        and tree.texts[arguments[2]] == 'speed' and 'km/h' in tree.texts[arguments[0]]):
+                    tree.rename(arguments[0], re.sub(r'%\.([12])f', r'%.\1d', tree.texts[arguments[0]]))
         
         if sat_max <= 255:
-            code = re.sub(r'\btypedef int generic_satellites;', 'typedef unsigned char optimized_satellites;  // ML: 0-255 sufficient', code)
-            code = re.sub(r'\bgeneric_satellites\b', 'optimized_satellites', code)
-        
-        return code
-    
-    def _apply_precomputed_constants(self, code: str, specs: Dict, confidence: float) -> str:
+            changed |= self._compress_typedef(tree, 'generic_satellites', 'int', 'optimized_satellites')
+        
+        return changed
+    
+    def _compress_typedef(self, tree: CSourceTree, generic_name: str, generic_type: str, optimized_name: str) -> bool:
+        """typedef <generic_type> <generic_name>; → typedef unsigned char <optimized_name>; y renombra usos"""
+        changed = False
+        for index in list(tree.identifiers(generic_name)):
+            previous = tree.prev_sig(index)
+            if tree.text_at(previous) == generic_type and tree.text_at(tree.prev_sig(previous)) == 'typedef':
+                tree.rename(previous, 'unsigned char')
+                semicolon = tree.next_sig(index)
+                if tree.text_at(semicolon) == ';':
+                    tree.rename(semicolon, ';  // ML: 0-255 sufficient')
+            tree.rename(index, optimized_name)
+            changed = True
+        return changed
+    
+    def _apply_precomputed_constants(self, tree: CSourceTree, specs: Dict, confidence: float) -> bool:
         """Precomputa constantes específicas para la zona GPS"""
         
         area = specs.get('geographic_area_km2', float('inf'))
         if area > 1000:
-            return code
+            return False
         
         print(f"    🔄 Precomputando constantes para zona específica")
         
@@ -368,6 +635,7 @@ class MLCodeOptimizer:
         
         lat_center = (lat_min + lat_max) / 2
         lon_center = (lon_min + lon_max) / 2
+        zone = zone_constants(lat_center)
         
         # Añadir constantes precomputadas al inicio del archivo
         constants_block = f"""
@@ -375,65 +643,79 @@ class MLCodeOptimizer:
 // Zone center: ({lat_center:.6f}°, {lon_center:.6f}°), Area: {area:.1f} km²
 #define GPS_ZONE_LAT_CENTER  {lat_center:.6f}f
 #define GPS_ZONE_LON_CENTER  {lon_center:.6f}f
-#define GPS_ZONE_LAT_RAD     {lat_center * 3.14159/180:.6f}f
-#define GPS_ZONE_COS_LAT     {np.cos(lat_center * 3.14159/180):.6f}f
-#define LAT_TO_METERS_ZONE   111320.0f
-#define LON_TO_METERS_ZONE   {111320.0 * math.cos(lat_center * 3.14159/180):.1f}f
+#define GPS_ZONE_LAT_RAD     {zone['lat_rad']:.6f}f
+#define GPS_ZONE_COS_LAT     {zone['cos_lat']:.6f}f
+#define LAT_TO_METERS_ZONE   {zone['lat_to_meters']:.1f}f
+#define LON_TO_METERS_ZONE   {zone['lon_to_meters']:.1f}f
 
 """
-        
-        # Insertar después de los includes
-        include_pattern = r'(#include\s*<[^>]+>\s*\n)+\s*'
-        match = re.search(include_pattern, code)
-        if match:
-            insert_pos = match.end()
-            code = code[:insert_pos] + constants_block + code[insert_pos:]
+        # Insertar después del primer bloque de #include (y sus líneas en blanco)
+        is_include = lambda i: tree.kinds[i] == 'directive' and tree.texts[i].startswith('#include')
+        index = 0
+        while index < len(tree.texts) and not is_include(index):
+            index += 1
+        if index == len(tree.texts):
+            index = 0
         else:
-            code = constants_block + code
+            while index < len(tree.texts) and (tree.kinds[index] == 'space' or is_include(index)):
+                index += 1
         
-        return code
+        tree.insert_before(index, constants_block)
+        return True
     
     def _add_standardized_benchmark(self, code: str) -> str:
         """Añade benchmark estandarizado para comparación científica consistente"""
+        try:
+            tree = CSourceTree(code)
+        except CSyntaxError as e:
+            print(f"    ⚠️ No se pudo analizar el código C: {e}")
+            return code
+        self._standardize_benchmark(tree)
+        return tree.render()
+    
+    def _standardize_benchmark(self, tree: CSourceTree):
+        """Estandariza generic_benchmark(): iteraciones, medición de tiempo y tiempo mínimo"""
         
         print("    🔬 Añadiendo benchmark estandarizado para comparación científica")
         
         # Encontrar función de benchmark genérica
-        benchmark_pattern = r'(void\s+generic_benchmark\(\)\s*{[^}]*)(const int iterations = \d+;)'
-        
-        def replace_benchmark(match):
-            function_start = match.group(1)
-            old_iterations = match.group(2)
-            
-            # Reemplazar con benchmark estandarizado
-            new_benchmark = """const int iterations = 100000;  // ESTANDARIZADO: Mismo que CoSense y Genérico
-    
-    // ESTANDARIZADO: Mismo método de medición de tiempo
-    clock_t start_clock = clock();
-    
-    // ESTANDARIZADO: Misma variable volatile para evitar optimización del compilador
-    volatile double total_distance = 0.0;"""
-            
-            return function_start + new_benchmark
-        
-        # Aplicar el reemplazo
-        code = re.sub(benchmark_pattern, replace_benchmark, code, flags=re.DOTALL)
-        
-        # También estandarizar los cálculos de tiempo
-        time_pattern = r'(double total_time = [^;]+;)\s*(if \(total_time < [\d.]+\) {[^}]+})'
-        
-        def replace_time_calc(match):
-            return """double total_time = ((double)(end_clock - start_clock)) / CLOCKS_PER_SEC;
-    
-    // ESTANDARIZADO: Mismo tiempo mínimo en todos los archivos
-    if (total_time < 0.005) {
+        function = tree.function('generic_benchmark')
+        if function is None or not tree.intact(*function.body):
+            return
+        body_start, body_end = function.body
+        
+        # ESTANDARIZADO: Mismo número de iteraciones que CoSense y Genérico
+        for index in tree.identifiers('iterations'):
+            type_index = tree.prev_sig(index)
+            if not (body_start < index < body_end and tree.text_at(type_index) == 'int'
+                    and tree.text_at(tree.prev_sig(type_index)) == 'const'):
+                continue
+            value = tree.next_sig(tree.next_sig(index))
+            if tree.text_at(tree.next_sig(index)) == '=' and tree.kinds[value] == 'number':
+                tree.rename(value, '100000')
+                statement_end = tree.statement_end(index)
+                
+                # ESTANDARIZADO: Mismo método de medición de tiempo y variable volatile
+                missing = ""
+                if not tree.contains(body_start, body_end, 'start_clock'):
+                    missing += "\n    \n    // ESTANDARIZADO: Mismo método de medición de tiempo\n    clock_t start_clock = clock();"
+                if not tree.contains(body_start, body_end, 'total_distance'):
+                    missing += ("\n    \n    // ESTANDARIZADO: Misma variable volatile para evitar optimización del compilador"
+                                "\n    volatile double total_distance = 0.0;")
+                if missing:
+                    tree.rename(statement_end, ';' + missing)
+                break
+        
+        # También estandarizar el tiempo mínimo
+        for statement in tree.if_statements():
+            if (body_start < statement.start < body_end and statement.removable
+                    and tree.compact(*statement.condition).startswith('total_time<')
+                    and tree.intact(statement.start, statement.end)):
+                tree.replace(statement.start, statement.end, """if (total_time < 0.005) {
         total_time = 0.005; // Mínimo 5ms para operaciones con sqrt()
-    }"""
-        
-        code = re.sub(time_pattern, replace_time_calc, code, flags=re.DOTALL)
-        
-        return code
-
+    }""")
+                break
+    
 class MLVisualizationGenerator:
     """
     Generador de visualizaciones para comparación de resultados ML
@@ -444,6 +726,7 @@ class MLVisualizationGenerator:
         self.output_dir.mkdir(exist_ok=True)
         
         # Configurar estilo de gráficos
+        _import_plotting()
         plt.style.use('seaborn-v0_8' if 'seaborn-v0_8' in plt.style.available else 'default')
         sns.set_palette("husl")
     
@@ -1223,7 +1506,7 @@ class MLCodeComparator:
         
         return results
     
-    def _analyze_version(self, source_file: str, version_name: str) -> Dict:
+    def _analyze_version(self, source_file: str, version_name: str, binary_dir: str = ".") -> Dict:
         """Analiza una versión específica del código"""
         
         results = {
@@ -1236,7 +1519,7 @@ class MLCodeComparator:
         
         # Compilar - CORREGIDO: Agregar .exe en Windows
         import platform
-        binary_name = f"geofencing_{version_name}"
+        binary_name = os.path.join(binary_dir, f"geofencing_{version_name}")
         if platform.system() == "Windows":
             binary_name += ".exe"
             
@@ -1270,7 +1553,7 @@ class MLCodeComparator:
             if os.path.exists(binary_name):
                 try:
                     # En Windows, usar el comando completo con extensión
-                    if platform.system() == "Windows":
+                    if platform.system() == "Windows" or os.path.isabs(binary_name):
                         cmd = [binary_name]
                     else:
                         cmd = [f'./{binary_name}']
@@ -1324,7 +1607,8 @@ class MLCodeComparator:
         patterns = {
             'ops_per_second': r'Operaciones por segundo: ([\d.,]+)',
             'total_time': r'Tiempo total: ([\d.,]+) segundos',
-            'memory_usage': r'Total por punto \+ geocerca: (\d+) bytes'
+            'memory_usage': r'Total por punto \+ geocerca: (\d+) bytes',
+            'total_distance': r'Distancia total calculada: (-?[\d.,]+) metros'
         }
         
         # También buscar patrones alternativos en caso de que la salida sea diferente
@@ -1509,6 +1793,251 @@ class MLCodeComparator:
                 version_label = {'generic': 'Genérico', 'cosense': 'CoSense', 'ml_auto': 'ML Automático'}[version]
                 print(f"  {version_label:12}: {size/1024:.1f} KB")
 
+class BenchmarkDatasetBuilder:
+    """
+    Construye casos de entrenamiento a partir de mediciones reales: aplica
+    cada transformación de MLCodeOptimizer a variantes de código C, las
+    compila y mide con MLCodeComparator y etiqueta cada optimización según
+    la aceleración y el error obtenidos en esta máquina
+    """
+    
+    # Tiempo mínimo con el que el benchmark estandarizado recorta sus mediciones
+    BENCHMARK_TIME_FLOOR = 0.005
+    
+    def __init__(self, store_path: str = "training_data.sqlite", work_dir: str = "benchmark_training",
+                 min_speedup: float = 1.05, max_relative_error: float = 1e-3,
+                 iterations: int = 2000000):
+        from ml_optimization_brain import OptimizationBrain, TrainingDataStore
+        
+        self.store = TrainingDataStore(store_path)
+        self.brain = OptimizationBrain(model_path=None)
+        self.optimizer = MLCodeOptimizer()
+        self.comparator = MLCodeComparator()
+        self.work_dir = work_dir
+        self.min_speedup = min_speedup
+        self.max_relative_error = max_relative_error
+        # Más iteraciones que el benchmark estándar para no medir en el suelo de 5 ms
+        self.iterations = iterations
+        self.host = f"{platform.system()}-{platform.machine()}-{platform.processor() or 'cpu'}"
+        os.makedirs(work_dir, exist_ok=True)
+    
+    def build(self, code_files: List[str], newton_files: List[str], repeats: int = 1) -> int:
+        """Mide cada (código, Newton) y guarda un caso por combinación; devuelve los añadidos"""
+        added = 0
+        for code_file in code_files:
+            for newton_file in newton_files:
+                if self._build_sample(code_file, newton_file, repeats):
+                    added += 1
+        
+        print(f"\n✅ {added} casos medidos guardados en {self.store.db_path} "
+              f"({self.store.count()} en total)")
+        return added
+    
+    def _build_sample(self, code_file: str, newton_file: str, repeats: int) -> bool:
+        """Mide la versión base y una variante por transformación"""
+        print(f"\n🔬 Caso de entrenamiento: {code_file} + {newton_file}")
+        with open(code_file, 'r', encoding='utf-8') as f:
+            code = f.read()
+        with open(newton_file, 'r', encoding='utf-8') as f:
+            newton_content = f.read()
+        
+        features = self.brain.feature_extractor.extract_features(code)
+        newton_specs = self.brain.newton_parser.parse_newton_content(newton_content)
+        
+        baseline = self._measure(self._prepare(code), 'train_base', repeats)
+        if not baseline:
+            print("  ❌ La versión base no compila o no reporta métricas; caso descartado")
+            return False
+        
+        labels = {}
+        measurements = {'baseline': baseline}
+        for opt_name in self.optimizer.optimization_templates:
+            variant, _ = self.optimizer.transform(code, [(opt_name, 1.0)], newton_specs)
+            
+            if variant == code:
+                # La transformación no encontró nada que cambiar en este código
+                labels[opt_name] = 0
+                measurements[opt_name] = {'applied': False}
+                continue
+            
+            result = self._measure(self._prepare(variant), f'train_{opt_name}', repeats)
+            if not result:
+                labels[opt_name] = 0
+                measurements[opt_name] = {'applied': True, 'compiled': False}
+                continue
+            
+            speedup = result['ops_per_second'] / baseline['ops_per_second']
+            relative_error = (abs(result['total_distance'] - baseline['total_distance'])
+                              / max(abs(baseline['total_distance']), 1e-9))
+            labels[opt_name] = int(speedup >= self.min_speedup and relative_error <= self.max_relative_error)
+            measurements[opt_name] = {'applied': True, 'compiled': True, 'speedup': speedup,
+                                      'relative_error': relative_error}
+            print(f"  {'✅' if labels[opt_name] else '❌'} {opt_name}: {speedup:.2f}x, "
+                  f"error relativo {relative_error:.2e}")
+        
+        sample_key = self.store.sample_key(code, newton_content, self.host)
+        self.store.add_sample(sample_key, code_file, newton_file, self.host,
+                              {**features, **newton_specs}, labels, measurements)
+        return True
+    
+    def _prepare(self, code: str) -> str:
+        """Mismo benchmark estandarizado e includes que el código generado, con más iteraciones"""
+        code = self.optimizer._ensure_includes(self.optimizer._add_standardized_benchmark(code))
+        return re.sub(r'const int iterations = \d+;', f'const int iterations = {self.iterations};', code)
+    
+    def _measure(self, code: str, name: str, repeats: int) -> Optional[Dict]:
+        """Compila y ejecuta; devuelve la mejor de `repeats` mediciones o None"""
+        source_file = os.path.join(self.work_dir, f"{name}.c")
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+        
+        best = None
+        for _ in range(max(1, repeats)):
+            performance = self.comparator._analyze_version(
+                source_file, name, binary_dir=self.work_dir
+            )['execution_performance']
+            if 'total_distance' not in performance or performance.get('ops_per_second', 0) <= 0:
+                return None
+            if performance.get('total_time', 0) <= self.BENCHMARK_TIME_FLOOR:
+                print(f"  ⚠️ {name}: medición en el tiempo mínimo del benchmark; aumenta iterations")
+                return None
+            if best is None or performance['ops_per_second'] > best['ops_per_second']:
+                best = {'ops_per_second': performance['ops_per_second'],
+                        'total_distance': performance['total_distance']}
+        return best
+
+# Optimizador por proceso del pool de generación por lotes
+_worker_optimizer = None
+
+def _init_codegen_worker(cache_dir: Optional[str]):
+    """Crea el optimizador (y su memoización en disco) una vez por proceso del pool"""
+    global _worker_optimizer
+    _worker_optimizer = MLCodeOptimizer(cache_dir=cache_dir)
+
+def _generate_manifest_entry(job: Tuple[int, Dict, Dict, Dict]) -> Dict:
+    """
+    Transforma y escribe un archivo del manifiesto; devuelve su resumen.
+    Los mensajes de cada pasada se silencian: el resumen los reemplaza.
+    """
+    entry_id, entry, ml_predictions, newton_specs = job
+    optimizer = _worker_optimizer or MLCodeOptimizer()
+    summary = {**entry, 'status': 'error', 'applied': [], 'bytes': 0}
+    summary['_entry_id'] = entry_id
+    start = time.perf_counter()
+    try:
+        with open(entry['source'], 'r', encoding='utf-8') as f:
+            original_code = f.read()
+        if optimizer.existing_generation_key(entry['output']) == optimizer.generation_key(
+                original_code, ml_predictions, newton_specs):
+            # Nada cambió desde la última generación: no se reescribe
+            summary.update(status='unchanged', bytes=os.path.getsize(entry['output']))
+            summary['seconds'] = time.perf_counter() - start
+            return summary
+        with contextlib.redirect_stdout(io.StringIO()):
+            optimized_code, applied = optimizer.optimize_code(original_code, ml_predictions, newton_specs)
+        _write_atomic(entry['output'], optimized_code)
+        summary.update(status='ok', applied=applied, bytes=len(optimized_code.encode('utf-8')))
+    except (OSError, UnicodeDecodeError) as e:
+        summary['error'] = str(e)
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+class BatchCodeGenerator:
+    """
+    Generación por lotes desde un manifiesto de tripletas (código, Newton,
+    salida): las predicciones se hacen con OptimizationBrain.analyze_many
+    (una inferencia vectorizada por especificación Newton) y la
+    transformación y escritura atómica de cada archivo en un pool de procesos
+    """
+    
+    def __init__(self, brain=None, max_workers: Optional[int] = None, cache_dir: Optional[str] = None):
+        if brain is None:
+            from ml_optimization_brain import OptimizationBrain
+            brain = OptimizationBrain()
+        self.brain = brain
+        self.max_workers = max_workers
+        # Memoización de pasadas compartida por los procesos del pool
+        self.cache_dir = cache_dir
+    
+    @staticmethod
+    def load_manifest(manifest_file: str) -> List[Dict]:
+        """
+        Lee un manifiesto JSON: lista de {"source", "newton", "output"}.
+        Las rutas relativas se resuelven respecto al manifiesto.
+        """
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(manifest_file))
+        manifest = []
+        for entry in entries:
+            missing = {'source', 'newton', 'output'} - set(entry)
+            if missing:
+                raise ValueError(f"Entrada del manifiesto sin {', '.join(sorted(missing))}: {entry}")
+            manifest.append({key: os.path.join(base_dir, entry[key]) for key in ('source', 'newton', 'output')})
+        return manifest
+    
+    def run(self, manifest: List[Dict], summary_file: Optional[str] = None) -> List[Dict]:
+        """Genera todas las salidas del manifiesto; devuelve un resumen por archivo"""
+        print(f"🏭 GENERACIÓN POR LOTES: {len(manifest)} archivos")
+        start = time.perf_counter()
+        
+        # Predicciones: una pasada de analyze_many por especificación Newton
+        by_spec = {}
+        for entry in manifest:
+            by_spec.setdefault(entry['newton'], []).append(entry)
+        
+        jobs = []
+        summaries = []
+        for newton_file, entries in by_spec.items():
+            sources = list(dict.fromkeys(entry['source'] for entry in entries))
+            reports = self.brain.analyze_many(sources, newton_file, max_workers=self.max_workers)
+            for entry in entries:
+                report = reports.get(entry['source'])
+                if report is None:
+                    summaries.append({**entry, 'status': 'error', 'applied': [], 'bytes': 0, 'seconds': 0.0,
+                                      'error': 'no se pudieron extraer características', '_entry_id': id(entry)})
+                    continue
+                jobs.append((id(entry), entry, report['ml_predictions'], report['newton_specs']))
+        
+        # Transformación y escritura en paralelo
+        if self.max_workers == 1 or len(jobs) < 2:
+            _init_codegen_worker(self.cache_dir)
+            summaries.extend(_generate_manifest_entry(job) for job in jobs)
+        else:
+            workers = self.max_workers or os.cpu_count() or 1
+            chunksize = max(1, len(jobs) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_codegen_worker,
+                                     initargs=(self.cache_dir,)) as executor:
+                summaries.extend(executor.map(_generate_manifest_entry, jobs, chunksize=chunksize))
+        
+        # Resumen en el orden del manifiesto
+        order = {id(entry): position for position, entry in enumerate(manifest)}
+        summaries.sort(key=lambda summary: order[summary.pop('_entry_id')])
+        
+        self.print_summary(summaries, time.perf_counter() - start)
+        if summary_file:
+            _write_atomic(summary_file, json.dumps(summaries, indent=2, ensure_ascii=False))
+            print(f"📄 Resumen guardado en: {summary_file}")
+        return summaries
+    
+    @staticmethod
+    def print_summary(summaries: List[Dict], elapsed: float):
+        """Imprime una línea por archivo y el total"""
+        print("\n📊 RESUMEN POR ARCHIVO")
+        for summary in summaries:
+            if summary['status'] == 'ok':
+                print(f"  ✅ {summary['output']}: {len(summary['applied'])} optimizaciones "
+                      f"({', '.join(summary['applied']) or 'ninguna'}), "
+                      f"{summary['bytes'] / 1024:.1f} KB, {summary['seconds'] * 1000:.0f} ms")
+            elif summary['status'] == 'unchanged':
+                print(f"  ♻️ {summary['output']}: sin cambios, no se reescribe")
+            else:
+                print(f"  ❌ {summary['source']}: {summary.get('error', 'error desconocido')}")
+        
+        generated = sum(1 for summary in summaries if summary['status'] == 'ok')
+        unchanged = sum(1 for summary in summaries if summary['status'] == 'unchanged')
+        print(f"\n🎉 {generated}/{len(summaries)} archivos generados ({unchanged} sin cambios) en {elapsed:.2f} s")
+
 def main():
     """Función principal - Pipeline completo ML → Código Optimizado"""
     
@@ -1520,6 +2049,7 @@ def main():
     
     # 1. Inicializar sistema ML
     print("🧠 Inicializando sistema de Machine Learning...")
+    from ml_optimization_brain import OptimizationBrain
     brain = OptimizationBrain()
     
     # 2. Analizar código genérico y obtener predicciones ML
@@ -1653,6 +2183,16 @@ def _print_final_conclusion(comparison_results: Dict):
     print(f"   📋 Reporte ejecutivo HTML interactivo")
 
 if __name__ == "__main__":
-    # Importar numpy aquí para evitar dependencias en el import principal
-    import numpy as np
+    if '--check-import-budget' in sys.argv:
+        sys.exit(0 if check_import_budget() else 1)
+    if '--manifest' in sys.argv:
+        # Generación por lotes: --manifest manifest.json [--workers N] [--transform-cache DIR]
+        manifest_file = sys.argv[sys.argv.index('--manifest') + 1]
+        workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else None
+        # --transform-cache DIR: memoización de pasadas en disco entre ejecuciones
+        cache_dir = sys.argv[sys.argv.index('--transform-cache') + 1] if '--transform-cache' in sys.argv else None
+        generator = BatchCodeGenerator(max_workers=workers, cache_dir=cache_dir)
+        summaries = generator.run(generator.load_manifest(manifest_file),
+                                  summary_file=os.path.splitext(manifest_file)[0] + '_summary.json')
+        sys.exit(0 if all(summary['status'] != 'error' for summary in summaries) else 1)
     main()
\ No newline at end of file
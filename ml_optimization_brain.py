@@ -20,23 +20,299 @@ import re
 import ast
 import json
 import os
-from typing import Dict, List, Tuple, Any
+import time
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Any, Optional, TYPE_CHECKING
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.svm import SVC
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report, accuracy_score
-import joblib
 from datetime import datetime
 
+from geo_scale import meters_per_degree, zone_area_km2
+
+# pandas, sklearn y joblib se importan dentro de los métodos que los usan:
+# extraer features o reescribir C no debe pagar su tiempo de carga
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    from pycparser import c_parser, c_ast
+except ImportError:
+    c_parser = None
+    c_ast = None
+
+class CParserFrontEnd:
+    """
+    Front-end opcional basado en un parser C real (pycparser).
+    
+    Produce características por función que las expresiones regulares no
+    pueden distinguir: llamadas anidadas en bucles, trigonometría en bucles
+    calientes (incluida la alcanzada a través de llamadas) y variables double
+    usadas en esos bucles. Solo se guardan en memoria los últimos ASTs
+    (por hash del contenido): las características derivadas ya se cachean
+    en disco con FeatureCache, y un trabajador de analyze_many no debe
+    retener el AST de cada archivo que analizó.
+    """
+    
+    TRIG_FUNCTIONS = {'sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'atan2',
+                      'sinf', 'cosf', 'tanf', 'asinf', 'acosf', 'atanf', 'atan2f'}
+    SQRT_FUNCTIONS = {'sqrt', 'sqrtf'}
+    # Identificadores de coordenadas: lat, lon1, center_lat, latitude_min...
+    GPS_IDENTIFIER_RE = re.compile(r'(^|_)(lat|lon|lng|latitude|longitude)\d*($|_)', re.IGNORECASE)
+    # Tipos de la biblioteca estándar que pycparser no conoce sin cabeceras
+    STD_TYPEDEFS = ' '.join(f'typedef int {name};' for name in (
+        'bool', 'size_t', 'ssize_t', 'ptrdiff_t', 'FILE', 'time_t', 'clock_t',
+        'int8_t', 'int16_t', 'int32_t', 'int64_t', 'uint8_t', 'uint16_t',
+        'uint32_t', 'uint64_t', 'intptr_t', 'uintptr_t'
+    ))
+    # Literales (se conservan), comentarios, directivas del preprocesador (con continuaciones de línea)
+    # y extensiones GCC que pycparser no acepta (__attribute__((packed)))
+    PREPROCESS_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|/\*.*?\*/|//[^\n]*|^[ \t]*#(?:[^\n]*\\\n)*[^\n]*'
+                               r'|__attribute__\s*\(\((?:[^()]|\([^()]*\))*\)\)|__extension__|__restrict__',
+                               re.DOTALL | re.MULTILINE)
+    # ASTs retenidos en memoria (se desaloja el más antiguo)
+    AST_CACHE_ENTRIES = 4
+    
+    def __init__(self):
+        if c_parser is None:
+            raise ImportError("pycparser no está instalado (pip install pycparser)")
+        self.parser = c_parser.CParser()
+        self._ast_cache = {}
+    
+    @staticmethod
+    def content_hash(code_content: str) -> str:
+        """Hash del contenido usado como clave de caché"""
+        return hashlib.sha256(code_content.encode('utf-8')).hexdigest()
+    
+    def parse(self, code_content: str):
+        """Parsea el código (cacheado por hash); None si no es parseable"""
+        key = self.content_hash(code_content)
+        if key not in self._ast_cache:
+            try:
+                tree = self.parser.parse(self._preprocess(code_content))
+            except Exception as e:
+                print(f"⚠️  pycparser no pudo parsear el código: {e}")
+                tree = None
+            self._ast_cache[key] = tree
+            if len(self._ast_cache) > self.AST_CACHE_ENTRIES:
+                del self._ast_cache[next(iter(self._ast_cache))]
+        return self._ast_cache[key]
+    
+    def _preprocess(self, code: str) -> str:
+        """Preprocesado mínimo: sin comentarios ni directivas, conservando líneas"""
+        def blank(match):
+            token = match.group(0)
+            return token if token[0] == '"' else '\n' * token.count('\n')
+        return self.STD_TYPEDEFS + ' ' + self.PREPROCESS_RE.sub(blank, code)
+    
+    def extract_function_features(self, code_content: str) -> Optional[Dict[str, Dict[str, float]]]:
+        """Características por función; None si el código no es parseable"""
+        tree = self.parse(code_content)
+        if tree is None:
+            return None
+        
+        typedefs = {}
+        double_fields = set()
+        global_doubles = set()
+        functions = []
+        for node in tree.ext:
+            if isinstance(node, c_ast.Typedef):
+                typedefs[node.name] = node.type
+                self._collect_double_fields(node.type, typedefs, double_fields)
+            elif isinstance(node, c_ast.Decl):
+                self._collect_double_fields(node.type, typedefs, double_fields)
+                if node.name and self._is_double(node.type, typedefs):
+                    global_doubles.add(node.name)
+            elif isinstance(node, c_ast.FuncDef):
+                functions.append(node)
+        
+        context = {'typedefs': typedefs, 'double_fields': double_fields}
+        per_function = {}
+        hot_callees = {}
+        for func in functions:
+            doubles = set(global_doubles)
+            stats = {
+                'loop_count': 0, 'max_loop_depth': 0, 'calls': 0, 'loop_nested_calls': 0,
+                'trig_calls': 0, 'hot_loop_trig_calls': 0, 'sqrt_calls': 0, 'hot_loop_sqrt_calls': 0,
+                'divisions': 0, 'gps_refs': 0, 'double_vars': 0
+            }
+            hot_doubles = set()
+            callees = []
+            
+            params = func.decl.type.args.params if func.decl.type.args else []
+            for param in params:
+                if isinstance(param, c_ast.Decl) and param.name and self._is_double(param.type, typedefs):
+                    doubles.add(param.name)
+                    stats['double_vars'] += 1
+            
+            self._walk(func.body, 0, stats, doubles, hot_doubles, callees, context)
+            stats['hot_double_vars'] = len(hot_doubles)
+            per_function[func.decl.name] = stats
+            hot_callees[func.decl.name] = callees
+        
+        # Trigonometría alcanzada desde bucles a través de llamadas a funciones locales
+        totals = {}
+        for name in per_function:
+            self._transitive_trig(name, per_function, hot_callees, totals, set())
+        for name, stats in per_function.items():
+            stats['hot_loop_trig_calls'] += sum(totals.get(callee, 0)
+                                                for callee, in_loop in hot_callees[name] if in_loop)
+        
+        return per_function
+    
+    def _transitive_trig(self, name: str, per_function: Dict, callees: Dict,
+                         totals: Dict, visiting: set) -> int:
+        """Llamadas trigonométricas de una función más las de sus llamadas locales"""
+        if name in totals:
+            return totals[name]
+        if name in visiting:
+            return 0
+        visiting.add(name)
+        total = per_function[name]['trig_calls'] + sum(
+            self._transitive_trig(callee, per_function, callees, totals, visiting)
+            for callee, _ in callees[name] if callee in per_function
+        )
+        totals[name] = total
+        return total
+    
+    def _walk(self, node, loop_depth: int, stats: Dict, doubles: set, hot_doubles: set,
+              callees: List, context: Dict):
+        """Recorre el AST de una función acumulando contadores por profundidad de bucle"""
+        if node is None:
+            return
+        
+        if isinstance(node, (c_ast.For, c_ast.While, c_ast.DoWhile)):
+            stats['loop_count'] += 1
+            stats['max_loop_depth'] = max(stats['max_loop_depth'], loop_depth + 1)
+            loop_depth += 1
+        elif isinstance(node, c_ast.FuncCall):
+            name = node.name.name if isinstance(node.name, c_ast.ID) else None
+            stats['calls'] += 1
+            if loop_depth:
+                stats['loop_nested_calls'] += 1
+            if name in self.TRIG_FUNCTIONS:
+                stats['trig_calls'] += 1
+                if loop_depth:
+                    stats['hot_loop_trig_calls'] += 1
+            elif name in self.SQRT_FUNCTIONS:
+                stats['sqrt_calls'] += 1
+                if loop_depth:
+                    stats['hot_loop_sqrt_calls'] += 1
+            if name:
+                callees.append((name, loop_depth > 0))
+            self._walk(node.args, loop_depth, stats, doubles, hot_doubles, callees, context)
+            return
+        elif isinstance(node, c_ast.BinaryOp) and node.op == '/':
+            stats['divisions'] += 1
+        elif isinstance(node, c_ast.Assignment) and node.op == '/=':
+            stats['divisions'] += 1
+        elif isinstance(node, c_ast.Decl):
+            if node.name and self._is_double(node.type, context['typedefs']):
+                doubles.add(node.name)
+                stats['double_vars'] += 1
+            self._walk(node.init, loop_depth, stats, doubles, hot_doubles, callees, context)
+            return
+        elif isinstance(node, c_ast.StructRef):
+            field = node.field.name
+            if self.GPS_IDENTIFIER_RE.search(field):
+                stats['gps_refs'] += 1
+            if loop_depth and field in context['double_fields']:
+                hot_doubles.add(field)
+            self._walk(node.name, loop_depth, stats, doubles, hot_doubles, callees, context)
+            return
+        elif isinstance(node, c_ast.ID):
+            if self.GPS_IDENTIFIER_RE.search(node.name):
+                stats['gps_refs'] += 1
+            if loop_depth and node.name in doubles:
+                hot_doubles.add(node.name)
+            return
+        
+        for _, child in node.children():
+            self._walk(child, loop_depth, stats, doubles, hot_doubles, callees, context)
+    
+    def _base_type_names(self, type_node, typedefs: Dict, seen: Optional[set] = None) -> List[str]:
+        """Nombres del tipo base resolviendo typedefs (double, float, int...)"""
+        seen = seen or set()
+        while isinstance(type_node, (c_ast.TypeDecl, c_ast.ArrayDecl)):
+            type_node = type_node.type
+        if isinstance(type_node, c_ast.IdentifierType):
+            names = []
+            for name in type_node.names:
+                if name in typedefs and name not in seen:
+                    seen.add(name)
+                    names.extend(self._base_type_names(typedefs[name], typedefs, seen))
+                else:
+                    names.append(name)
+            return names
+        return []
+    
+    def _is_double(self, type_node, typedefs: Dict) -> bool:
+        """True para variables (o arrays) de tipo double, directo o vía typedef"""
+        return 'double' in self._base_type_names(type_node, typedefs)
+    
+    def _collect_double_fields(self, type_node, typedefs: Dict, double_fields: set):
+        """Registra los campos double de las estructuras declaradas"""
+        while isinstance(type_node, (c_ast.TypeDecl, c_ast.PtrDecl, c_ast.ArrayDecl)):
+            type_node = type_node.type
+        if isinstance(type_node, c_ast.Struct) and type_node.decls:
+            for decl in type_node.decls:
+                if decl.name and self._is_double(decl.type, typedefs):
+                    double_fields.add(decl.name)
+
+
 class CodeFeatureExtractor:
     """
     Extrae características del código C para alimentar el modelo ML
     """
     
-    def __init__(self):
+    # Se incrementa cuando cambian las características extraídas (invalida cachés)
+    VERSION = 2
+    
+    # Un único tokenizador para todas las categorías: cada token lleva en
+    # lookaheads el contexto que antes requería un re.findall por patrón
+    TOKEN_RE = re.compile(r"""
+        (?P<identifier>(?P<word>\w+)
+            (?:(?=(?P<gap>\s*)\())?                             # llamada: sin(, for (
+            (?:(?=(?P<func>\s+\w+\s*\([^)]*\)\s*\{)))?          # definición de función
+            (?:(?=(?P<number>\s+-?\d)))?                        # return -1
+        )
+        | (?P<brace>[{}])
+        | (?P<division>(?<!/)/(?!/))
+        | (?P<array>\[(?=\s*\w+\s*\]))
+        | (?P<pointer>[*&](?=\w))
+        | (?P<compare>[<>]=?(?=\s*-?\d))
+        | (?P<null>[=!]=(?=\s*(?i:NULL)))
+    """, re.VERBOSE)
+    
+    # Categorías cuyos patrones quedan dentro de una sola palabra
+    WORD_CATEGORIES = ('gps_coordinates', 'distance_calculations', 'geofencing',
+                       'double_usage', 'float_usage', 'int_usage')
+    # Llamadas sin espacio antes del paréntesis (sin mayúsculas/minúsculas)
+    TIGHT_CALLS = {
+        'sin': 'trigonometric', 'cos': 'trigonometric', 'tan': 'trigonometric', 'atan2': 'trigonometric',
+        'sqrt': 'sqrt_operations', 'sqrtf': 'sqrt_operations',
+        'pow': 'power_operations', 'powf': 'power_operations',
+        'malloc': 'malloc_calls', 'calloc': 'malloc_calls', 'realloc': 'malloc_calls',
+        'exit': 'error_handling', 'abort': 'error_handling'
+    }
+    # Estructuras de control, con espacio opcional antes del paréntesis
+    CONTROL_CALLS = {'for': 'for_loops', 'while': 'while_loops',
+                     'if': 'if_statements', 'switch': 'switch_statements'}
+    MATH_FUNCTIONS = ('sin', 'cos', 'tan', 'sqrt', 'pow', 'atan2', 'fabs')
+    DECISION_KEYWORDS = ('if', 'while', 'for', 'switch', 'case')
+    VALIDATION_PREFIXES = ('validate', 'check', 'verify', 'ensure')
+    # Tokens de símbolo que cuentan directamente para una categoría
+    SYMBOL_FEATURES = {
+        'division': 'division_operations_count',
+        'array': 'array_access_count',
+        'pointer': 'pointer_operations_count',
+        'compare': 'range_checks_count',
+        'null': 'null_checks_count'
+    }
+    # Comentarios y literales en un único barrido (respeta escapes \")
+    CLEAN_RE = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL)
+    
+    def __init__(self, use_ast: bool = False):
         self.patterns = {
             # Operaciones matemáticas costosas
             'trigonometric': [r'\bsin\(', r'\bcos\(', r'\btan\(', r'\batan2\('],
@@ -70,27 +346,67 @@ class CodeFeatureExtractor:
             'null_checks': [r'==\s*NULL', r'!=\s*NULL'],
             'error_handling': [r'\breturn\s+-?\d+', r'\bexit\(', r'\babort\(']
         }
+        
+        # Patrones de referencia; extract_features los evalúa en un único barrido
+        self._compiled_patterns = {
+            category: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for category, patterns in self.patterns.items()
+        }
+        self._word_profiles = {}
+        
+        # Front-end C real (opcional) para características por función
+        self.ast_frontend = None
+        if use_ast:
+            if c_parser is None:
+                print("⚠️  pycparser no disponible, se usan solo características por regex")
+            else:
+                self.ast_frontend = CParserFrontEnd()
     
     def extract_features(self, code_content: str) -> Dict[str, float]:
-        """Extrae características numéricas del código C"""
-        features = {}
-        
+        """Extrae características numéricas del código C en una sola pasada"""
         # Limpiar comentarios y strings para análisis más preciso
         cleaned_code = self._clean_code(code_content)
         
-        # Contar patrones específicos
-        for category, patterns in self.patterns.items():
-            count = 0
-            for pattern in patterns:
-                matches = re.findall(pattern, cleaned_code, re.IGNORECASE)
-                count += len(matches)
-            features[f'{category}_count'] = count
+        features = {f'{category}_count': 0 for category in self.patterns}
+        features.update({'cyclomatic_complexity': 1, 'max_nesting_depth': 0, 'function_count': 0})
+        features.update({f'{func}_calls': 0 for func in self.MATH_FUNCTIONS})
+        features['validation_functions'] = 0
         
-        # Métricas de complejidad
-        features.update(self._calculate_complexity_metrics(cleaned_code))
+        current_depth = 0
+        max_depth = 0
+        word_profiles = self._word_profiles
+        
+        for token in self.TOKEN_RE.finditer(cleaned_code):
+            kind = token.lastgroup
+            if kind == 'identifier':
+                word = token.group('word')
+                profile = word_profiles.get(word)
+                if profile is None:
+                    profile = word_profiles[word] = self._word_profile(word)
+                static, tight_call, spaced_call, is_return = profile
+                for key, count in static:
+                    features[key] += count
+                gap = token.group('gap')
+                if gap is not None:
+                    for key, count in (spaced_call if gap else tight_call):
+                        features[key] += count
+                if token.group('func') is not None:
+                    features['function_count'] += 1
+                if is_return and token.group('number') is not None:
+                    features['error_handling_count'] += 1
+            elif kind == 'brace':
+                if token.group('brace') == '{':
+                    current_depth += 1
+                    max_depth = max(max_depth, current_depth)
+                else:
+                    current_depth = max(0, current_depth - 1)
+            else:
+                features[self.SYMBOL_FEATURES[kind]] += 1
+        
+        features['max_nesting_depth'] = max_depth
         
-        # Métricas de funciones
-        features.update(self._analyze_functions(cleaned_code))
+        if self.ast_frontend is not None:
+            features.update(self._ast_features(code_content))
         
         # Normalizar por líneas de código
         lines_of_code = len([line for line in cleaned_code.split('\n') if line.strip()])
@@ -105,69 +421,176 @@ class CodeFeatureExtractor:
         
         return normalized_features
     
+    def extract_function_features(self, code_content: str) -> Optional[Dict[str, Dict[str, float]]]:
+        """Características por función del front-end C (None si no está activo o falla)"""
+        if self.ast_frontend is None:
+            return None
+        return self.ast_frontend.extract_function_features(code_content)
+    
+    def _ast_features(self, code_content: str) -> Dict[str, float]:
+        """
+        Agrega las características por función del AST. Sustituye los
+        contadores por regex más ruidosos (divisiones y coordenadas)
+        """
+        per_function = self.extract_function_features(code_content)
+        if per_function is None:
+            return {}
+        functions = per_function.values()
+        return {
+            'division_operations_count': sum(f['divisions'] for f in functions),
+            'gps_coordinates_count': sum(f['gps_refs'] for f in functions),
+            'ast_functions': len(per_function),
+            'ast_loop_nested_calls': sum(f['loop_nested_calls'] for f in functions),
+            'ast_hot_loop_trig_calls': sum(f['hot_loop_trig_calls'] for f in functions),
+            'ast_hot_loop_sqrt_calls': sum(f['hot_loop_sqrt_calls'] for f in functions),
+            'ast_hot_double_vars': sum(f['hot_double_vars'] for f in functions),
+            'ast_max_loop_depth': max((f['max_loop_depth'] for f in functions), default=0)
+        }
+    
+    def _word_profile(self, word: str) -> Tuple:
+        """
+        Contribución de una palabra a cada contador, calculada una vez por
+        palabra distinta: (fijas, si va seguida de '(', si va seguida de
+        espacio y '(', si es un return)
+        """
+        static = {}
+        for category in self.WORD_CATEGORIES:
+            count = sum(len(regex.findall(word)) for regex in self._compiled_patterns[category])
+            if count:
+                static[f'{category}_count'] = count
+        if word in self.DECISION_KEYWORDS:
+            static['cyclomatic_complexity'] = 1
+        validation_count = sum(1 for prefix in self.VALIDATION_PREFIXES
+                               if word.lower().startswith(prefix))
+        if validation_count:
+            static['validation_functions'] = validation_count
+        
+        spaced_call = {}
+        lowered = word.lower()
+        if lowered in self.CONTROL_CALLS:
+            spaced_call[f'{self.CONTROL_CALLS[lowered]}_count'] = 1
+        if word in self.MATH_FUNCTIONS:
+            spaced_call[f'{word}_calls'] = 1
+        tight_call = dict(spaced_call)
+        if lowered in self.TIGHT_CALLS:
+            key = f'{self.TIGHT_CALLS[lowered]}_count'
+            tight_call[key] = tight_call.get(key, 0) + 1
+        
+        return (tuple(static.items()), tuple(tight_call.items()),
+                tuple(spaced_call.items()), lowered == 'return')
+    
     def _clean_code(self, code: str) -> str:
-        """Limpia comentarios y strings del código"""
-        # Remover comentarios de línea
-        code = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-        # Remover comentarios de bloque
-        code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
-        # Remover strings (contenido entre comillas)
-        code = re.sub(r'"[^"]*"', '""', code)
-        code = re.sub(r"'[^']*'", "''", code)
-        return code
-    
-    def _calculate_complexity_metrics(self, code: str) -> Dict[str, float]:
-        """Calcula métricas de complejidad del código"""
-        metrics = {}
-        
-        # Complejidad ciclomática (aproximada)
-        decision_points = len(re.findall(r'\b(if|while|for|switch|case)\b', code))
-        metrics['cyclomatic_complexity'] = decision_points + 1
-        
-        # Profundidad de anidamiento (aproximada)
-        max_depth = 0
-        current_depth = 0
-        for char in code:
-            if char == '{':
-                current_depth += 1
-                max_depth = max(max_depth, current_depth)
-            elif char == '}':
-                current_depth = max(0, current_depth - 1)
-        metrics['max_nesting_depth'] = max_depth
-        
-        # Número de funciones
-        function_matches = re.findall(r'\w+\s+\w+\s*\([^)]*\)\s*{', code)
-        metrics['function_count'] = len(function_matches)
-        
-        return metrics
-    
-    def _analyze_functions(self, code: str) -> Dict[str, float]:
-        """Analiza características específicas de funciones"""
-        metrics = {}
-        
-        # Funciones matemáticas específicas
-        math_functions = ['sin', 'cos', 'tan', 'sqrt', 'pow', 'atan2', 'fabs']
-        for func in math_functions:
-            pattern = f'\\b{func}\\s*\\('
-            count = len(re.findall(pattern, code))
-            metrics[f'{func}_calls'] = count
-        
-        # Funciones de validación
-        validation_patterns = ['validate', 'check', 'verify', 'ensure']
-        validation_count = 0
-        for pattern in validation_patterns:
-            validation_count += len(re.findall(f'\\b{pattern}', code, re.IGNORECASE))
-        metrics['validation_functions'] = validation_count
-        
-        return metrics
+        """Limpia comentarios y strings del código (una sola pasada)"""
+        def replace(match):
+            token = match.group(0)
+            if token[0] in '"\'':
+                return token[0] * 2
+            return ''
+        
+        return self.CLEAN_RE.sub(replace, code)
+
+class NewtonSyntaxError(ValueError):
+    """Error de sintaxis en un archivo Newton DSL (con número de línea)"""
+    
+    def __init__(self, message: str, line: int):
+        super().__init__(f"línea {line}: {message}")
+        self.line = line
+
+class NewtonConstraint:
+    """
+    Restricción de un sensor Newton: rango (range x == [a, b]),
+    precisión (precision x == n unidad) o comparación (x == n unidad, x <= n...).
+    """
+    
+    def __init__(self, kind: str, target: str, operator: str = '==',
+                 value: Optional[float] = None, low: Optional[float] = None,
+                 high: Optional[float] = None, unit: Optional[str] = None):
+        self.kind = kind
+        self.target = target
+        self.operator = operator
+        self.value = value
+        self.low = low
+        self.high = high
+        self.unit = unit
+    
+    def __repr__(self) -> str:
+        if self.kind == 'range':
+            return f"NewtonConstraint(range {self.target} == [{self.low}, {self.high}] {self.unit or ''})"
+        return f"NewtonConstraint({self.kind} {self.target} {self.operator} {self.value} {self.unit or ''})"
+
+class NewtonSensor:
+    """Sensor Newton: campos declarados (nombre → tipo) y sus restricciones"""
+    
+    def __init__(self, name: str, fields: Dict[str, str], constraints: List[NewtonConstraint]):
+        self.name = name
+        self.fields = fields
+        self.constraints = constraints
+    
+    def find(self, kind: str, target: str) -> Optional[NewtonConstraint]:
+        """Primera restricción de un tipo sobre un campo, o None"""
+        for constraint in self.constraints:
+            if constraint.kind == kind and constraint.target == target:
+                return constraint
+        return None
+    
+    def __repr__(self) -> str:
+        return f"NewtonSensor({self.name}, {len(self.fields)} campos, {len(self.constraints)} restricciones)"
+
+class NewtonSpec:
+    """Especificación Newton completa: todos los sensores y los metadatos de los comentarios"""
+    
+    def __init__(self, sensors: List[NewtonSensor], metadata: Dict[str, Any]):
+        self.sensors = sensors
+        self.metadata = metadata
+    
+    @property
+    def primary(self) -> Optional[NewtonSensor]:
+        """Sensor que alimenta las features del modelo: el primero con rango de latitud"""
+        for sensor in self.sensors:
+            if sensor.find('range', 'latitude') is not None:
+                return sensor
+        return self.sensors[0] if self.sensors else None
+    
+    def sensor(self, name: str) -> Optional[NewtonSensor]:
+        """Sensor por nombre, o None"""
+        for sensor in self.sensors:
+            if sensor.name == name:
+                return sensor
+        return None
 
 class NewtonSpecParser:
     """
-    Parser para especificaciones Newton DSL automáticamente generadas
+    Parser para especificaciones Newton DSL automáticamente generadas.
+    
+    Tokeniza el archivo con una única expresión regular compilada y lo analiza
+    con una gramática recursiva descendente:
+    
+        spec       := declaración*
+        declaración := IDENT ':' 'sensor' '(' campos? ')' '=' '{' restricciones? '}' ';'?
+        campos     := IDENT ':' IDENT (',' IDENT ':' IDENT)* ','?
+        restricción := 'range' IDENT '==' '[' cantidad ',' cantidad ']'
+                     | 'precision' IDENT '==' cantidad
+                     | IDENT OP cantidad
+        cantidad   := NUMBER IDENT?
+    
+    Las declaraciones que no son sensores se saltan. Las especificaciones se
+    memorizan por hash del contenido.
     """
     
+    # Se incrementa cuando cambian las especificaciones extraídas (invalida cachés)
+    VERSION = 3
+    
+    TOKEN_RE = re.compile(r"""
+        (?P<skip>(?:\s+|//[^\n]*|/\*.*?\*/)+)
+      | (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<ident>[A-Za-z_]\w*)
+      | (?P<op>==|<=|>=|<|>)
+      | (?P<punct>[:()\[\]{},;=])
+      | (?P<error>.)
+    """, re.VERBOSE | re.DOTALL)
+    
     def __init__(self):
-        pass
+        self._spec_cache = {}
     
     def parse_newton_file(self, newton_file: str) -> Dict[str, Any]:
         """Parsea archivo Newton DSL y extrae especificaciones"""
@@ -178,72 +601,204 @@ class NewtonSpecParser:
         try:
             with open(newton_file, 'r', encoding='utf-8') as f:
                 content = f.read()
-            
-            specs = {}
-            
-            # Extraer rangos
-            specs.update(self._extract_ranges(content))
-            
-            # Extraer precisiones
-            specs.update(self._extract_precisions(content))
-            
-            # Extraer metadatos
-            specs.update(self._extract_metadata(content))
-            
-            # Calcular características derivadas
-            specs.update(self._calculate_derived_features(specs))
-            
-            return specs
-            
         except Exception as e:
             print(f"⚠️  Error parseando Newton: {e}")
             return self._get_default_specs()
-    
-    def _extract_ranges(self, content: str) -> Dict[str, float]:
-        """Extrae rangos de las especificaciones"""
-        ranges = {}
-        
-        # Patrones para extraer rangos
-        range_patterns = {
-            'latitude': r'range latitude == \[([-\d.]+) degrees, ([-\d.]+) degrees\]',
-            'longitude': r'range longitude == \[([-\d.]+) degrees, ([-\d.]+) degrees\]',
-            'altitude': r'range altitude == \[([-\d.]+) meters, ([-\d.]+) meters\]',
-            'speed': r'range speed == \[([-\d.]+) kmh, ([-\d.]+) kmh\]',
-            'satellites': r'range satellites == \[(\d+), (\d+)\]',
-            'hdop': r'range hdop == \[([-\d.]+), ([-\d.]+)\]'
-        }
         
-        for var_name, pattern in range_patterns.items():
-            match = re.search(pattern, content)
-            if match:
-                min_val = float(match.group(1))
-                max_val = float(match.group(2))
-                ranges[f'{var_name}_min'] = min_val
-                ranges[f'{var_name}_max'] = max_val
-                ranges[f'{var_name}_range'] = max_val - min_val
-                
-                # Calcular si el rango es "pequeño" (útil para optimizaciones)
-                if var_name in ['latitude', 'longitude']:
-                    ranges[f'{var_name}_is_small_range'] = 1.0 if abs(max_val - min_val) < 1.0 else 0.0
-        
-        return ranges
+        return self.parse_newton_content(content)
+    
+    def parse_newton_content(self, content: str) -> Dict[str, Any]:
+        """Extrae especificaciones (features planas) de un texto Newton DSL ya leído"""
+        try:
+            return self.spec_to_features(self.parse_spec(content))
+        except NewtonSyntaxError as e:
+            print(f"⚠️  Error parseando Newton: {e}")
+            return self._get_default_specs()
     
-    def _extract_precisions(self, content: str) -> Dict[str, float]:
-        """Extrae especificaciones de precisión"""
-        precisions = {}
+    def parse_spec(self, content: str) -> NewtonSpec:
+        """Especificación tipada de un texto Newton DSL (memorizada por hash)"""
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        spec = self._spec_cache.get(key)
+        if spec is None:
+            spec = NewtonSpec(self._parse_declarations(self._tokenize(content)),
+                              self._extract_metadata(content))
+            self._spec_cache[key] = spec
+        return spec
+    
+    def load_specs(self, newton_files: List[str]) -> Dict[str, NewtonSpec]:
+        """Carga varios archivos Newton; los de contenido repetido se parsean una vez"""
+        specs = {}
+        for newton_file in newton_files:
+            with open(newton_file, 'r', encoding='utf-8') as f:
+                specs[newton_file] = self.parse_spec(f.read())
+        return specs
+    
+    def spec_to_features(self, spec: NewtonSpec) -> Dict[str, Any]:
+        """
+        Aplana la especificación a las features del modelo.
         
-        precision_patterns = {
-            'latitude_precision': r'precision latitude == (\d+) decimal_places',
-            'longitude_precision': r'precision longitude == (\d+) decimal_places',
-            'altitude_precision': r'precision altitude == ([-\d.]+) meters'
-        }
+        El sensor principal usa los nombres históricos (latitude_min,
+        latitude_precision, update_rate_hz...); los demás sensores llevan su
+        nombre como prefijo.
+        """
+        primary = spec.primary
+        if primary is None:
+            return self._get_default_specs()
+        
+        specs = {'sensor_count': float(len(spec.sensors))}
+        for sensor in spec.sensors:
+            prefix = '' if sensor is primary else f'{sensor.name}_'
+            specs.update(self._constraint_features(sensor, prefix))
+        specs.update(spec.metadata)
         
-        for key, pattern in precision_patterns.items():
-            match = re.search(pattern, content)
-            if match:
-                precisions[key] = float(match.group(1))
+        # Calcular características derivadas
+        specs.update(self._calculate_derived_features(specs))
         
-        return precisions
+        return specs
+    
+    def _constraint_features(self, sensor: NewtonSensor, prefix: str) -> Dict[str, float]:
+        """Features de las restricciones de un sensor"""
+        features = {}
+        for constraint in sensor.constraints:
+            name = f'{prefix}{constraint.target}'
+            if constraint.kind == 'range':
+                features[f'{name}_min'] = constraint.low
+                features[f'{name}_max'] = constraint.high
+                features[f'{name}_range'] = constraint.high - constraint.low
+                
+                # Calcular si el rango es "pequeño" (útil para optimizaciones)
+                if constraint.target in ['latitude', 'longitude']:
+                    features[f'{name}_is_small_range'] = 1.0 if abs(constraint.high - constraint.low) < 1.0 else 0.0
+            elif constraint.kind == 'precision':
+                features[f'{name}_precision'] = constraint.value
+            elif constraint.operator == '==':
+                unit = f'_{constraint.unit.lower()}' if constraint.unit else ''
+                features[f'{name}{unit}'] = constraint.value
+        return features
+    
+    def _tokenize(self, content: str) -> List[Tuple[str, str, int]]:
+        """Tokens (tipo, texto, línea); espacios y comentarios se saltan en bloque"""
+        tokens = []
+        line = 1
+        for match in self.TOKEN_RE.finditer(content):
+            kind = match.lastgroup
+            if kind == 'error':
+                raise NewtonSyntaxError(f"carácter inesperado {match.group()!r}", line)
+            if kind == 'skip':
+                line += match.group().count('\n')
+                continue
+            tokens.append((kind, match.group(), line))
+        return tokens
+    
+    def _expect(self, tokens: List[Tuple[str, str, int]], index: int,
+                kind: str, text: Optional[str] = None) -> Tuple[str, int]:
+        """Consume un token del tipo (y texto) esperado; devuelve (texto, índice siguiente)"""
+        if index >= len(tokens):
+            raise NewtonSyntaxError(f"se esperaba '{text or kind}' y terminó el archivo",
+                                    tokens[-1][2] if tokens else 1)
+        token_kind, token_text, line = tokens[index]
+        if token_kind != kind or (text is not None and token_text != text):
+            raise NewtonSyntaxError(f"se esperaba '{text or kind}', encontrado {token_text!r}", line)
+        return token_text, index + 1
+    
+    @staticmethod
+    def _peek(tokens: List[Tuple[str, str, int]], index: int) -> Optional[str]:
+        return tokens[index][1] if index < len(tokens) else None
+    
+    def _parse_declarations(self, tokens: List[Tuple[str, str, int]]) -> List[NewtonSensor]:
+        """spec := declaración*"""
+        sensors = []
+        index = 0
+        while index < len(tokens):
+            if (tokens[index][0] == 'ident' and self._peek(tokens, index + 1) == ':'
+                    and self._peek(tokens, index + 2) == 'sensor'):
+                sensor, index = self._parse_sensor(tokens, index)
+                sensors.append(sensor)
+            else:
+                index = self._skip_declaration(tokens, index)
+        return sensors
+    
+    def _skip_declaration(self, tokens: List[Tuple[str, str, int]], index: int) -> int:
+        """
+        Salta una declaración que no es un sensor: termina en ';' fuera de
+        llaves/paréntesis, o en la llave que cierra su bloque.
+        """
+        depth = 0
+        while index < len(tokens):
+            text = tokens[index][1]
+            index += 1
+            if text in ('(', '[', '{'):
+                depth += 1
+            elif text in (')', ']', '}'):
+                depth -= 1
+                if depth <= 0 and text == '}':
+                    return index + 1 if self._peek(tokens, index) == ';' else index
+            elif text == ';' and depth <= 0:
+                return index
+        return index
+    
+    def _parse_sensor(self, tokens: List[Tuple[str, str, int]], index: int) -> Tuple[NewtonSensor, int]:
+        """IDENT ':' 'sensor' '(' campos? ')' '=' '{' restricciones? '}' ';'?"""
+        name, index = self._expect(tokens, index, 'ident')
+        _, index = self._expect(tokens, index, 'punct', ':')
+        _, index = self._expect(tokens, index, 'ident', 'sensor')
+        _, index = self._expect(tokens, index, 'punct', '(')
+        
+        fields = {}
+        while self._peek(tokens, index) != ')':
+            field, index = self._expect(tokens, index, 'ident')
+            _, index = self._expect(tokens, index, 'punct', ':')
+            fields[field], index = self._expect(tokens, index, 'ident')
+            if self._peek(tokens, index) != ')':
+                _, index = self._expect(tokens, index, 'punct', ',')
+        index += 1
+        
+        _, index = self._expect(tokens, index, 'punct', '=')
+        _, index = self._expect(tokens, index, 'punct', '{')
+        constraints = []
+        while self._peek(tokens, index) != '}':
+            constraint, index = self._parse_constraint(tokens, index)
+            constraints.append(constraint)
+            if self._peek(tokens, index) != '}':
+                _, index = self._expect(tokens, index, 'punct', ',')
+        index += 1
+        if self._peek(tokens, index) == ';':
+            index += 1
+        return NewtonSensor(name, fields, constraints), index
+    
+    def _parse_constraint(self, tokens: List[Tuple[str, str, int]],
+                          index: int) -> Tuple[NewtonConstraint, int]:
+        """Una restricción: range, precision o comparación con una cantidad"""
+        keyword, index = self._expect(tokens, index, 'ident')
+        if keyword == 'range':
+            target, index = self._expect(tokens, index, 'ident')
+            _, index = self._expect(tokens, index, 'op', '==')
+            _, index = self._expect(tokens, index, 'punct', '[')
+            low, low_unit, index = self._parse_quantity(tokens, index)
+            _, index = self._expect(tokens, index, 'punct', ',')
+            high, high_unit, index = self._parse_quantity(tokens, index)
+            _, index = self._expect(tokens, index, 'punct', ']')
+            return NewtonConstraint('range', target, low=low, high=high,
+                                    unit=low_unit or high_unit), index
+        if keyword == 'precision':
+            target, index = self._expect(tokens, index, 'ident')
+            _, index = self._expect(tokens, index, 'op', '==')
+            value, unit, index = self._parse_quantity(tokens, index)
+            return NewtonConstraint('precision', target, value=value, unit=unit), index
+        
+        operator, index = self._expect(tokens, index, 'op')
+        value, unit, index = self._parse_quantity(tokens, index)
+        return NewtonConstraint('compare', keyword, operator=operator, value=value, unit=unit), index
+    
+    def _parse_quantity(self, tokens: List[Tuple[str, str, int]],
+                        index: int) -> Tuple[float, Optional[str], int]:
+        """cantidad := NUMBER IDENT?"""
+        number, index = self._expect(tokens, index, 'number')
+        unit = None
+        if index < len(tokens) and tokens[index][0] == 'ident':
+            unit = tokens[index][1]
+            index += 1
+        return float(number), unit, index
     
     def _extract_metadata(self, content: str) -> Dict[str, Any]:
         """Extrae metadatos útiles"""
@@ -270,10 +825,11 @@ class NewtonSpecParser:
         
         # Área geográfica cubierta
         if 'latitude_range' in specs and 'longitude_range' in specs:
-            # Aproximación del área en km²
-            lat_km = specs['latitude_range'] * 111.32  # ~111.32 km por grado
-            lon_km = specs['longitude_range'] * 111.32 * 0.96  # Corrección promedio
-            derived['geographic_area_km2'] = lat_km * lon_km
+            # Metros por grado en la latitud central de la zona (tabla compartida con el generador C)
+            lat_center = (specs['latitude_min'] + specs['latitude_max']) / 2
+            derived['lon_to_meters'] = meters_per_degree(lat_center)[1]
+            derived['geographic_area_km2'] = zone_area_km2(specs['latitude_min'], specs['latitude_max'],
+                                                           specs['longitude_min'], specs['longitude_max'])
             
             # Clasificar como micro, pequeña, mediana, grande
             if derived['geographic_area_km2'] < 100:
@@ -308,26 +864,101 @@ class NewtonSpecParser:
             'longitude_is_small_range': 0.0
         }
 
+def _cv_fit_and_score(estimator, X: np.ndarray, y: np.ndarray,
+                      train_idx: np.ndarray, test_idx: np.ndarray) -> Tuple[float, float]:
+    """Ajusta un candidato en un fold; devuelve (accuracy, segundos de ajuste)"""
+    start = time.perf_counter()
+    estimator = _fit_classifier(estimator, X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    # Para multi-salida es la media de las accuracies por etiqueta
+    accuracy = float(np.mean(estimator.predict(X[test_idx]) == y[test_idx]))
+    return accuracy, fit_time
+
+def _timed_fit(estimator, X: np.ndarray, y: np.ndarray):
+    """Ajuste final con el mejor candidato; devuelve (estimador, segundos)"""
+    start = time.perf_counter()
+    estimator = _fit_classifier(estimator, X, y)
+    return estimator, time.perf_counter() - start
+
+def _fit_classifier(estimator, X: np.ndarray, y: np.ndarray):
+    """
+    Ajusta el estimador; si una etiqueta tiene una sola clase (p. ej. una
+    transformación que nunca acelera) usa un predictor constante, porque
+    GradientBoosting y SVC no aceptan una única clase
+    """
+    if y.ndim == 1 and len(np.unique(y)) < 2:
+        from sklearn.dummy import DummyClassifier
+        estimator = DummyClassifier(strategy='most_frequent')
+    estimator.fit(X, y)
+    return estimator
+
 class OptimizationMLModel:
     """
     Modelo de Machine Learning para predecir optimizaciones de compilador
     """
     
-    def __init__(self):
-        self.models = {
-            'use_float_instead_double': RandomForestClassifier(n_estimators=100, random_state=42),
-            'eliminate_range_checks': GradientBoostingClassifier(n_estimators=100, random_state=42),
-            'use_euclidean_approx': RandomForestClassifier(n_estimators=100, random_state=42),
-            'eliminate_null_checks': SVC(probability=True, random_state=42),
-            'compress_data_types': RandomForestClassifier(n_estimators=100, random_state=42),
-            'precompute_constants': GradientBoostingClassifier(n_estimators=100, random_state=42)
-        }
+    # Formato del artefacto guardado; se incrementa si cambia su contenido
+    ARTIFACT_VERSION = 3
+    
+    # Optimizaciones que predice el modelo (orden de las salidas)
+    OPTIMIZATION_NAMES = (
+        'use_float_instead_double', 'eliminate_range_checks', 'use_euclidean_approx',
+        'eliminate_null_checks', 'compress_data_types', 'precompute_constants'
+    )
+    
+    # Features con las que se entrena (mismas columnas que el dataset sintético)
+    TRAINING_FEATURES = (
+        'trigonometric_count', 'sqrt_operations_count', 'distance_calculations_count',
+        'double_usage_count', 'range_checks_count', 'cyclomatic_complexity', 'lines_of_code',
+        'geographic_area_km2', 'area_category', 'latitude_is_small_range',
+        'longitude_is_small_range', 'vehicle_type'
+    )
+    
+    # Espacios de búsqueda acotados por tipo de estimador
+    SEARCH_SPACES = {
+        'RandomForestClassifier': {'n_estimators': [100, 200], 'max_depth': [None, 8],
+                                   'min_samples_leaf': [1, 3]},
+        'GradientBoostingClassifier': {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1],
+                                       'max_depth': [2, 3]},
+        'SVC': {'C': [0.5, 1.0, 4.0], 'gamma': ['scale', 0.1]}
+    }
+    
+    def __init__(self, multi_output: bool = False, n_jobs: int = -1):
+        from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+        from sklearn.svm import SVC
+        from sklearn.preprocessing import StandardScaler
+        
+        # multi_output=True: un único bosque multi-etiqueta (árboles en paralelo)
+        # en lugar de seis clasificadores independientes
+        self.multi_output = multi_output
+        if multi_output:
+            self.estimators = {}
+            self.models = {}
+            self.multi_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        else:
+            self.estimators = {
+                'use_float_instead_double': RandomForestClassifier(n_estimators=100, random_state=42),
+                'eliminate_range_checks': GradientBoostingClassifier(n_estimators=100, random_state=42),
+                'use_euclidean_approx': RandomForestClassifier(n_estimators=100, random_state=42),
+                'eliminate_null_checks': SVC(probability=True, random_state=42),
+                'compress_data_types': RandomForestClassifier(n_estimators=100, random_state=42),
+                'precompute_constants': GradientBoostingClassifier(n_estimators=100, random_state=42)
+            }
+            # Modelos ajustados: el estimador configurado o un predictor constante
+            self.models = dict(self.estimators)
+            self.multi_model = None
         
         self.scaler = StandardScaler()
         self.feature_names = []
         self.is_trained = False
+        # Índice fijo de features y parámetros del scaler para predecir (ver _inference_arrays)
+        self._inference = None
+        # Métricas y tiempos del último entrenamiento (se guardan con el modelo)
+        self.training_report = {}
+        # Origen de los datos de entrenamiento ('synthetic' o huella del almacén)
+        self.training_data_id = None
     
-    def create_training_dataset(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def create_training_dataset(self) -> Tuple['pd.DataFrame', 'pd.DataFrame']:
         """
         Crea dataset de entrenamiento sintético pero realista
         basado en casos típicos de optimización de código GPS
@@ -421,13 +1052,11 @@ class OptimizationMLModel:
             training_cases.append(case)
         
         # Convertir a DataFrame
+        import pandas as pd
         df = pd.DataFrame(training_cases)
         
         # Separar features y targets
-        optimization_columns = [
-            'use_float_instead_double', 'eliminate_range_checks', 'use_euclidean_approx',
-            'eliminate_null_checks', 'compress_data_types', 'precompute_constants'
-        ]
+        optimization_columns = list(self.OPTIMIZATION_NAMES)
         
         feature_columns = [col for col in df.columns if col not in optimization_columns]
         
@@ -435,79 +1064,271 @@ class OptimizationMLModel:
         y = df[optimization_columns]
         
         self.feature_names = feature_columns
+        self.training_data_id = 'synthetic'
         
         print(f"  ✅ Dataset creado: {len(df)} casos, {len(feature_columns)} features")
         return X, y
     
-    def train(self, X: pd.DataFrame, y: pd.DataFrame):
-        """Entrena todos los modelos"""
+    def create_dataset_from_store(self, store: 'TrainingDataStore') -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+        """Dataset a partir de los casos medidos con benchmarks en el almacén"""
+        import pandas as pd
+        
+        print(f"🏗️  Cargando dataset de benchmarks: {store.db_path}")
+        rows = store.load_samples()
+        X = pd.DataFrame([[features.get(name, 0.0) for name in self.TRAINING_FEATURES]
+                          for features, _ in rows], columns=list(self.TRAINING_FEATURES))
+        y = pd.DataFrame([[labels.get(name, 0) for name in self.OPTIMIZATION_NAMES]
+                          for _, labels in rows], columns=list(self.OPTIMIZATION_NAMES))
+        
+        self.feature_names = list(self.TRAINING_FEATURES)
+        self.training_data_id = store.fingerprint()
+        
+        print(f"  ✅ Dataset creado: {len(X)} casos medidos, {len(self.feature_names)} features")
+        return X, y
+    
+    def train(self, X: 'pd.DataFrame', y: 'pd.DataFrame', search: bool = False,
+              cv: int = 5, max_candidates: int = 6, n_jobs: int = -1):
+        """
+        Entrena todos los modelos. search=True usa búsqueda de hiperparámetros
+        con validación cruzada en paralelo (ver train_with_search)
+        """
+        if search:
+            return self.train_with_search(X, y, cv=cv, max_candidates=max_candidates, n_jobs=n_jobs)
+        
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score
+        
         print("🧠 Entrenando modelos ML...")
+        self.training_report = {}
         
         # Normalizar features
         X_scaled = self.scaler.fit_transform(X)
         
+        if self.multi_output:
+            # Un solo ajuste sobre la matriz compartida con las seis etiquetas
+            print("  Entrenando modelo multi-salida (RandomForest multi-etiqueta)")
+            columns = list(self.OPTIMIZATION_NAMES)
+            X_train, X_test, y_train, y_test = train_test_split(
+                X_scaled, y[columns].values, test_size=0.2, random_state=42
+            )
+            _, fit_time = _timed_fit(self.multi_model, X_train, y_train)
+            
+            y_pred = self.multi_model.predict(X_test)
+            for column, opt_name in enumerate(columns):
+                accuracy = accuracy_score(y_test[:, column], y_pred[:, column])
+                print(f"    {opt_name}: precisión {accuracy:.2f}")
+                self.training_report[opt_name] = {'holdout_accuracy': float(accuracy), 'fit_time': fit_time}
+            
+            self.is_trained = True
+            self._inference = None
+            print("  ✅ Modelo multi-salida entrenado")
+            return
+        
         # Entrenar cada modelo de optimización
-        for opt_name, model in self.models.items():
+        for opt_name, estimator in self.estimators.items():
             print(f"  Entrenando modelo: {opt_name}")
             
-            # Dividir en train/test
+            # Dividir en train/test (estratificado si cada clase tiene al menos dos casos,
+            # para que el conjunto de entrenamiento no se quede con una sola clase)
+            target = y[opt_name].values
+            classes, counts = np.unique(target, return_counts=True)
             X_train, X_test, y_train, y_test = train_test_split(
-                X_scaled, y[opt_name], test_size=0.2, random_state=42
+                X_scaled, target, test_size=0.2, random_state=42,
+                stratify=target if len(classes) > 1 and counts.min() >= 2 else None
             )
             
             # Entrenar modelo
-            model.fit(X_train, y_train)
+            model, fit_time = _timed_fit(estimator, X_train, y_train)
+            self.models[opt_name] = model
+            if len(classes) < 2:
+                print(f"    ⚠️  Etiqueta constante ({classes[0]}): predictor constante")
             
             # Evaluar
             y_pred = model.predict(X_test)
             accuracy = accuracy_score(y_test, y_pred)
             print(f"    Precisión: {accuracy:.2f}")
+            self.training_report[opt_name] = {'holdout_accuracy': float(accuracy), 'fit_time': fit_time,
+                                              'model': type(model).__name__}
+        
+        self.is_trained = True
+        self._inference = None
+        print("  ✅ Todos los modelos entrenados")
+    
+    def train_with_search(self, X: 'pd.DataFrame', y: 'pd.DataFrame', cv: int = 5,
+                          max_candidates: int = 6, n_jobs: int = -1):
+        """
+        Búsqueda acotada de hiperparámetros con validación cruzada: todos los
+        (modelo, candidato, fold) se ajustan en paralelo con joblib, y luego
+        se reajusta el mejor candidato de cada optimización con todos los datos
+        """
+        from joblib import Parallel, delayed
+        from sklearn.base import clone
+        from sklearn.model_selection import ParameterGrid, ParameterSampler
+        
+        print(f"🧠 Entrenando modelos ML con búsqueda de hiperparámetros (CV={cv})...")
+        
+        X_scaled = self.scaler.fit_transform(X)
+        if self.multi_output:
+            estimators = {'multi_output': self.multi_model}
+            targets = {'multi_output': y[list(self.OPTIMIZATION_NAMES)].values}
+        else:
+            estimators = self.estimators
+            targets = {opt_name: y[opt_name].values for opt_name in self.estimators}
+        
+        # Tareas (modelo, candidato, fold) para un único pool
+        candidates = {}
+        tasks = []
+        for name, estimator in estimators.items():
+            space = self.SEARCH_SPACES.get(type(estimator).__name__, {})
+            grid = list(ParameterGrid(space))
+            if len(grid) > max_candidates:
+                grid = list(ParameterSampler(space, n_iter=max_candidates, random_state=42))
+            candidates[name] = grid
+            
+            folds = list(self._cv_splitter(targets[name], cv).split(X_scaled, targets[name]))
+            for index, params in enumerate(grid):
+                for train_idx, test_idx in folds:
+                    candidate = clone(estimator).set_params(**params)
+                    if 'n_jobs' in candidate.get_params():
+                        candidate.set_params(n_jobs=1)  # el paralelismo lo pone el pool
+                    tasks.append((name, index, candidate, train_idx, test_idx))
+        
+        print(f"  {len(tasks)} ajustes de validación cruzada en paralelo")
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_cv_fit_and_score)(candidate, X_scaled, targets[name], train_idx, test_idx)
+            for name, _, candidate, train_idx, test_idx in tasks
+        )
+        
+        # Agregar por candidato y elegir el mejor de cada optimización
+        results = {}
+        for (name, index, _, _, _), (accuracy, fit_time) in zip(tasks, scores):
+            entry = results.setdefault((name, index), {'accuracies': [], 'fit_times': []})
+            entry['accuracies'].append(accuracy)
+            entry['fit_times'].append(fit_time)
+        
+        best = {}
+        for name in estimators:
+            index = max(range(len(candidates[name])),
+                        key=lambda i: np.mean(results[(name, i)]['accuracies']))
+            best[name] = index
+        
+        refits = Parallel(n_jobs=n_jobs)(
+            delayed(_timed_fit)(clone(estimators[name]).set_params(**candidates[name][best[name]]),
+                                X_scaled, targets[name])
+            for name in estimators
+        )
+        
+        self.training_report = {}
+        for name, (fitted, refit_time) in zip(estimators, refits):
+            entry = results[(name, best[name])]
+            report = {
+                'best_params': candidates[name][best[name]],
+                'cv_folds': cv,
+                'candidates_evaluated': len(candidates[name]),
+                'cv_accuracy_mean': float(np.mean(entry['accuracies'])),
+                'cv_accuracy_std': float(np.std(entry['accuracies'])),
+                'cv_fit_time_mean': float(np.mean(entry['fit_times'])),
+                'refit_time': refit_time,
+                'model': type(fitted).__name__
+            }
+            if self.multi_output:
+                self.multi_model = fitted
+                for opt_name in self.OPTIMIZATION_NAMES:
+                    self.training_report[opt_name] = report
+            else:
+                self.models[name] = fitted
+                self.training_report[name] = report
+            print(f"  {name}: CV {report['cv_accuracy_mean']:.2f} ± {report['cv_accuracy_std']:.2f} "
+                  f"({report['cv_fit_time_mean'] * 1000:.0f} ms/ajuste) {report['best_params']}")
         
         self.is_trained = True
+        self._inference = None
         print("  ✅ Todos los modelos entrenados")
     
+    @staticmethod
+    def _cv_splitter(target: np.ndarray, cv: int):
+        """Folds estratificados si cada clase tiene al menos cv ejemplos"""
+        from sklearn.model_selection import KFold, StratifiedKFold
+        
+        if target.ndim == 1 and np.unique(target, return_counts=True)[1].min() >= cv:
+            return StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+        return KFold(n_splits=cv, shuffle=True, random_state=42)
+    
     def predict_optimizations(self, code_features: Dict, newton_specs: Dict) -> Dict[str, Dict]:
         """Predice qué optimizaciones aplicar"""
+        return self.predict_optimizations_batch([code_features], newton_specs)[0]
+    
+    def predict_optimizations_batch(self, code_features_list: List[Dict],
+                                    newton_specs: Dict) -> List[Dict[str, Dict]]:
+        """
+        Predice las optimizaciones de muchos archivos a la vez: una sola
+        matriz de features y una inferencia vectorizada por modelo
+        """
         if not self.is_trained:
             raise ValueError("Modelo no entrenado. Ejecuta train() primero.")
         
-        # Combinar features
-        combined_features = {**code_features, **newton_specs}
+        # Combinar features (valor por defecto 0.0 si falta alguna)
+        combined_list = [{**code_features, **newton_specs} for code_features in code_features_list]
+        feature_index, mean, scale = self._inference_arrays()
+        
+        # Matriz float32 preasignada con columnas fijas: el tipo con el que los
+        # ensembles de árboles evalúan sus nodos. Cada fila se normaliza en
+        # float64 (equivalente a StandardScaler.transform, sin pandas) y se
+        # reduce al escribirla, para no perder precisión al restar la media
+        # de valores grandes como el área en km²
+        X = np.empty((len(combined_list), len(feature_index)), dtype=np.float32)
+        raw = np.empty(len(feature_index))
+        for row, combined in enumerate(combined_list):
+            raw.fill(0.0)
+            for feature_name, column in feature_index.items():
+                value = combined.get(feature_name)
+                if value is not None:
+                    raw[column] = value
+            X[row] = (raw - mean) / scale
+        
+        # Predecir cada optimización para todas las filas: una llamada por modelo
+        predictions = [{} for _ in combined_list]
+        for opt_name, labels, confidences in self._predict_labels(X):
+            for row, (prediction, confidence) in enumerate(zip(labels, confidences)):
+                predictions[row][opt_name] = {
+                    'apply': bool(prediction),
+                    'confidence': float(confidence),
+                    'explanation': self._get_explanation(opt_name, combined_list[row], prediction, confidence)
+                }
         
-        # Crear DataFrame con features ordenadas correctamente
-        feature_vector = []
-        for feature_name in self.feature_names:
-            if feature_name in combined_features:
-                feature_vector.append(combined_features[feature_name])
-            else:
-                feature_vector.append(0.0)  # Valor por defecto
-        
-        # Normalizar
-        feature_df = pd.DataFrame([feature_vector], columns=self.feature_names)
-        X_scaled = self.scaler.transform(feature_df)
+        return predictions
+    
+    def _predict_labels(self, X: np.ndarray):
+        """Genera (optimización, etiquetas, confianzas) con una inferencia por modelo"""
+        if self.multi_output:
+            # predict_proba multi-salida devuelve una matriz de probabilidades por etiqueta
+            all_probabilities = self.multi_model.predict_proba(X)
+            for opt_name, classes, probabilities in zip(self.OPTIMIZATION_NAMES, self.multi_model.classes_,
+                                                        all_probabilities):
+                best = probabilities.argmax(axis=1)
+                yield opt_name, classes[best], probabilities[np.arange(len(best)), best]
+            return
         
-        # Predecir cada optimización
-        predictions = {}
         for opt_name, model in self.models.items():
-            # Predicción binaria
-            prediction = model.predict(X_scaled)[0]
-            
-            # Confianza (probabilidad)
             if hasattr(model, 'predict_proba'):
-                probabilities = model.predict_proba(X_scaled)[0]
-                confidence = max(probabilities)
+                # La etiqueta es la clase de mayor probabilidad
+                probabilities = model.predict_proba(X)
+                best = probabilities.argmax(axis=1)
+                yield opt_name, model.classes_[best], probabilities[np.arange(len(best)), best]
             else:
                 # Para SVM sin probabilidad
-                decision = model.decision_function(X_scaled)[0]
-                confidence = 1.0 / (1.0 + np.exp(-abs(decision)))  # Aproximación sigmoid
-            
-            predictions[opt_name] = {
-                'apply': bool(prediction),
-                'confidence': confidence,
-                'explanation': self._get_explanation(opt_name, combined_features, prediction, confidence)
-            }
-        
-        return predictions
+                decision = model.decision_function(X)
+                labels = model.classes_[(decision > 0).astype(int)]
+                yield opt_name, labels, 1.0 / (1.0 + np.exp(-np.abs(decision)))  # Aproximación sigmoid
+    
+    def _inference_arrays(self) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        """Índice fijo feature → columna y parámetros del scaler (cacheados)"""
+        if self._inference is None:
+            feature_index = {name: column for column, name in enumerate(self.feature_names)}
+            mean = np.asarray(self.scaler.mean_, dtype=np.float64)
+            scale = np.asarray(self.scaler.scale_, dtype=np.float64)
+            self._inference = (feature_index, mean, scale)
+        return self._inference
     
     def _get_explanation(self, opt_name: str, features: Dict, prediction: bool, confidence: float) -> str:
         """Genera explicación humana de la predicción"""
@@ -542,38 +1363,347 @@ class OptimizationMLModel:
         return f"{base_explanation} (confianza: {confidence:.1%})"
     
     def save_model(self, filepath: str):
-        """Guarda el modelo entrenado"""
+        """Guarda el modelo entrenado como artefacto versionado"""
+        import joblib
+        import sklearn
+        
         model_data = {
             'models': self.models,
+            'multi_output': self.multi_output,
+            'multi_model': self.multi_model,
             'scaler': self.scaler,
             'feature_names': self.feature_names,
-            'is_trained': self.is_trained
+            'training_report': self.training_report,
+            'training_data_id': self.training_data_id,
+            'is_trained': self.is_trained,
+            'artifact_version': self.ARTIFACT_VERSION,
+            'extractor_version': CodeFeatureExtractor.VERSION,
+            'newton_parser_version': NewtonSpecParser.VERSION,
+            'sklearn_version': sklearn.__version__,
+            'created': datetime.now().isoformat()
         }
-        joblib.dump(model_data, filepath)
+        tmp_path = filepath + ".tmp"
+        joblib.dump(model_data, tmp_path)
+        os.replace(tmp_path, filepath)
         print(f"✅ Modelo guardado en: {filepath}")
     
-    def load_model(self, filepath: str):
-        """Carga un modelo previamente entrenado"""
-        if os.path.exists(filepath):
+    def load_model(self, filepath: str, known_features: Optional[set] = None,
+                   training_data_id: Optional[str] = None) -> bool:
+        """
+        Carga un modelo previamente entrenado. Devuelve False si no existe o
+        está obsoleto (otra versión de artefacto, extractor o sklearn,
+        features que el extractor ya no produce o datos de entrenamiento
+        distintos de training_data_id)
+        """
+        if not os.path.exists(filepath):
+            print(f"⚠️  Archivo de modelo no encontrado: {filepath}")
+            return False
+        
+        try:
+            import joblib
             model_data = joblib.load(filepath)
-            self.models = model_data['models']
-            self.scaler = model_data['scaler']
-            self.feature_names = model_data['feature_names']
-            self.is_trained = model_data['is_trained']
-            print(f"✅ Modelo cargado desde: {filepath}")
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar el modelo {filepath}: {e}")
+            return False
+        
+        problem = self._artifact_problem(model_data, known_features, training_data_id)
+        if problem:
+            print(f"⚠️  Modelo obsoleto en {filepath}: {problem}")
+            return False
+        
+        self.models = model_data['models']
+        self.multi_model = model_data['multi_model']
+        self.scaler = model_data['scaler']
+        self.feature_names = model_data['feature_names']
+        self.training_report = model_data.get('training_report', {})
+        self.training_data_id = model_data.get('training_data_id')
+        self.is_trained = model_data['is_trained']
+        self._inference = None
+        print(f"✅ Modelo cargado desde: {filepath}")
+        return True
+    
+    def _artifact_problem(self, model_data: Any, known_features: Optional[set],
+                          training_data_id: Optional[str] = None) -> Optional[str]:
+        """Motivo por el que el artefacto no es utilizable, o None si es válido"""
+        import sklearn
+        
+        if not isinstance(model_data, dict) or not model_data.get('is_trained'):
+            return "artefacto sin modelo entrenado"
+        expected_versions = {
+            'artifact_version': self.ARTIFACT_VERSION,
+            'extractor_version': CodeFeatureExtractor.VERSION,
+            'newton_parser_version': NewtonSpecParser.VERSION,
+            'sklearn_version': sklearn.__version__
+        }
+        for key, expected in expected_versions.items():
+            if model_data.get(key) != expected:
+                return f"{key} {model_data.get(key)} != {expected}"
+        if training_data_id is not None and model_data.get('training_data_id') != training_data_id:
+            return "los datos de entrenamiento cambiaron"
+        if model_data.get('multi_output') != self.multi_output:
+            return "modo multi-salida distinto"
+        if set(model_data.get('models', {})) != set(self.models):
+            return "conjunto de modelos distinto"
+        feature_names = model_data.get('feature_names') or []
+        if not feature_names:
+            return "sin feature_names"
+        if known_features is not None:
+            unknown = [name for name in feature_names if name not in known_features]
+            if unknown:
+                return f"features desconocidas para el extractor: {', '.join(unknown)}"
+        return None
+
+class TrainingDataStore:
+    """
+    Almacén SQLite de casos de entrenamiento medidos con benchmarks.
+    
+    Cada caso guarda las features del código y del Newton, la etiqueta de
+    cada optimización y las mediciones (aceleración y error). La clave es
+    el hash de (código, Newton, máquina), así que volver a medir el mismo
+    caso lo reemplaza en lugar de duplicarlo.
+    """
+    
+    def __init__(self, db_path: str = "training_data.sqlite"):
+        self.db_path = db_path
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    sample_key TEXT PRIMARY KEY,
+                    source_file TEXT,
+                    newton_file TEXT,
+                    host TEXT,
+                    updated TEXT,
+                    features TEXT,
+                    labels TEXT,
+                    measurements TEXT
+                )
+            """)
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+    
+    @staticmethod
+    def sample_key(code_content: str, newton_content: str, host: str) -> str:
+        """Clave de deduplicación del caso"""
+        return hashlib.sha256('\0'.join((code_content, newton_content, host)).encode('utf-8')).hexdigest()
+    
+    def add_sample(self, sample_key: str, source_file: str, newton_file: str, host: str,
+                   features: Dict, labels: Dict, measurements: Dict):
+        """Inserta o reemplaza un caso medido"""
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sample_key, source_file, newton_file, host, datetime.now().isoformat(),
+                 json.dumps(features), json.dumps(labels), json.dumps(measurements, default=str))
+            )
+    
+    def count(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+    
+    def fingerprint(self) -> str:
+        """Identifica el contenido actual (cambia al añadir o volver a medir casos)"""
+        with self._connect() as connection:
+            count, updated = connection.execute("SELECT COUNT(*), MAX(updated) FROM samples").fetchone()
+        return f"store:{count}:{updated}"
+    
+    def load_samples(self) -> List[Tuple[Dict, Dict]]:
+        """(features, etiquetas) de todos los casos"""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT features, labels FROM samples ORDER BY sample_key").fetchall()
+        return [(json.loads(features), json.loads(labels)) for features, labels in rows]
+
+class FeatureCache:
+    """
+    Caché en disco de características de código y especificaciones Newton.
+    
+    Cada entrada es un JSON indexado por (hash del contenido, versión del
+    extractor), de modo que los archivos sin cambios no se vuelven a
+    analizar. El tiempo de modificación marca el último uso (LRU) y se
+    desalojan las entradas más antiguas al superar el tamaño máximo.
+    
+    El número de entradas y los bytes se llevan de forma incremental; el
+    directorio solo se recorre al pasar un límite (lo que también resincroniza
+    lo escrito por otros procesos), y el desalojo baja hasta EVICT_TARGET de
+    los límites para que el siguiente recorrido tarde en volver a hacer falta.
+    """
+    
+    EVICT_TARGET = 0.9
+    
+    def __init__(self, cache_dir: str = ".feature_cache", max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Totales conocidos de la caché (None hasta el primer recorrido)
+        self._entry_count = None
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(content: str, version: str) -> str:
+        """Clave a partir del contenido y la versión del extractor"""
+        return f"{hashlib.sha256(content.encode('utf-8')).hexdigest()}-{version}"
+    
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{namespace}-{key}.json")
+    
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        """Devuelve la entrada cacheada (y la marca como usada) o None"""
+        path = self._path(namespace, key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+    
+    def put(self, namespace: str, key: str, value: Dict):
+        """Guarda la entrada de forma atómica y aplica el límite de tamaño"""
+        path = self._path(namespace, key)
+        try:
+            previous_size = os.stat(path).st_size
+        except OSError:
+            previous_size = None
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        
+        if self._entry_count is None:
+            self._scan()
         else:
-            print(f"⚠️  Archivo de modelo no encontrado: {filepath}")
+            if previous_size is None:
+                self._entry_count += 1
+            self._total_bytes += size - (previous_size or 0)
+        
+        if self._entry_count > self.max_entries or self._total_bytes > self.max_bytes:
+            self._evict()
+    
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """Recorre el directorio: (mtime, tamaño, ruta) de cada entrada y totales actualizados"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Eliminada por otro proceso (p. ej. un trabajador del generador por lotes)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        self._entry_count = len(entries)
+        self._total_bytes = sum(size for _, size, _ in entries)
+        return entries
+    
+    def _evict(self):
+        """Elimina las entradas usadas hace más tiempo hasta quedar en EVICT_TARGET de los límites"""
+        entries = self._scan()
+        if self._entry_count <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        
+        target_entries = int(self.max_entries * self.EVICT_TARGET)
+        target_bytes = int(self.max_bytes * self.EVICT_TARGET)
+        entries.sort()
+        for _, size, path in entries:
+            if self._entry_count <= target_entries and self._total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._entry_count -= 1
+            self._total_bytes -= size
+
+# Cerebro por proceso para la extracción en paralelo de analyze_many
+_worker_brain = None
+
+def _init_feature_worker(use_ast: bool, cache_dir: Optional[str]):
+    """Inicializa el extractor (y su caché) una vez por proceso del pool"""
+    global _worker_brain
+    _worker_brain = OptimizationBrain(use_ast=use_ast, cache_dir=cache_dir)
+
+def _extract_file_features(code_file: str, brain: Optional['OptimizationBrain'] = None
+                           ) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+    """Lee un archivo C y extrae sus características (en el pool o con brain dado)"""
+    brain = brain or _worker_brain
+    try:
+        with open(code_file, 'r', encoding='utf-8') as f:
+            code_content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"❌ No se pudo leer {code_file}: {e}")
+        return code_file, None, None
+    features, function_features = brain._extract_code_features(code_content)
+    return code_file, features, function_features
 
 class OptimizationBrain:
     """
     Sistema principal que coordina todo el análisis ML
     """
     
-    def __init__(self):
-        self.feature_extractor = CodeFeatureExtractor()
+    def __init__(self, use_ast: bool = False, cache_dir: Optional[str] = None,
+                 model_path: Optional[str] = "optimization_model.pkl", multi_output: bool = False,
+                 hyperparameter_search: bool = False, training_store: Optional[str] = None,
+                 min_store_samples: int = 20):
+        self.feature_extractor = CodeFeatureExtractor(use_ast=use_ast)
         self.newton_parser = NewtonSpecParser()
-        self.ml_model = OptimizationMLModel()
-        
+        self._ml_model = None
+        self.multi_output = multi_output
+        # Reentrenar con búsqueda CV en paralelo en lugar de hiperparámetros fijos
+        self.hyperparameter_search = hyperparameter_search
+        # Casos medidos con benchmarks (ver BenchmarkDatasetBuilder); si hay
+        # suficientes sustituyen al dataset sintético
+        self.training_store = training_store
+        self.min_store_samples = min_store_samples
+        # Artefacto del modelo: se carga si es válido y se reescribe al reentrenar
+        self.model_path = model_path
+        # Caché en disco por hash de contenido (None = sin caché)
+        self.cache = FeatureCache(cache_dir) if cache_dir else None
+    
+    @property
+    def ml_model(self) -> OptimizationMLModel:
+        """Modelo ML, creado al primer uso (la extracción de features no necesita sklearn)"""
+        if self._ml_model is None:
+            self._ml_model = OptimizationMLModel(multi_output=self.multi_output)
+        return self._ml_model
+    
+    def _extract_code_features(self, code_content: str) -> Tuple[Dict, Optional[Dict]]:
+        """Características globales y por función, reutilizando la caché si existe"""
+        if self.cache is None:
+            return (self.feature_extractor.extract_features(code_content),
+                    self.feature_extractor.extract_function_features(code_content))
+        
+        use_ast = self.feature_extractor.ast_frontend is not None
+        key = self.cache.make_key(code_content, f"v{CodeFeatureExtractor.VERSION}{'-ast' if use_ast else ''}")
+        cached = self.cache.get('code', key)
+        if cached is not None:
+            return cached['features'], cached['function_features']
+        
+        features = self.feature_extractor.extract_features(code_content)
+        function_features = self.feature_extractor.extract_function_features(code_content)
+        self.cache.put('code', key, {'features': features, 'function_features': function_features})
+        return features, function_features
+    
+    def _parse_newton_specs(self, newton_file: str) -> Dict:
+        """Especificaciones Newton, reutilizando la caché si existe"""
+        if self.cache is None or not os.path.exists(newton_file):
+            return self.newton_parser.parse_newton_file(newton_file)
+        
+        with open(newton_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        key = self.cache.make_key(content, f"v{NewtonSpecParser.VERSION}")
+        specs = self.cache.get('newton', key)
+        if specs is None:
+            specs = self.newton_parser.parse_newton_content(content)
+            self.cache.put('newton', key, specs)
+        return specs
+    
     def analyze_and_predict(self, code_file: str, newton_file: str = None) -> Dict:
         """
         Análisis completo: código + especificaciones → predicciones ML
@@ -590,7 +1720,7 @@ class OptimizationBrain:
         with open(code_file, 'r', encoding='utf-8') as f:
             code_content = f.read()
         
-        code_features = self.feature_extractor.extract_features(code_content)
+        code_features, function_features = self._extract_code_features(code_content)
         print(f"  ✅ Extraídas {len(code_features)} características del código")
         
         # 2. Parsear especificaciones Newton
@@ -598,14 +1728,11 @@ class OptimizationBrain:
         if newton_file is None:
             newton_file = "peru-gps-specs.newton"  # Tu archivo generado automáticamente
         
-        newton_specs = self.newton_parser.parse_newton_file(newton_file)
+        newton_specs = self._parse_newton_specs(newton_file)
         print(f"  ✅ Parseadas {len(newton_specs)} especificaciones Newton")
         
         # 3. Entrenar modelo si no está entrenado
-        if not self.ml_model.is_trained:
-            print("🏗️  Entrenando modelo ML...")
-            X, y = self.ml_model.create_training_dataset()
-            self.ml_model.train(X, y)
+        self._ensure_trained()
         
         # 4. Hacer predicciones
         print("🎯 Realizando predicciones ML...")
@@ -617,6 +1744,7 @@ class OptimizationBrain:
             'code_file': code_file,
             'newton_file': newton_file,
             'code_features': code_features,
+            'function_features': function_features,
             'newton_specs': newton_specs,
             'ml_predictions': predictions,
             'summary': self._create_summary(predictions)
@@ -624,6 +1752,86 @@ class OptimizationBrain:
         
         return report
     
+    def _ensure_trained(self):
+        """Carga el artefacto guardado o, si falta o está obsoleto, reentrena y lo guarda"""
+        if self.ml_model.is_trained:
+            return
+        
+        store = None
+        if self.training_store and os.path.exists(self.training_store):
+            store = TrainingDataStore(self.training_store)
+            if store.count() < self.min_store_samples:
+                print(f"⚠️  Solo {store.count()} casos medidos, se usa el dataset sintético")
+                store = None
+        training_data_id = store.fingerprint() if store else 'synthetic'
+        
+        if self.model_path and self.ml_model.load_model(self.model_path, self._known_feature_names(),
+                                                        training_data_id):
+            return
+        
+        print("🏗️  Entrenando modelo ML...")
+        if store:
+            X, y = self.ml_model.create_dataset_from_store(store)
+        else:
+            X, y = self.ml_model.create_training_dataset()
+        self.ml_model.train(X, y, search=self.hyperparameter_search)
+        if self.model_path:
+            self.ml_model.save_model(self.model_path)
+    
+    def _known_feature_names(self) -> set:
+        """Features que el extractor y el parser Newton pueden producir"""
+        # Una línea de código basta para que aparezcan también las features *_per_loc
+        return (set(self.feature_extractor.extract_features(';'))
+                | set(self.newton_parser._get_default_specs()))
+    
+    def analyze_many(self, code_files: List[str], newton_file: str = None,
+                     max_workers: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Análisis por lotes de un árbol de código completo: extrae features en
+        un pool de procesos, las apila en una matriz y hace una sola
+        inferencia por modelo. Devuelve un reporte por archivo.
+        """
+        if newton_file is None:
+            newton_file = "peru-gps-specs.newton"
+        newton_specs = self._parse_newton_specs(newton_file)
+        
+        use_ast = self.feature_extractor.ast_frontend is not None
+        cache_dir = self.cache.cache_dir if self.cache else None
+        if max_workers == 1 or len(code_files) < 2:
+            extracted = [_extract_file_features(code_file, self) for code_file in code_files]
+        else:
+            workers = max_workers or os.cpu_count() or 1
+            chunksize = max(1, len(code_files) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_feature_worker,
+                                     initargs=(use_ast, cache_dir)) as executor:
+                extracted = list(executor.map(_extract_file_features, code_files, chunksize=chunksize))
+        
+        extracted = [item for item in extracted if item[1] is not None]
+        if not extracted:
+            return {}
+        
+        self._ensure_trained()
+        predictions = self.ml_model.predict_optimizations_batch(
+            [features for _, features, _ in extracted], newton_specs
+        )
+        
+        timestamp = datetime.now().isoformat()
+        reports = {}
+        for (code_file, features, function_features), file_predictions in zip(extracted, predictions):
+            reports[code_file] = {
+                'timestamp': timestamp,
+                'code_file': code_file,
+                'newton_file': newton_file,
+                'code_features': features,
+                'function_features': function_features,
+                'newton_specs': newton_specs,
+                'ml_predictions': file_predictions,
+                'summary': self._create_summary(file_predictions)
+            }
+        
+        print(f"✅ Analizados {len(extracted)} de {len(code_files)} archivos")
+        return reports
+    
     def _create_summary(self, predictions: Dict) -> Dict:
         """Crea resumen de las predicciones"""
         total_optimizations = len(predictions)
@@ -728,8 +1936,8 @@ def main():
     print("Wilson Ramos Pacco - Universidad Nacional de San Agustín")
     print()
     
-    # Inicializar sistema
-    brain = OptimizationBrain()
+    # Inicializar sistema (caché para no reanalizar archivos sin cambios)
+    brain = OptimizationBrain(cache_dir='.feature_cache')
     
     # Analizar código genérico
     print("🔍 ANALIZANDO CÓDIGO GENÉRICO...")
@@ -742,9 +1950,6 @@ def main():
         with open('ml_analysis_report.json', 'w') as f:
             json.dump(generic_report, f, indent=2, default=str)
         print("\n💾 Reporte guardado en: ml_analysis_report.json")
-        
-        # Guardar modelo entrenado
-        brain.ml_model.save_model('optimization_model.pkl')
     
     print("\n✨ ¡ANÁLISIS ML COMPLETADO!")
     print("🎯 Ahora tienes un sistema que predice automáticamente optimizaciones")
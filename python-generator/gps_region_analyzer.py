@@ -4,25 +4,514 @@ Analizador de Datos GPS por Región
 Investiga qué datos GPS tienes y filtra por regiones específicas
 """
 
-import psycopg2
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:  # Permite analizar archivos exportados sin driver PostgreSQL
+    psycopg2 = None
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+import json
+import math
+import os
+from abc import ABC, abstractmethod
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional, Iterator
 import matplotlib.pyplot as plt
 
+# Campos del sensor GPS que se agregan para las especificaciones Newton
+GPS_FIELDS = ['latitude', 'longitude', 'altitude', 'speed', 'satellites', 'hdop']
+
+# Filas por bloque al recorrer las fuentes de datos columnares
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Códigos de región en el mismo orden de prioridad que classify_coordinate
+REGION_PERU = 0
+REGION_AREQUIPA = 1
+REGION_SPAIN = 2
+REGION_EUROPE_AFRICA = 3
+REGION_SOUTH = 4
+REGION_UNKNOWN = 5
+
+REGION_LABELS = [
+    "🇵🇪 Perú",
+    "🏔️ Arequipa",
+    "🇪🇸 España",
+    "🌍 Europa/África",
+    "🌊 Sur de Perú/Chile",
+    "❓ Desconocido"
+]
+
+class FieldAccumulator:
+    """
+    Estadísticas acumulables de un campo: count, suma, suma de cuadrados,
+    mínimo y máximo. Dos acumuladores se pueden fusionar sin releer datos.
+    """
+    
+    def __init__(self, count: int = 0, total: float = 0.0, total_sq: float = 0.0,
+                 minimum: Optional[float] = None, maximum: Optional[float] = None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+    
+    def update(self, values: np.ndarray) -> 'FieldAccumulator':
+        """Acumula un bloque de valores (los NaN se ignoran como NULL en SQL)"""
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        return self.merge(FieldAccumulator(
+            int(values.size),
+            float(values.sum()),
+            float(np.dot(values, values)),
+            float(values.min()),
+            float(values.max())
+        ))
+    
+    def merge(self, other: 'FieldAccumulator') -> 'FieldAccumulator':
+        """Fusiona otro acumulador en este"""
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        return self
+    
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    @property
+    def stddev(self) -> float:
+        """Desviación estándar muestral (equivalente a STDDEV de PostgreSQL)"""
+        if self.count < 2:
+            return 0.0
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+    
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'sum_sq': self.total_sq,
+            'min': self.minimum,
+            'max': self.maximum
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FieldAccumulator':
+        return cls(data['count'], data['sum'], data['sum_sq'], data['min'], data['max'])
+
+# Cuantiles usados para los rangos robustos (p0.1 – p99.9)
+ROBUST_QUANTILES = (0.001, 0.999)
+
+# Radio terrestre medio para distancias entre muestras consecutivas
+EARTH_RADIUS_M = 6371000.0
+
+# Campos cuyos rangos deben estabilizarse en el muestreo adaptativo
+SAMPLED_FIELDS = ['latitude', 'longitude', 'altitude', 'speed']
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles estilo t-digest: centroides (media, peso) cuyo
+    tamaño máximo lo fija la función de escala k1, con centroides muy
+    pequeños en las colas. Se fusiona entre bloques, tablas y procesos.
+    """
+    
+    def __init__(self, compression: float = 1000.0):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+    
+    def update(self, values: np.ndarray) -> 'QuantileSketch':
+        """Añade un bloque de valores (los NaN se ignoran)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self._update_extremes(float(values.min()), float(values.max()))
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(values.size)]))
+        return self
+    
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Fusiona otro sketch en este"""
+        if other.count == 0:
+            return self
+        self._update_extremes(other.minimum, other.maximum)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+    
+    def _update_extremes(self, minimum: float, maximum: float):
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+    
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """Agrupa los centroides ordenados por intervalos unitarios de k1(q)"""
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        
+        q_left = (np.cumsum(weights) - weights) / total
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        bins = np.floor(scale).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+        self.count = int(round(total))
+    
+    def quantile(self, q: float) -> float:
+        """Estima el valor del cuantil q (0..1)"""
+        if self.count == 0:
+            return float('nan')
+        midpoints = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.count,
+                               np.r_[0.0, midpoints, self.count],
+                               np.r_[self.minimum, self.means, self.maximum]))
+    
+    def cdf(self, value: float) -> float:
+        """Estima la fracción de valores menores o iguales a value"""
+        if self.count == 0:
+            return float('nan')
+        midpoints = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(value,
+                               np.r_[self.minimum, self.means, self.maximum],
+                               np.r_[0.0, midpoints, self.count])) / self.count
+    
+    def to_dict(self) -> Dict:
+        return {
+            'compression': self.compression,
+            'count': self.count,
+            'min': self.minimum,
+            'max': self.maximum,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        sketch = cls(data['compression'])
+        sketch.count = data['count']
+        sketch.minimum = data['min']
+        sketch.maximum = data['max']
+        sketch.means = np.asarray(data['means'], dtype=np.float64)
+        sketch.weights = np.asarray(data['weights'], dtype=np.float64)
+        return sketch
+
+class GPSDataSource(ABC):
+    """
+    Fuente de datos GPS para el analizador. Entrega las columnas en
+    bloques de arrays NumPy float64 (NaN representa NULL).
+    """
+    
+    @abstractmethod
+    def list_tables(self) -> List[str]:
+        """Tablas con columnas latitude/longitude"""
+    
+    @abstractmethod
+    def iter_chunks(self, table_name: str, columns: List[str],
+                    chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+        """Bloques {columna: array float64} de la tabla"""
+    
+    def close(self):
+        pass
+
+class BinaryCopyDecoder:
+    """
+    Destino de COPY ... TO STDOUT (FORMAT binary) que decodifica las filas
+    a medida que llegan, directamente en buffers NumPy preasignados.
+    Requiere columnas float8 no nulas (se usa COALESCE(..., 'NaN')), de
+    modo que todas las filas tienen el mismo tamaño y se decodifican con
+    un dtype estructurado sin objetos Python por fila.
+    """
+    
+    SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+    
+    def __init__(self, columns: List[str], expected_rows: int = 1 << 16):
+        self.columns = columns
+        self.row_dtype = np.dtype(
+            [('field_count', '>i2')] +
+            [item for i in range(len(columns)) for item in ((f'len_{i}', '>i4'), (f'val_{i}', '>f8'))]
+        )
+        self.buffers = {column: np.empty(max(expected_rows, 1), dtype=np.float64) for column in columns}
+        self.rows = 0
+        self._pending = bytearray()
+        self._header_parsed = False
+    
+    def write(self, data) -> int:
+        self._pending += data
+        if not self._header_parsed and not self._parse_header():
+            return len(data)
+        
+        complete = len(self._pending) // self.row_dtype.itemsize
+        if complete:
+            size = complete * self.row_dtype.itemsize
+            self._decode(bytes(self._pending[:size]))
+            del self._pending[:size]
+        return len(data)
+    
+    def _parse_header(self) -> bool:
+        # Firma (11) + flags (4) + longitud de extensión (4) + extensión
+        if len(self._pending) < 19:
+            return False
+        if bytes(self._pending[:11]) != self.SIGNATURE:
+            raise ValueError("Firma COPY binaria inválida")
+        extension_length = int.from_bytes(self._pending[15:19], 'big')
+        header_length = 19 + extension_length
+        if len(self._pending) < header_length:
+            return False
+        del self._pending[:header_length]
+        self._header_parsed = True
+        return True
+    
+    def _decode(self, data: bytes):
+        records = np.frombuffer(data, dtype=self.row_dtype)
+        if (records['field_count'] != len(self.columns)).any() or any(
+                (records[f'len_{i}'] != 8).any() for i in range(len(self.columns))):
+            raise ValueError("Formato COPY binario inesperado (¿valores NULL o no float8?)")
+        
+        end = self.rows + len(records)
+        capacity = len(self.buffers[self.columns[0]])
+        if end > capacity:
+            new_capacity = max(end, capacity * 2)
+            for column in self.columns:
+                grown = np.empty(new_capacity, dtype=np.float64)
+                grown[:self.rows] = self.buffers[column][:self.rows]
+                self.buffers[column] = grown
+        
+        for i, column in enumerate(self.columns):
+            self.buffers[column][self.rows:end] = records[f'val_{i}']
+        self.rows = end
+    
+    def result(self) -> Dict[str, np.ndarray]:
+        """Arrays decodificados (valida el trailer de fin de COPY)"""
+        if bytes(self._pending) != b'\xff\xff':
+            raise ValueError("COPY binario incompleto: falta el trailer")
+        return {column: buffer[:self.rows] for column, buffer in self.buffers.items()}
+
+class PostgresDataSource(GPSDataSource):
+    """
+    Fuente PostgreSQL que recorre la tabla con un cursor con nombre
+    (server-side) o, con use_copy=True, con COPY binario a arrays NumPy
+    """
+    
+    def __init__(self, connection, use_copy: bool = False):
+        self.connection = connection
+        self.use_copy = use_copy
+    
+    def list_tables(self) -> List[str]:
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT DISTINCT table_name 
+            FROM information_schema.columns 
+            WHERE column_name IN ('latitude', 'longitude')
+            AND table_schema = 'public'
+            ORDER BY table_name;
+        """)
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _column_sql(self, column: str) -> str:
+        """Expresión float8 de la columna (timestamp se convierte a segundos epoch)"""
+        if column == 'timestamp':
+            return "EXTRACT(EPOCH FROM timestamp)::float8"
+        return f"{column}::float8"
+    
+    def iter_chunks(self, table_name: str, columns: List[str],
+                    chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+        if self.use_copy:
+            arrays = self.copy_table_to_arrays(table_name, columns)
+            total = len(arrays[columns[0]])
+            for start in range(0, total, chunk_rows):
+                yield {column: values[start:start + chunk_rows] for column, values in arrays.items()}
+            return
+        
+        cursor = self.connection.cursor(name=f"gps_stream_{table_name}")
+        cursor.itersize = chunk_rows
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(self._column_sql(column) for column in columns)}
+                FROM {table_name}
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+            """)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                block = np.array(rows, dtype=np.float64)
+                yield {column: block[:, i] for i, column in enumerate(columns)}
+        finally:
+            cursor.close()
+    
+    def copy_table_to_arrays(self, table_name: str, columns: List[str],
+                             expected_rows: int = 1 << 16) -> Dict[str, np.ndarray]:
+        """
+        Extrae las columnas con COPY (FORMAT binary) decodificando en
+        buffers NumPy float64, sin pasar por tuplas Python
+        """
+        select_sql = ", ".join(
+            f"COALESCE({self._column_sql(column)}, 'NaN'::float8)" for column in columns
+        )
+        query = f"""
+            COPY (
+                SELECT {select_sql}
+                FROM {table_name}
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ) TO STDOUT (FORMAT binary)
+        """
+        decoder = BinaryCopyDecoder(columns, expected_rows)
+        self.connection.cursor().copy_expert(query, decoder)
+        return decoder.result()
+    
+    def close(self):
+        self.connection.close()
+
+class ColumnarFileSource(GPSDataSource):
+    """
+    Fuente de archivos exportados. Cada tabla puede ser:
+      - <tabla>.parquet  (requiere pyarrow)
+      - <tabla>/<columna>.npy  (arrays NumPy, se abren con memmap)
+      - <tabla>.csv
+    """
+    
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+    
+    def list_tables(self) -> List[str]:
+        tables = []
+        for entry in sorted(os.listdir(self.base_dir)):
+            path = os.path.join(self.base_dir, entry)
+            name, ext = os.path.splitext(entry)
+            if ext in ('.parquet', '.csv'):
+                tables.append(name)
+            elif os.path.isdir(path) and os.path.exists(os.path.join(path, 'latitude.npy')):
+                tables.append(entry)
+        return tables
+    
+    def iter_chunks(self, table_name: str, columns: List[str],
+                    chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+        base = os.path.join(self.base_dir, table_name)
+        if os.path.exists(base + '.parquet'):
+            yield from self._iter_parquet(base + '.parquet', columns, chunk_rows)
+        elif os.path.isdir(base):
+            yield from self._iter_npy(base, columns, chunk_rows)
+        elif os.path.exists(base + '.csv'):
+            yield from self._iter_csv(base + '.csv', columns, chunk_rows)
+        else:
+            raise FileNotFoundError(f"No existe la tabla exportada: {base}")
+    
+    def _iter_parquet(self, path: str, columns: List[str], chunk_rows: int):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow es necesario para leer Parquet: pip install pyarrow")
+        
+        parquet_file = pq.ParquetFile(path)
+        available = [c for c in columns if c in parquet_file.schema_arrow.names]
+        categories = {}
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=available):
+            size = batch.num_rows
+            yield {
+                column: (self._to_float64(column, batch.column(available.index(column)).to_pandas(), categories)
+                         if column in available else np.full(size, np.nan))
+                for column in columns
+            }
+    
+    def _iter_npy(self, directory: str, columns: List[str], chunk_rows: int):
+        arrays = {}
+        for column in columns:
+            path = os.path.join(directory, f"{column}.npy")
+            if os.path.exists(path):
+                arrays[column] = np.load(path, mmap_mode='r')
+        total = len(arrays['latitude'])
+        for start in range(0, total, chunk_rows):
+            stop = min(start + chunk_rows, total)
+            yield {
+                column: (np.asarray(arrays[column][start:stop], dtype=np.float64)
+                         if column in arrays else np.full(stop - start, np.nan))
+                for column in columns
+            }
+    
+    def _iter_csv(self, path: str, columns: List[str], chunk_rows: int):
+        header = pd.read_csv(path, nrows=0).columns
+        available = [c for c in columns if c in header]
+        categories = {}
+        for frame in pd.read_csv(path, usecols=available, chunksize=chunk_rows):
+            size = len(frame)
+            yield {
+                column: (self._to_float64(column, frame[column], categories)
+                         if column in available else np.full(size, np.nan))
+                for column in columns
+            }
+    
+    def _to_float64(self, column: str, values: pd.Series, categories: Dict[str, Dict]) -> np.ndarray:
+        """
+        Convierte una columna a float64 con los mismos valores que
+        PostgresDataSource._column_sql: las fechas pasan a segundos epoch
+        (UTC) y los valores no numéricos (p. ej. device_id de texto) a
+        códigos enteros estables entre bloques (categories guarda el mapeo)
+        """
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().sum() == values.notna().sum():
+                return numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+            if column == 'timestamp':
+                values = pd.to_datetime(values, utc=True)
+            else:
+                codes, uniques = pd.factorize(values)
+                mapping = categories.setdefault(column, {})
+                lookup = np.array([mapping.setdefault(value, len(mapping)) for value in uniques] + [np.nan],
+                                  dtype=np.float64)
+                # El código -1 (nulo) cae en el NaN final de lookup
+                return lookup[codes]
+        
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+            return ((values - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
 class GPSRegionAnalyzer:
-    def __init__(self, db_config: Dict[str, str]):
+    def __init__(self, db_config: Dict[str, str], state_dir: str = "newton_state",
+                 data_source: Optional[GPSDataSource] = None,
+                 robust_ranges: bool = False,
+                 device_column: Optional[str] = None):
         self.db_config = db_config
         self.connection = None
+        # Directorio donde se persiste el estado incremental por tabla
+        self.state_dir = state_dir
+        # Fuente alternativa (archivos exportados); None = consultas SQL directas
+        self.data_source = data_source
+        # Rangos Newton por cuantiles p0.1–p99.9 en lugar de MIN/MAX crudos
+        self.robust_ranges = robust_ranges
+        # Columna que identifica el dispositivo; None = una tabla por dispositivo
+        self.device_column = device_column
         
+    def _connection_kwargs(self) -> Dict[str, str]:
+        return {
+            'host': self.db_config['host'],
+            'port': self.db_config['port'],
+            'database': self.db_config['database'],
+            'user': self.db_config['user'],
+            'password': self.db_config['password']
+        }
+    
     def connect_database(self) -> bool:
+        if psycopg2 is None:
+            print("❌ psycopg2 no está instalado: usa una fuente de archivos (ColumnarFileSource)")
+            return False
         try:
-            self.connection = psycopg2.connect(
-                host=self.db_config['host'],
-                port=self.db_config['port'],
-                database=self.db_config['database'],
-                user=self.db_config['user'],
-                password=self.db_config['password']
-            )
+            self.connection = psycopg2.connect(**self._connection_kwargs())
             print(f"✅ Conectado a la base de datos '{self.db_config['database']}'")
             return True
         except Exception as e:
@@ -162,6 +651,39 @@ class GPSRegionAnalyzer:
         else:
             return "❓ Desconocido"
     
+    def classify_coordinates(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de classify_coordinate: devuelve un array de
+        códigos REGION_* (int8) para millones de coordenadas en una pasada
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        
+        conditions = [
+            (lats >= -18) & (lats <= -10) & (lons >= -82) & (lons <= -68),
+            (lats >= -17) & (lats <= -15) & (lons >= -72) & (lons <= -70),
+            (lats >= 35) & (lats <= 45) & (lons >= -10) & (lons <= 5),
+            (lats > 20) & (lons > -20),
+            lats < -20
+        ]
+        choices = [REGION_PERU, REGION_AREQUIPA, REGION_SPAIN, REGION_EUROPE_AFRICA, REGION_SOUTH]
+        
+        return np.select(conditions, choices, default=REGION_UNKNOWN).astype(np.int8)
+    
+    def count_regions(self, region_codes: np.ndarray) -> Dict[str, int]:
+        """Cuenta puntos por región a partir de los códigos de classify_coordinates"""
+        counts = np.bincount(region_codes, minlength=len(REGION_LABELS))
+        return {label: int(counts[code]) for code, label in enumerate(REGION_LABELS)}
+    
+    def _print_region_counts(self, region_counts: Dict[str, int]):
+        """Imprime la distribución de puntos por región"""
+        total = sum(region_counts.values())
+        print(f"\n📊 DISTRIBUCIÓN POR REGIÓN:")
+        print("-" * 60)
+        for label, count in sorted(region_counts.items(), key=lambda item: -item[1]):
+            if count:
+                print(f"  {label}: {count} puntos ({count / total:.1%})")
+    
     def filter_peru_data(self, table_name: str) -> Dict:
         """Filtra solo datos de Perú y regenera estadísticas"""
         try:
@@ -242,19 +764,9 @@ class GPSRegionAnalyzer:
             }
             
             # Calcular precisión para Perú
-            stats['precision'] = {
-                'latitude_meters': stats['latitude']['stddev'] * 111000,
-                'longitude_meters': stats['longitude']['stddev'] * 111000 * abs(stats['latitude']['avg'] * 0.017453),
-                'suggested_decimal_places': max(4, int(-stats['latitude']['stddev'] * 100000) + 1)
-            }
+            stats['precision'] = self._calculate_precision(stats)
             
-            print(f"\n🇵🇪 DATOS FILTRADOS PARA PERÚ:")
-            print("="*40)
-            print(f"Registros en Perú: {stats['total_records']}")
-            print(f"Latitud: {stats['latitude']['min']:.6f}° a {stats['latitude']['max']:.6f}°")
-            print(f"Longitud: {stats['longitude']['min']:.6f}° a {stats['longitude']['max']:.6f}°")
-            print(f"Altitud: {stats['altitude']['min']:.1f}m a {stats['altitude']['max']:.1f}m")
-            print(f"Velocidad: {stats['speed']['min']:.1f} a {stats['speed']['max']:.1f} km/h")
+            self._print_peru_stats(stats)
             
             return stats
             
@@ -262,11 +774,878 @@ class GPSRegionAnalyzer:
             print(f"❌ Error filtrando datos de Perú: {e}")
             return {}
     
-    def run_analysis(self):
-        """Ejecuta análisis completo"""
+    def _calculate_precision(self, stats: Dict) -> Dict:
+        """Calcula la precisión estimada a partir de la desviación estándar"""
+        return {
+            'latitude_meters': stats['latitude']['stddev'] * 111000,
+            'longitude_meters': stats['longitude']['stddev'] * 111000 * abs(stats['latitude']['avg'] * 0.017453),
+            'suggested_decimal_places': max(4, int(-stats['latitude']['stddev'] * 100000) + 1)
+        }
+    
+    def _print_peru_stats(self, stats: Dict):
+        """Imprime el resumen de las estadísticas filtradas de Perú"""
+        print(f"\n🇵🇪 DATOS FILTRADOS PARA PERÚ:")
+        print("="*40)
+        print(f"Registros en Perú: {stats['total_records']}")
+        print(f"Latitud: {stats['latitude']['min']:.6f}° a {stats['latitude']['max']:.6f}°")
+        print(f"Longitud: {stats['longitude']['min']:.6f}° a {stats['longitude']['max']:.6f}°")
+        print(f"Altitud: {stats['altitude']['min']:.1f}m a {stats['altitude']['max']:.1f}m")
+        print(f"Velocidad: {stats['speed']['min']:.1f} a {stats['speed']['max']:.1f} km/h")
+    
+    def _region_case_sql(self) -> str:
+        """Expresión SQL equivalente a classify_coordinate"""
+        return """CASE
+                    WHEN latitude BETWEEN -18 AND -10 AND longitude BETWEEN -82 AND -68 THEN '🇵🇪 Perú'
+                    WHEN latitude BETWEEN -17 AND -15 AND longitude BETWEEN -72 AND -70 THEN '🏔️ Arequipa'
+                    WHEN latitude BETWEEN 35 AND 45 AND longitude BETWEEN -10 AND 5 THEN '🇪🇸 España'
+                    WHEN latitude > 20 AND longitude > -20 THEN '🌍 Europa/África'
+                    WHEN latitude < -20 THEN '🌊 Sur de Perú/Chile'
+                    ELSE '❓ Desconocido'
+                END"""
+    
+    def _build_field_stats(self, total: int, aggregates: Dict[str, Tuple]) -> Dict:
+        """Construye el diccionario de estadísticas desde (min, max, avg, stddev) por campo"""
+        stats = {'total_records': total}
+        for field, (f_min, f_max, f_avg, f_stddev) in aggregates.items():
+            cast = int if field == 'satellites' else float
+            stats[field] = {
+                'min': cast(f_min) if f_min else 0,
+                'max': cast(f_max) if f_max else 0,
+                'avg': float(f_avg) if f_avg else 0,
+                'stddev': float(f_stddev) if f_stddev else 0
+            }
+        return stats
+    
+    def analyze_table_single_pass(self, table_name: str) -> Dict:
+        """
+        Calcula en UNA sola lectura de la tabla las estadísticas globales,
+        por región y del filtro de Perú usando GROUPING SETS
+        """
+        try:
+            cursor = self.connection.cursor()
+            
+            aggregates_sql = ",\n                ".join(
+                f"MIN({field}), MAX({field}), AVG({field}), STDDEV({field})"
+                for field in GPS_FIELDS
+            )
+            
+            # La CTE se integra en la consulta (PostgreSQL 12+): un solo scan
+            query = f"""
+            WITH points AS (
+                SELECT latitude, longitude, altitude, speed, satellites, hdop,
+                {self._region_case_sql()} AS region,
+                (latitude BETWEEN -18 AND 0 AND longitude BETWEEN -82 AND -68) AS in_peru
+                FROM {table_name}
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            )
+            SELECT 
+                GROUPING(region) AS g_region,
+                GROUPING(in_peru) AS g_peru,
+                region,
+                in_peru,
+                COUNT(*) AS total_points,
+                {aggregates_sql}
+            FROM points
+            GROUP BY GROUPING SETS ((), (region), (in_peru));
+            """
+            
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            
+            global_stats = None
+            peru_stats = {}
+            region_stats = {}
+            
+            for row in rows:
+                g_region, g_peru, region, in_peru, total = row[:5]
+                aggregates = {
+                    field: tuple(row[5 + i * 4: 9 + i * 4])
+                    for i, field in enumerate(GPS_FIELDS)
+                }
+                stats = self._build_field_stats(total, aggregates)
+                
+                if g_region and g_peru:
+                    global_stats = stats
+                elif not g_region:
+                    region_stats[region] = stats
+                elif in_peru:
+                    peru_stats = stats
+            
+            if not global_stats or global_stats['total_records'] == 0:
+                print(f"❌ La tabla {table_name} no tiene puntos GPS")
+                return {}
+            
+            lat, lon = global_stats['latitude'], global_stats['longitude']
+            print(f"\n🌍 ANÁLISIS GEOGRÁFICO (una pasada) - Tabla: {table_name}")
+            print("="*50)
+            print(f"Total de puntos GPS: {global_stats['total_records']}")
+            print(f"Latitud: {lat['min']:.6f}° a {lat['max']:.6f}°")
+            print(f"Longitud: {lon['min']:.6f}° a {lon['max']:.6f}°")
+            print(f"Centro promedio: ({lat['avg']:.6f}°, {lon['avg']:.6f}°)")
+            
+            self.identify_regions(lat['min'], lat['max'], lon['min'], lon['max'])
+            
+            print(f"\n📊 DISTRIBUCIÓN POR REGIÓN:")
+            print("-" * 60)
+            for region, stats in sorted(region_stats.items(), key=lambda item: -item[1]['total_records']):
+                print(f"  {region}: {stats['total_records']} puntos "
+                      f"(lat {stats['latitude']['min']:.5f}° a {stats['latitude']['max']:.5f}°, "
+                      f"lon {stats['longitude']['min']:.5f}° a {stats['longitude']['max']:.5f}°)")
+            
+            if not peru_stats or peru_stats['total_records'] == 0:
+                print("❌ No se encontraron datos en el rango de Perú")
+                return {}
+            
+            peru_stats['precision'] = self._calculate_precision(peru_stats)
+            self._print_peru_stats(peru_stats)
+            
+            return peru_stats
+            
+        except Exception as e:
+            print(f"❌ Error en análisis de una pasada: {e}")
+            return {}
+    
+    def _state_path(self, table_name: str) -> str:
+        return os.path.join(self.state_dir, f"{table_name}.stats.json")
+    
+    def load_stats_state(self, table_name: str) -> Dict:
+        """Carga el estado persistido (acumuladores, sketches y marca de agua) de una tabla"""
+        path = self._state_path(table_name)
+        if not os.path.exists(path):
+            return {'watermark': None, 'fields': {}, 'sketches': {}}
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {
+                'watermark': data.get('watermark'),
+                'fields': {
+                    field: FieldAccumulator.from_dict(values)
+                    for field, values in data.get('fields', {}).items()
+                },
+                'sketches': {
+                    field: QuantileSketch.from_dict(values)
+                    for field, values in data.get('sketches', {}).items()
+                }
+            }
+        except Exception as e:
+            print(f"⚠️  Estado incremental ilegible ({e}), se recalcula desde cero")
+            return {'watermark': None, 'fields': {}, 'sketches': {}}
+    
+    def save_stats_state(self, table_name: str, state: Dict):
+        """Guarda el estado de forma atómica para no corromperlo si se interrumpe"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(table_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'watermark': state['watermark'],
+                'fields': {field: acc.to_dict() for field, acc in state['fields'].items()},
+                'sketches': {field: sketch.to_dict() for field, sketch in state.get('sketches', {}).items()}
+            }, f, indent=2)
+        os.replace(tmp_path, path)
+    
+    def _stats_from_accumulators(self, accumulators: Dict[str, FieldAccumulator]) -> Dict:
+        """Convierte acumuladores en el diccionario que consume generate_peru_newton"""
+        aggregates = {
+            field: (acc.minimum, acc.maximum, acc.mean, acc.stddev)
+            for field, acc in accumulators.items()
+        }
+        total = accumulators['latitude'].count if 'latitude' in accumulators else 0
+        return self._build_field_stats(total, aggregates)
+    
+    def _accumulator_aggregates_sql(self) -> str:
+        """Agregados SQL (COUNT, SUM, SUM², MIN, MAX) que alimentan FieldAccumulator"""
+        return ",\n                ".join(
+            f"COUNT({field}), SUM({field}), SUM({field}::float8 * {field}::float8), MIN({field}), MAX({field})"
+            for field in GPS_FIELDS
+        )
+    
+    def _accumulators_from_row(self, row: Tuple, offset: int) -> Dict[str, FieldAccumulator]:
+        """Construye acumuladores desde las columnas de _accumulator_aggregates_sql"""
+        accumulators = {}
+        for i, field in enumerate(GPS_FIELDS):
+            count, total, total_sq, f_min, f_max = row[offset + i * 5: offset + 5 + i * 5]
+            accumulators[field] = (FieldAccumulator(int(count), float(total), float(total_sq), float(f_min), float(f_max))
+                                   if count else FieldAccumulator())
+        return accumulators
+    
+    def _query_peru_accumulators(self, cursor, table_name: str,
+                                 watermark: Optional[str] = None) -> Tuple[Dict[str, FieldAccumulator], object]:
+        """
+        Agrega en el servidor las filas de Perú (opcionalmente solo las
+        posteriores a watermark) y devuelve acumuladores y MAX(timestamp)
+        """
+        watermark_sql = "AND timestamp > %s" if watermark else ""
+        
+        query = f"""
+            SELECT 
+                MAX(timestamp) AS new_watermark,
+                {self._accumulator_aggregates_sql()}
+            FROM {table_name}
+            WHERE latitude BETWEEN -18 AND 0 
+            AND longitude BETWEEN -82 AND -68
+            AND latitude IS NOT NULL 
+            AND longitude IS NOT NULL
+            {watermark_sql};
+        """
+        
+        cursor.execute(query, (watermark,) if watermark else None)
+        row = cursor.fetchone()
+        
+        return self._accumulators_from_row(row, 1), row[0]
+    
+    def _query_peru_sample(self, cursor, table_name: str, method: str,
+                           percent: float, seed: int) -> Tuple[Dict[str, FieldAccumulator], Dict[str, Tuple]]:
+        """Acumuladores y cuantiles p0.1/p99.9 de una muestra TABLESAMPLE de Perú"""
+        quantiles_sql = ",\n                ".join(
+            f"percentile_cont(ARRAY[{ROBUST_QUANTILES[0]}, {ROBUST_QUANTILES[1]}]) WITHIN GROUP (ORDER BY {field})"
+            for field in SAMPLED_FIELDS
+        )
+        query = f"""
+            SELECT 
+                {self._accumulator_aggregates_sql()},
+                {quantiles_sql}
+            FROM {table_name} TABLESAMPLE {method} (%s) REPEATABLE (%s)
+            WHERE latitude BETWEEN -18 AND 0 
+            AND longitude BETWEEN -82 AND -68
+            AND latitude IS NOT NULL 
+            AND longitude IS NOT NULL;
+        """
+        cursor.execute(query, (percent, seed))
+        row = cursor.fetchone()
+        
+        accumulators = self._accumulators_from_row(row, 0)
+        offset = len(GPS_FIELDS) * 5
+        quantiles = {
+            field: tuple(row[offset + i])
+            for i, field in enumerate(SAMPLED_FIELDS)
+            if row[offset + i] is not None and None not in row[offset + i]
+        }
+        return accumulators, quantiles
+    
+    def _query_peru_sketches(self, table_name: str, tablesample_sql: str = "",
+                             extra_where_sql: str = "", params: Tuple = ()) -> Dict[str, QuantileSketch]:
+        """
+        Sketches de cuantiles de las filas de Perú (opcionalmente de una
+        muestra TABLESAMPLE o de un rango de timestamp), recorridas en
+        bloques con un cursor con nombre para que la tasa de outliers salga
+        igual que en un barrido completo
+        """
+        sketches = {field: QuantileSketch() for field in GPS_FIELDS}
+        cursor = self.connection.cursor(name=f"gps_sketch_{table_name}")
+        cursor.itersize = DEFAULT_CHUNK_ROWS
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(f'{field}::float8' for field in GPS_FIELDS)}
+                FROM {table_name} {tablesample_sql}
+                WHERE latitude BETWEEN -18 AND 0 
+                AND longitude BETWEEN -82 AND -68
+                AND latitude IS NOT NULL 
+                AND longitude IS NOT NULL
+                {extra_where_sql};
+            """, params or None)
+            while True:
+                rows = cursor.fetchmany(DEFAULT_CHUNK_ROWS)
+                if not rows:
+                    break
+                block = np.array(rows, dtype=np.float64)
+                for i, field in enumerate(GPS_FIELDS):
+                    sketches[field].update(block[:, i])
+        finally:
+            cursor.close()
+        return sketches
+    
+    def sample_peru_stats_adaptive(self, table_name: str, method: str = "SYSTEM",
+                                   start_percent: float = 0.1, max_percent: float = 100.0,
+                                   growth: float = 2.0, tolerance: float = 0.01,
+                                   seed: int = 42) -> Dict:
+        """
+        Estima las estadísticas de Perú con muestras TABLESAMPLE crecientes
+        (misma semilla, así cada muestra contiene a la anterior) hasta que
+        los rangos min/max y p0.1/p99.9 cambian menos de tolerance relativo
+        al ancho del rango entre dos tamaños consecutivos.
+        
+        SYSTEM muestrea bloques completos y solo lee las páginas elegidas;
+        BERNOULLI elige filas individuales (más uniforme si los datos están
+        agrupados físicamente) pero recorre todas las páginas en cada tamaño.
+        """
+        try:
+            cursor = self.connection.cursor()
+            percent = start_percent
+            previous = None
+            
+            print(f"\n🎲 MUESTREO ADAPTATIVO - Tabla: {table_name} (TABLESAMPLE {method})")
+            while True:
+                accumulators, quantiles = self._query_peru_sample(cursor, table_name, method, percent, seed)
+                sample_rows = accumulators['latitude'].count
+                
+                current = {
+                    field: (accumulators[field].minimum, accumulators[field].maximum) + quantiles[field]
+                    for field in SAMPLED_FIELDS
+                    if accumulators[field].count and field in quantiles
+                }
+                change = float('inf')
+                if previous and current and current.keys() == previous.keys():
+                    change = max(
+                        max(abs(a - b) for a, b in zip(current[field], previous[field])) /
+                        max(current[field][1] - current[field][0], 1e-9)
+                        for field in current
+                    )
+                
+                print(f"  {percent:8.3f}% → {sample_rows} filas de Perú, cambio relativo de rangos: "
+                      f"{'—' if change == float('inf') else f'{change:.3%}'}")
+                
+                converged = change <= tolerance
+                if converged or percent >= max_percent:
+                    break
+                previous = current
+                percent = min(percent * growth, max_percent)
+            
+            if sample_rows == 0:
+                print("❌ No se encontraron datos en el rango de Perú")
+                return {}
+            
+            stats = self._stats_from_accumulators(accumulators)
+            stats['precision'] = self._calculate_precision(stats)
+            if self.robust_ranges:
+                # Misma semilla y porcentaje: las mismas filas que la última muestra
+                sketches = self._query_peru_sketches(
+                    table_name, f"TABLESAMPLE {method} (%s) REPEATABLE (%s)", params=(percent, seed)
+                )
+                self._add_robust_ranges(stats, sketches)
+            
+            # Fracción esperada de la población dentro de [min, max] de la muestra
+            coverage = (sample_rows - 1) / (sample_rows + 1) if sample_rows > 1 else 0.0
+            stats['sampling'] = {
+                'method': method,
+                'percent': percent,
+                'sample_rows': sample_rows,
+                'relative_change': change,
+                'coverage': coverage,
+                'converged': converged
+            }
+            
+            print(f"  {'✅ Rangos estables' if converged else '⚠️ Sin convergencia'}: "
+                  f"muestra {percent:g}%, cobertura esperada del rango {coverage:.4%}")
+            self._print_peru_stats(stats)
+            
+            return stats
+            
+        except Exception as e:
+            print(f"❌ Error en muestreo adaptativo: {e}")
+            return {}
+    
+    def update_peru_stats_incremental(self, table_name: str) -> Dict:
+        """
+        Agrega solo las filas de Perú posteriores a la marca de agua
+        (columna timestamp) y las fusiona con el estado persistido. Con
+        robust_ranges los sketches de cuantiles también se persisten y se
+        alimentan solo con las filas nuevas.
+        """
+        try:
+            state = self.load_stats_state(table_name)
+            watermark = state['watermark']
+            
+            delta, new_watermark = self._query_peru_accumulators(
+                self.connection.cursor(), table_name, watermark
+            )
+            for field, accumulator in delta.items():
+                state['fields'].setdefault(field, FieldAccumulator()).merge(accumulator)
+            new_rows = delta['latitude'].count
+            
+            print(f"\n🔁 ACTUALIZACIÓN INCREMENTAL - Tabla: {table_name}")
+            print(f"  Marca de agua anterior: {watermark or 'ninguna (primera ejecución)'}")
+            print(f"  Filas nuevas agregadas: {new_rows}")
+            
+            if new_watermark is not None:
+                state['watermark'] = new_watermark.isoformat() if hasattr(new_watermark, 'isoformat') else str(new_watermark)
+                print(f"  Nueva marca de agua: {state['watermark']}")
+            
+            # Un estado sin sketches (anterior a robust_ranges) se reconstruye desde el inicio
+            rebuild_sketches = self.robust_ranges and not state['sketches']
+            # Acotado por la nueva marca de agua: las mismas filas que los acumuladores
+            until = new_watermark if new_watermark is not None else watermark
+            if self.robust_ranges and until is not None and (new_rows or rebuild_sketches):
+                since = None if rebuild_sketches else watermark
+                delta_sketches = self._query_peru_sketches(
+                    table_name,
+                    extra_where_sql=("AND timestamp > %s " if since else "") + "AND timestamp <= %s",
+                    params=((since,) if since else ()) + (until,)
+                )
+                for field, sketch in delta_sketches.items():
+                    state['sketches'].setdefault(field, QuantileSketch(sketch.compression)).merge(sketch)
+            
+            if new_rows or rebuild_sketches:
+                self.save_stats_state(table_name, state)
+            
+            if 'latitude' not in state['fields'] or state['fields']['latitude'].count == 0:
+                print("❌ No se encontraron datos en el rango de Perú")
+                return {}
+            
+            stats = self._stats_from_accumulators(state['fields'])
+            stats['precision'] = self._calculate_precision(stats)
+            if self.robust_ranges and state['sketches']:
+                self._add_robust_ranges(stats, state['sketches'])
+            self._print_peru_stats(stats)
+            
+            return stats
+            
+        except Exception as e:
+            print(f"❌ Error en actualización incremental: {e}")
+            return {}
+    
+    def _scan_table(self, source: GPSDataSource, table_name: str) -> Dict:
+        """
+        Recorre una tabla de la fuente una sola vez y devuelve los
+        acumuladores de Perú, sketches (si robust_ranges), extremos globales
+        y conteos por región. No imprime: es seguro llamarlo desde hilos.
+        """
+        accumulators = {field: FieldAccumulator() for field in GPS_FIELDS}
+        global_lat = FieldAccumulator()
+        global_lon = FieldAccumulator()
+        region_counts = dict.fromkeys(REGION_LABELS, 0)
+        sketches = ({field: QuantileSketch() for field in GPS_FIELDS}
+                    if self.robust_ranges else {})
+        
+        for chunk in source.iter_chunks(table_name, GPS_FIELDS):
+            lat = chunk['latitude']
+            lon = chunk['longitude']
+            valid = ~(np.isnan(lat) | np.isnan(lon))
+            global_lat.update(lat[valid])
+            global_lon.update(lon[valid])
+            
+            codes = self.classify_coordinates(lat[valid], lon[valid])
+            for label, count in self.count_regions(codes).items():
+                region_counts[label] += count
+            
+            in_peru = valid & (lat >= -18) & (lat <= 0) & (lon >= -82) & (lon <= -68)
+            for field in GPS_FIELDS:
+                accumulators[field].update(chunk[field][in_peru])
+            for field, sketch in sketches.items():
+                sketch.update(chunk[field][in_peru])
+        
+        return {
+            'accumulators': accumulators,
+            'sketches': sketches,
+            'global_lat': global_lat,
+            'global_lon': global_lon,
+            'region_counts': region_counts
+        }
+    
+    def analyze_table_from_source(self, table_name: str, source: Optional[GPSDataSource] = None) -> Dict:
+        """
+        Calcula las estadísticas de Perú recorriendo la fuente de datos
+        (data_source si no se indica otra) en bloques con operaciones
+        vectorizadas de NumPy
+        """
+        try:
+            scan = self._scan_table(source or self.data_source, table_name)
+            accumulators = scan['accumulators']
+            sketches = scan['sketches']
+            global_lat = scan['global_lat']
+            global_lon = scan['global_lon']
+            region_counts = scan['region_counts']
+            
+            if global_lat.count == 0:
+                print(f"❌ La tabla {table_name} no tiene puntos GPS")
+                return {}
+            
+            print(f"\n🌍 ANÁLISIS GEOGRÁFICO (fuente de datos) - Tabla: {table_name}")
+            print("="*50)
+            print(f"Total de puntos GPS: {global_lat.count}")
+            print(f"Latitud: {global_lat.minimum:.6f}° a {global_lat.maximum:.6f}°")
+            print(f"Longitud: {global_lon.minimum:.6f}° a {global_lon.maximum:.6f}°")
+            print(f"Centro promedio: ({global_lat.mean:.6f}°, {global_lon.mean:.6f}°)")
+            self.identify_regions(global_lat.minimum, global_lat.maximum,
+                                  global_lon.minimum, global_lon.maximum)
+            self._print_region_counts(region_counts)
+            
+            if accumulators['latitude'].count == 0:
+                print("❌ No se encontraron datos en el rango de Perú")
+                return {}
+            
+            stats = self._stats_from_accumulators(accumulators)
+            stats['precision'] = self._calculate_precision(stats)
+            if sketches:
+                self._add_robust_ranges(stats, sketches)
+            self._print_peru_stats(stats)
+            
+            return stats
+            
+        except Exception as e:
+            print(f"❌ Error analizando fuente de datos: {e}")
+            return {}
+    
+    def _add_robust_ranges(self, stats: Dict, sketches: Dict[str, QuantileSketch],
+                           fence_ratio: float = 0.1):
+        """
+        Añade a stats los cuantiles p0.1/p99.9 de cada campo y la tasa de
+        outliers: fracción de valores más allá del rango robusto ampliado
+        en fence_ratio de su ancho por cada lado
+        """
+        low_q, high_q = ROBUST_QUANTILES
+        stats['quantiles'] = {}
+        stats['outlier_rate'] = {}
+        
+        for field, sketch in sketches.items():
+            if sketch.count == 0:
+                continue
+            low = sketch.quantile(low_q)
+            high = sketch.quantile(high_q)
+            fence = (high - low) * fence_ratio
+            stats['quantiles'][field] = {'p001': low, 'p999': high}
+            stats['outlier_rate'][field] = sketch.cdf(low - fence) + (1.0 - sketch.cdf(high + fence))
+        
+        print(f"\n📐 RANGOS ROBUSTOS (p{low_q * 100:g} – p{high_q * 100:g}):")
+        for field, quantiles in stats['quantiles'].items():
+            print(f"  {field}: {quantiles['p001']:.6f} a {quantiles['p999']:.6f} "
+                  f"(crudo: {stats[field]['min']:.6f} a {stats[field]['max']:.6f}, "
+                  f"outliers: {stats['outlier_rate'][field]:.4%})")
+    
+    def _spec_ranges(self, stats: Dict) -> Dict[str, Tuple]:
+        """Rangos a emitir en Newton: cuantiles robustos si existen, si no MIN/MAX"""
+        ranges = {}
+        quantiles = stats.get('quantiles', {})
+        for field in GPS_FIELDS:
+            if field in quantiles:
+                low, high = quantiles[field]['p001'], quantiles[field]['p999']
+            else:
+                low, high = stats[field]['min'], stats[field]['max']
+            if field == 'satellites':
+                low, high = int(math.floor(low)), int(math.ceil(high))
+            ranges[field] = (low, high)
+        return ranges
+    
+    def export_table_arrays(self, table_name: str, output_dir: str,
+                            columns: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Exporta una tabla con COPY binario a <output_dir>/<tabla>/<columna>.npy
+        para re-analizarla localmente con ColumnarFileSource
+        """
+        columns = columns or GPS_FIELDS + ['timestamp']
+        try:
+            source = PostgresDataSource(self.connection, use_copy=True)
+            arrays = source.copy_table_to_arrays(table_name, columns)
+            
+            table_dir = os.path.join(output_dir, table_name)
+            os.makedirs(table_dir, exist_ok=True)
+            for column, values in arrays.items():
+                np.save(os.path.join(table_dir, f"{column}.npy"), values)
+            
+            print(f"💾 Tabla {table_name} exportada: {len(arrays[columns[0]])} filas → {table_dir}")
+            return table_dir
+            
+        except Exception as e:
+            print(f"❌ Error exportando {table_name}: {e}")
+            return None
+    
+    def _accumulate_tiles(self, chunk: Dict[str, np.ndarray], tile_size_deg: float,
+                          tiles: Dict[Tuple[int, int], Dict[str, FieldAccumulator]]):
+        """Agrega un bloque de puntos en las celdas de la grilla (vectorizado)"""
+        lat = chunk['latitude']
+        lon = chunk['longitude']
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        if not valid.any():
+            return
+        
+        keys = np.stack([
+            np.floor(lat[valid] / tile_size_deg).astype(np.int64),
+            np.floor(lon[valid] / tile_size_deg).astype(np.int64)
+        ], axis=1)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        
+        # Ordenar por celda una sola vez para reducir min/max por segmentos
+        order = np.argsort(inverse, kind='stable')
+        sorted_tiles = inverse[order]
+        
+        for field in GPS_FIELDS:
+            values = chunk[field][valid][order]
+            present = ~np.isnan(values)
+            values = values[present]
+            tile_ids = sorted_tiles[present]
+            if values.size == 0:
+                continue
+            
+            starts = np.flatnonzero(np.r_[True, tile_ids[1:] != tile_ids[:-1]])
+            counts = np.diff(np.r_[starts, values.size])
+            sums = np.add.reduceat(values, starts)
+            sums_sq = np.add.reduceat(values * values, starts)
+            mins = np.minimum.reduceat(values, starts)
+            maxs = np.maximum.reduceat(values, starts)
+            
+            for k, start in enumerate(starts):
+                tile_lat, tile_lon = unique_keys[tile_ids[start]]
+                tile = tiles.setdefault(
+                    (int(tile_lat), int(tile_lon)),
+                    {name: FieldAccumulator() for name in GPS_FIELDS}
+                )
+                tile[field].merge(FieldAccumulator(
+                    int(counts[k]), float(sums[k]), float(sums_sq[k]), float(mins[k]), float(maxs[k])
+                ))
+    
+    def compute_tile_stats(self, table_name: str, tile_size_deg: float = 0.1) -> Dict[Tuple[int, int], Dict[str, FieldAccumulator]]:
+        """
+        Divide los puntos en una grilla de celdas de tile_size_deg grados y
+        calcula los acumuladores de cada celda no vacía en una sola pasada
+        """
+        tiles = {}
+        
+        if self.data_source is not None:
+            for chunk in self.data_source.iter_chunks(table_name, GPS_FIELDS):
+                self._accumulate_tiles(chunk, tile_size_deg, tiles)
+            return tiles
+        
+        cursor = self.connection.cursor()
+        query = f"""
+            SELECT 
+                FLOOR(latitude / %s)::bigint AS tile_lat,
+                FLOOR(longitude / %s)::bigint AS tile_lon,
+                {self._accumulator_aggregates_sql()}
+            FROM {table_name}
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            GROUP BY 1, 2;
+        """
+        cursor.execute(query, (tile_size_deg, tile_size_deg))
+        
+        for row in cursor.fetchall():
+            tiles[(int(row[0]), int(row[1]))] = self._accumulators_from_row(row, 2)
+        
+        return tiles
+    
+    def find_dense_clusters(self, tiles: Dict[Tuple[int, int], Dict[str, FieldAccumulator]],
+                            min_points: int) -> List[List[Tuple[int, int]]]:
+        """Agrupa celdas densas vecinas (8-conectividad) en clusters"""
+        dense = {key for key, tile in tiles.items() if tile['latitude'].count >= min_points}
+        clusters = []
+        
+        while dense:
+            seed = dense.pop()
+            cluster = [seed]
+            pending = [seed]
+            while pending:
+                tile_lat, tile_lon = pending.pop()
+                for d_lat in (-1, 0, 1):
+                    for d_lon in (-1, 0, 1):
+                        neighbor = (tile_lat + d_lat, tile_lon + d_lon)
+                        if neighbor in dense:
+                            dense.remove(neighbor)
+                            cluster.append(neighbor)
+                            pending.append(neighbor)
+            clusters.append(cluster)
+        
+        # Clusters más poblados primero
+        clusters.sort(key=lambda cluster: -sum(tiles[key]['latitude'].count for key in cluster))
+        return clusters
+    
+    def generate_cluster_specs(self, table_name: str, tile_size_deg: float = 0.1,
+                               min_points: int = 1000) -> List[str]:
+        """
+        Genera un archivo .newton por cada cluster denso de la grilla. Los
+        rangos por cluster son mucho más estrechos que el de todo Perú.
+        """
+        try:
+            tiles = self.compute_tile_stats(table_name, tile_size_deg)
+            clusters = self.find_dense_clusters(tiles, min_points)
+            
+            print(f"\n🧩 GRILLA ESPACIAL - Tabla: {table_name}")
+            print(f"  Celdas no vacías: {len(tiles)} ({tile_size_deg}° por celda)")
+            print(f"  Clusters densos (≥{min_points} puntos/celda): {len(clusters)}")
+            
+            generated = []
+            for index, cluster in enumerate(clusters, 1):
+                merged = {field: FieldAccumulator() for field in GPS_FIELDS}
+                for key in cluster:
+                    for field in GPS_FIELDS:
+                        merged[field].merge(tiles[key][field])
+                
+                stats = self._stats_from_accumulators(merged)
+                stats['precision'] = self._calculate_precision(stats)
+                
+                zone = (f"cluster {index} ({len(cluster)} celdas, centro "
+                        f"{stats['latitude']['avg']:.4f}°, {stats['longitude']['avg']:.4f}°)")
+                print(f"  📍 {zone}: {stats['total_records']} puntos")
+                
+                filename = f"{table_name}-zona{index}-gps-specs.newton"
+                self.generate_peru_newton(stats, table_name, filename=filename,
+                                          zone_title=f"ZONA {index}", zone_description=zone,
+                                          region_name=f"la zona {index}", sensor_name=f"gpsZone{index}")
+                generated.append(filename)
+            
+            return generated
+            
+        except Exception as e:
+            print(f"❌ Error generando especificaciones por zona: {e}")
+            return []
+    
+    def _trajectory_query(self, table_name: str) -> str:
+        """Consulta con LAG() por dispositivo: intervalos, velocidades y aceleraciones implícitas"""
+        partition_sql = f"PARTITION BY {self.device_column} " if self.device_column else ""
+        steps_partition_sql = "PARTITION BY device " if self.device_column else ""
+        device_sql = self.device_column if self.device_column else "NULL"
+        return f"""
+            WITH ordered AS (
+                SELECT 
+                    {device_sql} AS device,
+                    timestamp,
+                    EXTRACT(EPOCH FROM timestamp - LAG(timestamp) OVER w) AS dt,
+                    RADIANS(latitude - LAG(latitude) OVER w) * {EARTH_RADIUS_M} AS dy,
+                    RADIANS(longitude - LAG(longitude) OVER w)
+                        * COS(RADIANS((latitude + LAG(latitude) OVER w) / 2)) * {EARTH_RADIUS_M} AS dx
+                FROM {table_name}
+                WHERE latitude BETWEEN -18 AND 0 
+                AND longitude BETWEEN -82 AND -68
+                AND timestamp IS NOT NULL
+                WINDOW w AS ({partition_sql}ORDER BY timestamp)
+            ), steps AS (
+                SELECT device, timestamp, dt,
+                       SQRT(dx * dx + dy * dy) / dt * 3.6 AS speed_kmh
+                FROM ordered
+                WHERE dt > 0
+            ), accelerations AS (
+                SELECT dt, speed_kmh,
+                       (speed_kmh - LAG(speed_kmh) OVER ({steps_partition_sql}ORDER BY timestamp)) / 3.6 / dt AS accel_ms2
+                FROM steps
+            )
+            SELECT 
+                COUNT(*),
+                MIN(dt), MAX(dt),
+                percentile_cont(ARRAY[0.05, 0.5, 0.95]) WITHIN GROUP (ORDER BY dt),
+                MAX(speed_kmh),
+                percentile_cont({ROBUST_QUANTILES[1]}) WITHIN GROUP (ORDER BY speed_kmh),
+                percentile_cont(ARRAY[{ROBUST_QUANTILES[0]}, {ROBUST_QUANTILES[1]}]) WITHIN GROUP (ORDER BY accel_ms2)
+            FROM accelerations;
+        """
+    
+    def _trajectory_from_arrays(self, timestamps: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                                devices: Optional[np.ndarray] = None) -> Tuple:
+        """Equivalente NumPy de _trajectory_query sobre un recorrido ordenado por (dispositivo, tiempo)"""
+        if devices is None:
+            devices = np.zeros(len(timestamps))
+        order = np.lexsort((timestamps, devices))
+        timestamps, lats, lons, devices = timestamps[order], lats[order], lons[order], devices[order]
+        
+        same_device = devices[1:] == devices[:-1]
+        dt = np.diff(timestamps)
+        dy = np.radians(np.diff(lats)) * EARTH_RADIUS_M
+        dx = np.radians(np.diff(lons)) * np.cos(np.radians((lats[1:] + lats[:-1]) / 2)) * EARTH_RADIUS_M
+        
+        step = same_device & (dt > 0)
+        dt, dx, dy, step_devices = dt[step], dx[step], dy[step], devices[1:][step]
+        if dt.size == 0:
+            return (0,) + (None,) * 6
+        speed_kmh = np.hypot(dx, dy) / dt * 3.6
+        
+        accel_valid = step_devices[1:] == step_devices[:-1]
+        accel_ms2 = (np.diff(speed_kmh) / 3.6 / dt[1:])[accel_valid]
+        
+        return (
+            int(dt.size),
+            float(dt.min()), float(dt.max()),
+            np.quantile(dt, [0.05, 0.5, 0.95]).tolist(),
+            float(speed_kmh.max()),
+            float(np.quantile(speed_kmh, ROBUST_QUANTILES[1])),
+            np.quantile(accel_ms2, ROBUST_QUANTILES).tolist() if accel_ms2.size else None
+        )
+    
+    def analyze_trajectories(self, table_name: str) -> Dict:
+        """
+        Deriva de las trayectorias por dispositivo la distribución de
+        intervalos entre muestras, la tasa de actualización, la velocidad
+        implícita y los límites de aceleración (una sola pasada).
+        
+        Con una fuente de datos las filas llegan sin orden, así que los puntos
+        de Perú se filtran bloque a bloque y se retienen para ordenarlos por
+        (dispositivo, tiempo): la memoria es O(puntos en Perú), unos 32 bytes
+        por punto (timestamp, latitud, longitud y dispositivo en float64).
+        Una fuente PostgreSQL usa la consulta LAG() en el servidor: así el
+        dispositivo (texto o UUID) no pasa por la conversión a float8.
+        """
+        try:
+            if self.data_source is not None and not isinstance(self.data_source, PostgresDataSource):
+                columns = ['timestamp', 'latitude', 'longitude'] + ([self.device_column] if self.device_column else [])
+                kept = {column: [] for column in columns}
+                for chunk in self.data_source.iter_chunks(table_name, columns):
+                    lat, lon, ts = chunk['latitude'], chunk['longitude'], chunk['timestamp']
+                    keep = (~np.isnan(ts) & (lat >= -18) & (lat <= 0) & (lon >= -82) & (lon <= -68))
+                    for column in columns:
+                        kept[column].append(chunk[column][keep])
+                if not kept['timestamp']:
+                    return {}
+                arrays = {column: np.concatenate(parts) for column, parts in kept.items()}
+                row = self._trajectory_from_arrays(
+                    arrays['timestamp'], arrays['latitude'], arrays['longitude'],
+                    arrays[self.device_column] if self.device_column else None
+                )
+            else:
+                connection = self.data_source.connection if self.data_source is not None else self.connection
+                cursor = connection.cursor()
+                cursor.execute(self._trajectory_query(table_name))
+                row = cursor.fetchone()
+            
+            intervals, dt_min, dt_max, dt_quantiles, speed_max, speed_p999, accel_quantiles = row
+            if not intervals:
+                print("⚠️  Sin intervalos válidos para análisis de trayectorias")
+                return {}
+            
+            dt_p05, dt_median, dt_p95 = (float(value) for value in dt_quantiles)
+            # Sin dispositivos con dos o más intervalos SQL devuelve [NULL, NULL]
+            has_accel = accel_quantiles is not None and None not in accel_quantiles
+            trajectory = {
+                'intervals': int(intervals),
+                'dt_min': float(dt_min),
+                'dt_p05': dt_p05,
+                'dt_median': dt_median,
+                'dt_p95': dt_p95,
+                'dt_max': float(dt_max),
+                'update_rate_hz': 1.0 / dt_median if dt_median > 0 else 0.0,
+                'implied_speed_max_kmh': float(speed_max),
+                'implied_speed_p999_kmh': float(speed_p999),
+                'accel_p001_ms2': float(accel_quantiles[0]) if has_accel else 0.0,
+                'accel_p999_ms2': float(accel_quantiles[1]) if has_accel else 0.0
+            }
+            
+            print(f"\n🛰️  TRAYECTORIAS - Tabla: {table_name}")
+            print(f"  Intervalos analizados: {trajectory['intervals']}")
+            print(f"  Intervalo entre muestras: mediana {dt_median:.2f}s (p5 {dt_p05:.2f}s, p95 {dt_p95:.2f}s)")
+            print(f"  Tasa de actualización: {trajectory['update_rate_hz']:.4f} Hz")
+            print(f"  Velocidad implícita: p99.9 {trajectory['implied_speed_p999_kmh']:.1f} km/h "
+                  f"(máx {trajectory['implied_speed_max_kmh']:.1f} km/h)")
+            print(f"  Aceleración: {trajectory['accel_p001_ms2']:.2f} a {trajectory['accel_p999_ms2']:.2f} m/s²")
+            
+            return trajectory
+            
+        except Exception as e:
+            print(f"❌ Error analizando trayectorias: {e}")
+            return {}
+    
+    def run_analysis(self, single_pass: bool = False, incremental: bool = False,
+                     grid_tile_deg: Optional[float] = None, adaptive_sampling: bool = False,
+                     trajectories: bool = False):
+        """
+        Ejecuta análisis completo
+        
+        single_pass=True calcula todas las estadísticas de cada tabla con
+        una única lectura en lugar de tres consultas independientes.
+        incremental=True solo agrega las filas nuevas desde la última
+        ejecución y las fusiona con el estado persistido en state_dir.
+        grid_tile_deg genera un archivo .newton por cluster denso de una
+        grilla con celdas de ese tamaño en lugar de un único archivo de Perú.
+        adaptive_sampling=True estima los rangos con muestras TABLESAMPLE
+        crecientes hasta que se estabilizan (exploración rápida).
+        trajectories=True añade a la especificación la tasa de actualización,
+        velocidades implícitas y aceleraciones derivadas con LAG() por dispositivo.
+        Con robust_ranges cada modo añade los rangos p0.1–p99.9 desde sus
+        propios sketches (muestra final, filas nuevas o la lectura completa).
+        Si el analizador tiene data_source, se usa esa fuente en su lugar.
+        """
         print("🔍 INICIANDO ANÁLISIS DE REGIONES GPS")
         print("="*50)
         
+        if self.data_source is not None:
+            return self._run_source_analysis(grid_tile_deg, trajectories)
+        
         if not self.connect_database():
             return False
         
@@ -279,12 +1658,30 @@ class GPSRegionAnalyzer:
         # Analizar cada tabla
         for table in tables:
             print(f"\n📋 Analizando tabla: {table}")
-            self.analyze_geographic_distribution(table)
+            if grid_tile_deg:
+                self.generate_cluster_specs(table, grid_tile_deg)
+                continue
             
-            # Filtrar datos de Perú
-            peru_stats = self.filter_peru_data(table)
+            if adaptive_sampling:
+                peru_stats = self.sample_peru_stats_adaptive(table)
+            elif incremental:
+                peru_stats = self.update_peru_stats_incremental(table)
+            elif self.robust_ranges:
+                # Una sola lectura con cursor server-side que alimenta
+                # acumuladores y sketches de cuantiles a la vez
+                peru_stats = self.analyze_table_from_source(table, PostgresDataSource(self.connection))
+            elif single_pass:
+                peru_stats = self.analyze_table_single_pass(table)
+            else:
+                self.analyze_geographic_distribution(table)
+                
+                # Filtrar datos de Perú
+                peru_stats = self.filter_peru_data(table)
             
             if peru_stats:
+                if trajectories:
+                    peru_stats['trajectory'] = self.analyze_trajectories(table)
+                
                 # Generar Newton DSL filtrado
                 self.generate_peru_newton(peru_stats, table)
         
@@ -293,19 +1690,178 @@ class GPSRegionAnalyzer:
         
         return True
     
-    def generate_peru_newton(self, stats: Dict, table_name: str):
-        """Genera Newton DSL solo con datos de Perú"""
+    def _run_source_analysis(self, grid_tile_deg: Optional[float] = None,
+                             trajectories: bool = False) -> bool:
+        """Análisis completo sobre data_source (sin conexión a PostgreSQL)"""
+        try:
+            tables = self.data_source.list_tables()
+        except Exception as e:
+            print(f"❌ Error listando tablas de la fuente: {e}")
+            return False
+        
+        print(f"📋 Tablas con datos GPS: {tables}")
+        if not tables:
+            print("❌ No se encontraron tablas con datos GPS")
+            return False
+        
+        for table in tables:
+            print(f"\n📋 Analizando tabla: {table}")
+            if grid_tile_deg:
+                self.generate_cluster_specs(table, grid_tile_deg)
+                continue
+            
+            peru_stats = self.analyze_table_from_source(table)
+            if peru_stats:
+                if trajectories:
+                    peru_stats['trajectory'] = self.analyze_trajectories(table)
+                self.generate_peru_newton(peru_stats, table)
+        
+        self.data_source.close()
+        return True
+    
+    def _collect_table_stats(self, table_name: str, connection_pool=None) -> Tuple[Dict, Dict]:
+        """Acumuladores y sketches de Perú de una tabla (ejecutado en un hilo del pool)"""
+        if connection_pool is None:
+            scan = self._scan_table(self.data_source, table_name)
+            return scan['accumulators'], scan['sketches']
+        
+        connection = connection_pool.getconn()
+        try:
+            if self.robust_ranges:
+                scan = self._scan_table(PostgresDataSource(connection), table_name)
+                return scan['accumulators'], scan['sketches']
+            accumulators, _ = self._query_peru_accumulators(connection.cursor(), table_name)
+            return accumulators, {}
+        finally:
+            connection_pool.putconn(connection)
+    
+    def run_parallel_analysis(self, max_workers: int = 4,
+                              filename: str = "peru-gps-specs.newton") -> bool:
+        """
+        Analiza todas las tablas en paralelo (como máximo max_workers a la
+        vez, cada una con su conexión del pool) y fusiona sus estadísticas
+        en una única especificación Newton combinada
+        """
+        print("🔍 INICIANDO ANÁLISIS PARALELO DE REGIONES GPS")
+        print("="*50)
+        
+        connection_pool = None
+        try:
+            if self.data_source is None:
+                if not self.connect_database():
+                    return False
+                tables = self.get_gps_tables()
+                try:
+                    connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                        1, max_workers, **self._connection_kwargs()
+                    )
+                except Exception as e:
+                    print(f"❌ Error creando pool de conexiones: {e}")
+                    return False
+            else:
+                tables = self.data_source.list_tables()
+                print(f"📋 Tablas con datos GPS: {tables}")
+            
+            if not tables:
+                print("❌ No se encontraron tablas con datos GPS")
+                return False
+            
+            combined = {field: FieldAccumulator() for field in GPS_FIELDS}
+            combined_sketches = {}
+            analyzed_tables = []
+            
+            print(f"⚡ Analizando {len(tables)} tablas con {max_workers} trabajadores...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self._collect_table_stats, table, connection_pool): table
+                    for table in tables
+                }
+                for future in as_completed(futures):
+                    table = futures[future]
+                    try:
+                        accumulators, sketches = future.result()
+                    except Exception as e:
+                        print(f"  ❌ Error analizando {table}: {e}")
+                        continue
+                    
+                    for field, accumulator in accumulators.items():
+                        combined[field].merge(accumulator)
+                    for field, sketch in sketches.items():
+                        combined_sketches.setdefault(field, QuantileSketch(sketch.compression)).merge(sketch)
+                    analyzed_tables.append(table)
+                    print(f"  ✅ {table}: {accumulators['latitude'].count} puntos en Perú")
+        finally:
+            # Liberar pool, conexión y fuente también en las salidas tempranas
+            if connection_pool is not None:
+                connection_pool.closeall()
+            if self.connection:
+                self.connection.close()
+            if self.data_source is not None:
+                self.data_source.close()
+        
+        if combined['latitude'].count == 0:
+            print("❌ No se encontraron datos en el rango de Perú")
+            return False
+        
+        stats = self._stats_from_accumulators(combined)
+        stats['precision'] = self._calculate_precision(stats)
+        if combined_sketches:
+            self._add_robust_ranges(stats, combined_sketches)
+        self._print_peru_stats(stats)
+        
+        self.generate_peru_newton(stats, ", ".join(sorted(analyzed_tables)), filename=filename,
+                                  zone_description=f"Perú únicamente ({len(analyzed_tables)} tablas combinadas)")
+        return True
+    
+    def generate_peru_newton(self, stats: Dict, table_name: str,
+                             filename: str = "peru-gps-specs.newton",
+                             zone_title: str = "SOLO PERÚ",
+                             zone_description: str = "Perú únicamente",
+                             region_name: str = "Perú",
+                             sensor_name: str = "peruGPS"):
+        """
+        Genera Newton DSL solo con datos de Perú o, con region_name y
+        sensor_name propios, de una zona de la grilla
+        """
         from datetime import datetime
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ranges = self._spec_ranges(stats)
+        robust_note = ""
+        if stats.get('quantiles'):
+            low_q, high_q = ROBUST_QUANTILES
+            robust_note = f"\n    // Rangos robustos por cuantiles p{low_q * 100:g} – p{high_q * 100:g} (sketch mergeable)"
+            for field, rate in stats['outlier_rate'].items():
+                robust_note += (f"\n    // {field}: crudo [{stats[field]['min']:.6f}, {stats[field]['max']:.6f}], "
+                                f"tasa de outliers {rate:.4%}")
+        temporal_block = ""
+        trajectory = stats.get('trajectory')
+        if trajectory:
+            temporal_block = f"""
+    // Características temporales (trayectorias por dispositivo)
+    update_rate == {trajectory['update_rate_hz']:.4f} Hz,
+    range sample_interval == [{trajectory['dt_p05']:.2f} seconds, {trajectory['dt_p95']:.2f} seconds],
+    range implied_speed == [0.0 kmh, {trajectory['implied_speed_p999_kmh']:.1f} kmh],
+    range acceleration == [{trajectory['accel_p001_ms2']:.2f} mps2, {trajectory['accel_p999_ms2']:.2f} mps2],
+    // Intervalo: mediana {trajectory['dt_median']:.2f}s, extremos [{trajectory['dt_min']:.2f}s, {trajectory['dt_max']:.2f}s]
+    // Velocidad implícita máxima (sin recortar): {trajectory['implied_speed_max_kmh']:.1f} kmh
+"""
+        
+        sampling = stats.get('sampling')
+        if sampling:
+            robust_note += (f"\n    // Muestreo adaptativo: TABLESAMPLE {sampling['method']} ({sampling['percent']:g}%), "
+                            f"{sampling['sample_rows']} filas"
+                            f"\n    // Confianza: cobertura esperada del rango {sampling['coverage']:.4%}, "
+                            f"cambio relativo final {sampling['relative_change']:.3%}"
+                            f"{'' if sampling['converged'] else ' (sin convergencia)'}")
         
-        newton_content = f"""// Especificaciones Newton DSL - SOLO PERÚ
+        newton_content = f"""// Especificaciones Newton DSL - {zone_title}
 // Generado: {timestamp}
-// Registros analizados: {stats['total_records']} (filtrados de Perú)
+// Registros analizados: {stats['total_records']} (filtrados de {region_name})
 // Tabla: {table_name}
 
-// Sensor GPS de Perú basado en datos reales filtrados
-peruGPS: sensor (
+// Sensor GPS de {region_name} basado en datos reales filtrados
+{sensor_name}: sensor (
     latitude: gps_latitude,
     longitude: gps_longitude,
     altitude: gps_altitude,
@@ -313,42 +1869,41 @@ peruGPS: sensor (
     satellites: gps_satellites,
     hdop: gps_hdop
 ) = {{
-    // Rangos geográficos de Perú únicamente
-    range latitude == [{stats['latitude']['min']:.7f} degrees, {stats['latitude']['max']:.7f} degrees],
-    range longitude == [{stats['longitude']['min']:.7f} degrees, {stats['longitude']['max']:.7f} degrees],
-    range altitude == [{stats['altitude']['min']:.1f} meters, {stats['altitude']['max']:.1f} meters],
+    // Rangos geográficos de {region_name} únicamente
+    range latitude == [{ranges['latitude'][0]:.7f} degrees, {ranges['latitude'][1]:.7f} degrees],
+    range longitude == [{ranges['longitude'][0]:.7f} degrees, {ranges['longitude'][1]:.7f} degrees],
+    range altitude == [{ranges['altitude'][0]:.1f} meters, {ranges['altitude'][1]:.1f} meters],
     
-    // Rangos de movimiento en Perú
-    range speed == [{stats['speed']['min']:.1f} kmh, {stats['speed']['max']:.1f} kmh],
+    // Rangos de movimiento en {region_name}
+    range speed == [{ranges['speed'][0]:.1f} kmh, {ranges['speed'][1]:.1f} kmh],
     
-    // Calidad de señal GPS en Perú
-    range satellites == [{stats['satellites']['min']}, {stats['satellites']['max']}],
-    range hdop == [{stats['hdop']['min']:.1f}, {stats['hdop']['max']:.1f}],
+    // Calidad de señal GPS en {region_name}
+    range satellites == [{ranges['satellites'][0]}, {ranges['satellites'][1]}],
+    range hdop == [{ranges['hdop'][0]:.1f}, {ranges['hdop'][1]:.1f}],
     
-    // Precisión específica para Perú
+    // Precisión específica para {region_name}
     precision latitude == {stats['precision']['suggested_decimal_places']} decimal_places,
     precision longitude == {stats['precision']['suggested_decimal_places']} decimal_places,
     precision altitude == 1.0 meters,
-    
-    // Metadatos para Perú
+    {temporal_block}
+    // Metadatos para {region_name}
     // Centro promedio: ({stats['latitude']['avg']:.6f}°, {stats['longitude']['avg']:.6f}°)
     // Precisión estimada: ~{stats['precision']['latitude_meters']:.1f}m
-    // Zona geográfica: Perú únicamente
+    // Zona geográfica: {zone_description}{robust_note}
 }};
 
-// Tipos optimizados para GPS de Perú
-// typedef double gps_latitude;    // Rango Perú: [{stats['latitude']['min']:.6f}, {stats['latitude']['max']:.6f}]
-// typedef double gps_longitude;   // Rango Perú: [{stats['longitude']['min']:.6f}, {stats['longitude']['max']:.6f}]
-// typedef double gps_altitude;    // Rango Perú: [{stats['altitude']['min']:.1f}, {stats['altitude']['max']:.1f}]
-// typedef double gps_speed;       // Rango Perú: [{stats['speed']['min']:.1f}, {stats['speed']['max']:.1f}]
+// Tipos optimizados para GPS de {region_name}
+// typedef double gps_latitude;    // Rango en {region_name}: [{ranges['latitude'][0]:.6f}, {ranges['latitude'][1]:.6f}]
+// typedef double gps_longitude;   // Rango en {region_name}: [{ranges['longitude'][0]:.6f}, {ranges['longitude'][1]:.6f}]
+// typedef double gps_altitude;    // Rango en {region_name}: [{ranges['altitude'][0]:.1f}, {ranges['altitude'][1]:.1f}]
+// typedef double gps_speed;       // Rango en {region_name}: [{ranges['speed'][0]:.1f}, {ranges['speed'][1]:.1f}]
 """
         
         # Guardar archivo filtrado
-        filename = f"peru-gps-specs.newton"
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write(newton_content)
-            print(f"✅ Archivo Newton para Perú guardado: {filename}")
+            print(f"✅ Archivo Newton para {region_name} guardado: {filename}")
         except Exception as e:
             print(f"❌ Error guardando archivo: {e}")
 
@@ -362,8 +1917,11 @@ def main():
         'password': 'blf278'
     }
     
-    analyzer = GPSRegionAnalyzer(db_config)
-    analyzer.run_analysis()
+    # Con un directorio como argumento se analizan exportaciones (Parquet/NumPy/CSV)
+    data_source = ColumnarFileSource(sys.argv[1]) if len(sys.argv) > 1 else None
+    
+    analyzer = GPSRegionAnalyzer(db_config, data_source=data_source)
+    analyzer.run_analysis(single_pass=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
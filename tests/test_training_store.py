@@ -0,0 +1,66 @@
+"""
+Entrenamiento desde el almacén de benchmarks con etiquetas de una sola clase
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_optimization_brain import OptimizationMLModel, TrainingDataStore
+
+# Transformaciones que nunca superan el umbral de aceleración en el almacén
+CONSTANT_LABELS = ('eliminate_range_checks', 'eliminate_null_checks', 'precompute_constants')
+
+@pytest.fixture
+def store(tmp_path):
+    """Almacén de 40 casos: tres etiquetas constantes en 0 y el resto según el área"""
+    store = TrainingDataStore(str(tmp_path / "training.sqlite"))
+    rng = np.random.default_rng(0)
+    for i in range(40):
+        small_area = i % 2 == 0
+        features = {name: float(rng.integers(1, 10)) for name in OptimizationMLModel.TRAINING_FEATURES}
+        features['geographic_area_km2'] = float(rng.uniform(10, 200) if small_area else rng.uniform(1e5, 1e6))
+        labels = {name: 0 if name in CONSTANT_LABELS else int(small_area)
+                  for name in OptimizationMLModel.OPTIMIZATION_NAMES}
+        store.add_sample(f"case-{i}", "geo.c", "geo.newton", "host", features, labels, {})
+    return store
+
+@pytest.mark.parametrize("search", [False, True])
+def test_train_with_constant_label_columns(store, search):
+    model = OptimizationMLModel()
+    X, y = model.create_dataset_from_store(store)
+    model.train(X, y, search=search, cv=3, max_candidates=2, n_jobs=1)
+
+    assert model.is_trained
+    for name in CONSTANT_LABELS:
+        assert model.training_report[name]['model'] == 'DummyClassifier'
+
+    small_area = X.iloc[0].to_dict()
+    predictions = model.predict_optimizations(small_area, {})
+    for name in CONSTANT_LABELS:
+        assert predictions[name]['apply'] is False
+        assert predictions[name]['confidence'] == 1.0
+    assert predictions['use_float_instead_double']['apply'] is True
+
+def test_retrain_uses_configured_estimators(store):
+    model = OptimizationMLModel()
+    X, y = model.create_dataset_from_store(store)
+    model.train(X, y)
+
+    # Con las dos clases presentes vuelve a entrenarse el estimador configurado
+    y['eliminate_range_checks'] = y['use_float_instead_double']
+    model.train(X, y)
+    assert model.training_report['eliminate_range_checks']['model'] == 'GradientBoostingClassifier'
+
+def test_single_positive_case_does_not_break_split(store):
+    model = OptimizationMLModel()
+    X, y = model.create_dataset_from_store(store)
+    # Una sola fila positiva: no se puede estratificar y puede quedar fuera del entrenamiento
+    y['eliminate_null_checks'] = 0
+    y.loc[0, 'eliminate_null_checks'] = 1
+    model.train(X, y)
+    assert model.is_trained